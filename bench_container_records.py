@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for container records in Not a cPanel
+Compares the per-container dicts that refresh_containers used to build with
+ContainerRecord: memory held by the inventory, time to build it, and time to
+serialize the full container list cold, unchanged and after one change
+
+Usage: python bench_container_records.py [sizes...]
+"""
+
+import sys
+import json
+import time
+import tracemalloc
+
+from records import ContainerRecord, encode_records, parse_ports
+
+
+def make_rows(count):
+    return [{
+        'ID': f'{i:012x}',
+        'Names': f'site{i}',
+        'Image': 'nginx:alpine',
+        'State': 'running' if i % 3 else 'exited',
+        'Ports': f'0.0.0.0:{8001 + i % 999}->80/tcp, :::{8001 + i % 999}->80/tcp',
+        'CreatedAt': '2024-01-01 12:00:00 +0000 UTC',
+        'Command': '"/docker-entrypoint.sh nginx -g daemon off;"',
+        'Size': '1.09kB (virtual 43.3MB)',
+        'Networks': 'bridge',
+        'Mounts': f'/srv/nginx-configs/site{i},/srv/web-content/site{i}'
+    } for i in range(count)]
+
+
+def dict_record(row):
+    """The dict refresh_containers built per container before ContainerRecord"""
+    ports_raw = row.get('Ports', '')
+    return {
+        'id': row.get('ID', ''),
+        'name': row.get('Names', ''),
+        'image': row.get('Image', ''),
+        'status': 'running' if row.get('State', '') == 'running' else 'stopped',
+        'ports': ports_raw,
+        'parsed_ports': parse_ports(ports_raw),
+        'created': row.get('CreatedAt', ''),
+        'command': row.get('Command', ''),
+        'size': row.get('Size', ''),
+        'networks': row.get('Networks', ''),
+        'mounts': row.get('Mounts', '')
+    }
+
+
+def measure_memory(build, rows):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    held = build(rows)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del held
+    return after - before
+
+
+def best_of(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench(count):
+    rows = make_rows(count)
+    print(f"\n📦 {count} containers")
+
+    dict_memory = measure_memory(lambda r: [dict_record(row) for row in r], rows)
+    record_memory = measure_memory(lambda r: [ContainerRecord.from_row(row) for row in r], rows)
+
+    def served(r):
+        # After the first listing every record also holds its parsed ports and JSON
+        records = [ContainerRecord.from_row(row) for row in r]
+        encode_records(records)
+        return records
+    served_memory = measure_memory(served, rows)
+    print(f"   memory   dicts {dict_memory / 1024:9.1f} KiB   records {record_memory / 1024:9.1f} KiB"
+          f"   records after a listing {served_memory / 1024:9.1f} KiB")
+
+    dict_build = best_of(lambda: [dict_record(row) for row in rows])
+    record_build = best_of(lambda: [ContainerRecord.from_row(row) for row in rows])
+    print(f"   build    dicts {dict_build * 1000:9.2f} ms    records {record_build * 1000:9.2f} ms")
+
+    dicts = [dict_record(row) for row in rows]
+    dict_serialize = best_of(lambda: json.dumps({'success': True, 'containers': dicts}).encode())
+
+    records = [ContainerRecord.from_row(row) for row in rows]
+    record_cold = best_of(lambda: encode_records([ContainerRecord.from_row(row) for row in rows]), repeat=3) - record_build
+    encode_records(records)
+    record_warm = best_of(lambda: encode_records(records))
+
+    # One container changed: only its record is new and needs encoding
+    def one_changed():
+        records[0] = records[0].replace(status='stopped' if records[0].status == 'running' else 'running')
+        encode_records(records)
+    record_one = best_of(one_changed)
+
+    print(f"   list     dicts {dict_serialize * 1000:9.2f} ms    records cold {record_cold * 1000:7.2f} ms"
+          f"   warm {record_warm * 1000:7.2f} ms   one changed {record_one * 1000:7.2f} ms")
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000]
+    print("⏱️  Container record benchmark")
+    for count in sizes:
+        bench(count)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the Docker backends of Not a cPanel
+Compares the docker CLI against the Engine API socket for refresh_containers,
+start_container and remove_container
+
+Usage: python bench_docker_backends.py [iterations] [image]
+"""
+
+import sys
+import time
+import statistics
+
+from docker_backend import CLIBackend, EngineAPIBackend, DockerEngineClient
+from server import DockerManager, DOCKER_CONFIG, secure_run_command
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return f"mean {statistics.mean(samples) * 1000:8.2f} ms   p50 {statistics.median(samples) * 1000:8.2f} ms   p95 {p95 * 1000:8.2f} ms"
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def bench_backend(label, manager, iterations, image):
+    refresh, start, remove = [], [], []
+    for i in range(iterations):
+        elapsed, _ = timed(manager.refresh_containers)
+        refresh.append(elapsed)
+
+        # Container setup is not timed, it always goes through the CLI
+        name = f'bench-{label}-{i}'
+        created = secure_run_command(['docker', 'create', '--name', name, image])
+        if not created['success']:
+            print(f"❌ Could not create {name}: {created['stderr']}")
+            return
+        manager.refresh_containers()
+
+        elapsed, result = timed(manager.start_container, name)
+        start.append(elapsed)
+        if not result['success']:
+            print(f"⚠️  start_container failed: {result['stderr']}")
+
+        elapsed, result = timed(manager.remove_container, name, force=True)
+        remove.append(elapsed)
+        if not result['success']:
+            print(f"⚠️  remove_container failed: {result.get('stderr') or result.get('error')}")
+
+    print(f"\n📊 {label} backend ({iterations} iterations)")
+    print(f"   refresh_containers  {summarize(refresh)}")
+    print(f"   start_container     {summarize(start)}")
+    print(f"   remove_container    {summarize(remove)}")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    image = sys.argv[2] if len(sys.argv) > 2 else 'nginx:alpine'
+
+    print("=" * 60)
+    print("  🐳 Docker backend benchmark")
+    print("=" * 60)
+
+    cli = CLIBackend(secure_run_command)
+    client = DockerEngineClient(DOCKER_CONFIG['socket'])
+    if not client.ping():
+        print(f"❌ Docker socket {DOCKER_CONFIG['socket']} is not reachable")
+        sys.exit(1)
+
+    bench_backend('cli', DockerManager(backend=cli), iterations, image)
+    # No fallback here, a socket failure must not be measured as a CLI call
+    bench_backend('api', DockerManager(backend=EngineAPIBackend(client)), iterations, image)
+    client.close()
+
+
+if __name__ == '__main__':
+    main()
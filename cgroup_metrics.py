@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+cgroup v2 metrics collector for Not a cPanel
+Reads container CPU, memory and block I/O straight from the cgroup
+filesystem and network counters from each container's /proc/<pid>/net/dev,
+so stats sampling does not have to go through the Docker daemon
+"""
+
+import os
+import re
+import time
+import logging
+from typing import Dict, Optional, Callable
+
+logger = logging.getLogger(__name__)
+
+# systemd cgroup driver: system.slice/docker-<id>.scope, cgroupfs driver: docker/<id>
+SCOPE_PATTERN = re.compile(r'^docker-([0-9a-f]{64})\.scope$')
+CGROUPFS_PATTERN = re.compile(r'^([0-9a-f]{64})$')
+
+
+def _read(path: str) -> str:
+    with open(path) as f:
+        return f.read()
+
+
+def _read_keyed(path: str) -> Dict[str, int]:
+    """Parse a flat 'key value' file such as cpu.stat or memory.stat"""
+    values = {}
+    for line in _read(path).splitlines():
+        key, _, value = line.partition(' ')
+        if value.isdigit():
+            values[key] = int(value)
+    return values
+
+
+class CgroupCollector:
+    """Collects per-container resource usage from cgroup v2 files"""
+
+    def __init__(self, fallback: Optional[Callable[[], Optional[Dict[str, Dict[str, float]]]]] = None,
+                 running_ids: Optional[Callable[[], set]] = None,
+                 cgroup_root: str = '/sys/fs/cgroup', proc_root: str = '/proc'):
+        self.fallback = fallback
+        self.running_ids = running_ids
+        self.cgroup_root = cgroup_root
+        self.proc_root = proc_root
+        self._cpu: Dict[str, tuple] = {}  # short id -> (monotonic time, usage_usec)
+        self._host_memory: Optional[float] = None
+        self._warned = False
+        self.fallbacks = 0
+
+    def available(self) -> bool:
+        """True when the unified (v2) hierarchy is mounted and readable"""
+        return os.access(os.path.join(self.cgroup_root, 'cgroup.controllers'), os.R_OK)
+
+    def cgroup_paths(self) -> Dict[str, str]:
+        """Map short container IDs to their cgroup directories"""
+        paths = {}
+        for parent, pattern in (('system.slice', SCOPE_PATTERN), ('docker', CGROUPFS_PATTERN)):
+            directory = os.path.join(self.cgroup_root, parent)
+            try:
+                entries = os.listdir(directory)
+            except OSError:
+                continue
+            for entry in entries:
+                match = pattern.match(entry)
+                if match:
+                    paths[match.group(1)[:12]] = os.path.join(directory, entry)
+        return paths
+
+    def _host_memory_total(self) -> float:
+        if self._host_memory is None:
+            self._host_memory = 0.0
+            try:
+                for line in _read(os.path.join(self.proc_root, 'meminfo')).splitlines():
+                    if line.startswith('MemTotal:'):
+                        self._host_memory = float(line.split()[1]) * 1024
+                        break
+            except OSError:
+                pass
+        return self._host_memory
+
+    def _network(self, path: str):
+        """Sum rx/tx bytes over the container's interfaces, via any of its processes"""
+        pid = _read(os.path.join(path, 'cgroup.procs')).split('\n', 1)[0].strip()
+        if not pid:
+            return 0.0, 0.0
+        rx = tx = 0.0
+        for line in _read(os.path.join(self.proc_root, pid, 'net', 'dev')).splitlines()[2:]:
+            interface, _, counters = line.partition(':')
+            if interface.strip() == 'lo':
+                continue
+            fields = counters.split()
+            if len(fields) >= 9:
+                rx += int(fields[0])
+                tx += int(fields[8])
+        return rx, tx
+
+    def _block_io(self, path: str):
+        read = write = 0.0
+        for line in _read(os.path.join(path, 'io.stat')).splitlines():
+            for field in line.split()[1:]:
+                key, _, value = field.partition('=')
+                if key == 'rbytes':
+                    read += int(value)
+                elif key == 'wbytes':
+                    write += int(value)
+        return read, write
+
+    def read_container(self, container_id: str, path: str) -> Dict[str, float]:
+        now = time.monotonic()
+        usage = _read_keyed(os.path.join(path, 'cpu.stat')).get('usage_usec', 0)
+        cpu = 0.0
+        previous = self._cpu.get(container_id)
+        if previous and now > previous[0] and usage >= previous[1]:
+            cpu = (usage - previous[1]) / ((now - previous[0]) * 1e6) * 100.0
+        self._cpu[container_id] = (now, usage)
+
+        memory_current = float(_read(os.path.join(path, 'memory.current')).strip())
+        # Match `docker stats`: inactive page cache is not counted as usage
+        inactive = _read_keyed(os.path.join(path, 'memory.stat')).get('inactive_file', 0)
+        limit = _read(os.path.join(path, 'memory.max')).strip()
+        memory_limit = self._host_memory_total() if limit == 'max' else float(limit)
+
+        block_read, block_write = self._block_io(path)
+        try:
+            net_rx, net_tx = self._network(path)
+        except OSError:
+            net_rx = net_tx = 0.0
+        return {
+            'cpu_percent': round(cpu, 2),
+            'memory_usage': max(memory_current - inactive, 0.0),
+            'memory_limit': memory_limit,
+            'net_rx': net_rx,
+            'net_tx': net_tx,
+            'block_read': block_read,
+            'block_write': block_write
+        }
+
+    def _use_fallback(self, reason: str) -> Optional[Dict[str, Dict[str, float]]]:
+        if not self._warned:
+            logger.warning(f"cgroup metrics unavailable ({reason}), using the Docker daemon for stats")
+            self._warned = True
+        self.fallbacks += 1
+        return self.fallback() if self.fallback else None
+
+    def collect(self) -> Optional[Dict[str, Dict[str, float]]]:
+        if not self.available():
+            return self._use_fallback('no readable cgroup v2 hierarchy')
+        samples = {}
+        for container_id, path in self.cgroup_paths().items():
+            try:
+                samples[container_id] = self.read_container(container_id, path)
+            except (OSError, ValueError):
+                # The container most likely stopped between listing and reading
+                continue
+        for container_id in [cid for cid in self._cpu if cid not in samples]:
+            del self._cpu[container_id]
+        if self.running_ids:
+            missing = self.running_ids() - samples.keys()
+            if missing:
+                fallback = self._use_fallback(f'{len(missing)} running containers without a readable cgroup')
+                for container_id in missing:
+                    if fallback and container_id in fallback:
+                        samples[container_id] = fallback[container_id]
+        return samples
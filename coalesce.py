@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Call coalescing for Not a cPanel
+SingleFlight lets concurrent callers of the same read share one execution;
+Debouncer merges refresh requests that arrive close together into one run
+that is still guaranteed to start after each request was made
+"""
+
+import time
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class _Call:
+    __slots__ = ('created', 'done', 'result', 'error')
+
+    def __init__(self):
+        self.created = time.monotonic()
+        self.done = False
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+    def outcome(self) -> Any:
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight:
+    """Share one in-flight execution between concurrent callers with the same key
+
+    A caller that arrives while a call with its key is running waits for that
+    call and gets its result (or exception) instead of starting its own. Use
+    it only where a result that started slightly before the caller arrived is
+    acceptable, i.e. for reads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._events: Dict[Hashable, threading.Event] = {}
+        self.calls = 0
+        self.executions = 0
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            if call is not None:
+                finished = self._events[key]
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                finished = self._events[key] = threading.Event()
+                self.executions += 1
+                leader = True
+        if not leader:
+            finished.wait()
+            return call.outcome()
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+        finally:
+            with self._lock:
+                del self._calls[key]
+                del self._events[key]
+            call.done = True
+            finished.set()
+        return call.outcome()
+
+    def stats(self) -> Dict[str, int]:
+        return {'calls': self.calls, 'executions': self.executions, 'saved': self.calls - self.executions}
+
+
+class Debouncer:
+    """Merge requests to run `fn` that arrive within `window` seconds of each other
+
+    request() returns the result of a run that started after the request was
+    made, so it is safe to call right after a mutation. Requests arriving
+    while a run is executing are merged into the next run. With
+    join_running=True a request accepts a run that is already executing,
+    which suits readers that only want reasonably fresh data. At most one run
+    executes at a time, on the thread of one of the waiting callers.
+    """
+
+    def __init__(self, fn: Callable[[], Any], window: float = 0.05):
+        self.fn = fn
+        self.window = window
+        self._cond = threading.Condition()
+        self._pending: Optional[_Call] = None  # accepting requests, not started yet
+        self._running: Optional[_Call] = None  # executing, or waiting out its window
+        self.requests = 0
+        self.runs = 0
+
+    def request(self, join_running: bool = False) -> Any:
+        with self._cond:
+            self.requests += 1
+            if join_running and self._running is not None:
+                call = self._running
+            else:
+                if self._pending is None:
+                    self._pending = _Call()
+                call = self._pending
+            while not call.done:
+                if self._running is None and self._pending is not None:
+                    self._execute()
+                else:
+                    self._cond.wait()
+        return call.outcome()
+
+    def _execute(self):
+        """Run the pending call; entered and left with the condition held"""
+        call = self._running = self._pending
+        # Keep accepting requests into this call until its window closes
+        remaining = call.created + self.window - time.monotonic()
+        while remaining > 0:
+            self._cond.wait(remaining)
+            remaining = call.created + self.window - time.monotonic()
+        self._pending = None
+        self._cond.release()
+        try:
+            call.result = self.fn()
+        except BaseException as e:
+            call.error = e
+        finally:
+            self._cond.acquire()
+            call.done = True
+            self._running = None
+            self.runs += 1
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        return {'requests': self.requests, 'runs': self.runs, 'saved': self.requests - self.runs}
@@ -0,0 +1,519 @@
+#!/usr/bin/env python3
+"""
+Content-addressed web content sync for Not a cPanel
+Sites upload a manifest of file hashes, send only the blobs the server does
+not have yet (in chunks), and the site directory is then brought in line by
+copying blobs from a store shared by every site
+"""
+
+import os
+import stat
+import json
+import time
+import uuid
+import fcntl
+import errno
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional, Any, Set
+
+logger = logging.getLogger(__name__)
+
+HASH_LENGTH = 64
+READ_SIZE = 1024 * 1024
+FICLONE = 0x40049409  # linux/fs.h: share extents copy-on-write (btrfs, xfs with reflink)
+
+
+class SyncError(ValueError):
+    """A manifest, upload or commit that cannot be accepted"""
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def clone_file(source_fd: int, target_fd: int):
+    """Copy a file's content between fds, as a reflink where the filesystem supports it"""
+    try:
+        fcntl.ioctl(target_fd, FICLONE, source_fd)
+        return
+    except OSError:
+        pass
+    offset, size = 0, os.fstat(source_fd).st_size
+    while offset < size:
+        sent = os.sendfile(target_fd, source_fd, offset, size - offset)
+        if not sent:
+            break
+        offset += sent
+
+
+def valid_digest(digest: str) -> bool:
+    return len(digest) == HASH_LENGTH and all(c in '0123456789abcdef' for c in digest)
+
+
+def normalize_manifest(manifest: Any, max_files: int) -> Dict[str, Dict[str, Any]]:
+    """Check a {path: {'sha256', 'size'}} manifest and return it with normalized relative paths"""
+    if not isinstance(manifest, dict):
+        raise SyncError('manifest must map file paths to {"sha256", "size"}')
+    if len(manifest) > max_files:
+        raise SyncError(f'manifest lists more than {max_files} files')
+    files = {}
+    for path, entry in manifest.items():
+        if not isinstance(path, str) or not isinstance(entry, dict):
+            raise SyncError(f'invalid manifest entry: {path!r}')
+        clean = os.path.normpath(path.replace('\\', '/')).lstrip('/')
+        parts = clean.split('/')
+        if clean in ('', '.') or '..' in parts or any(part.startswith('.sync-') for part in parts):
+            raise SyncError(f'invalid path in manifest: {path!r}')
+        digest = str(entry.get('sha256', '')).lower()
+        size = entry.get('size')
+        if not valid_digest(digest) or not isinstance(size, int) or size < 0:
+            raise SyncError(f'invalid sha256 or size for {path!r}')
+        if clean in files:
+            raise SyncError(f'duplicate path in manifest: {path!r}')
+        files[clean] = {'sha256': digest, 'size': size}
+    # A path cannot be both a file and a directory
+    directories = {os.path.dirname(path) for path in files}
+    for directory in list(directories):
+        while directory:
+            if directory in files:
+                raise SyncError(f'{directory!r} is listed as a file and used as a directory')
+            directory = os.path.dirname(directory)
+    return files
+
+
+class BlobStore:
+    """Files stored once by SHA-256 under <root>/blobs/ab/cdef...
+
+    Blobs are read-only and copied (reflinked where the filesystem can)
+    into site directories, never linked: containers can write to their
+    site directory, and must not be able to reach a stored blob through it.
+    What is referenced is tracked by ContentSync, which tells collect()
+    which blobs to keep.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.blob_dir = os.path.join(self.root, 'blobs')
+        self.upload_dir = os.path.join(self.root, 'uploads')
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.upload_dir, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir, digest[:2], digest[2:])
+
+    def has(self, digest: str) -> bool:
+        return os.path.exists(self.path(digest))
+
+    def _install(self, source: str, digest: str):
+        """Move a verified file from upload_dir into place as the blob for digest"""
+        target = self.path(digest)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.chmod(source, 0o444)
+        os.replace(source, target)
+
+    def ingest(self, fd: int, digest: str) -> bool:
+        """Adopt the content of an open file (e.g. from an earlier deploy) as the blob for digest
+
+        The content is hashed while it is copied into the store, so what is
+        verified is exactly what is stored, whatever happens to the source
+        file meanwhile.
+        """
+        if self.has(digest):
+            return True
+        temp_path = os.path.join(self.upload_dir, f'{digest}.{uuid.uuid4().hex}.ingest')
+        hasher = hashlib.sha256()
+        try:
+            with open(temp_path, 'wb') as target:
+                offset = 0
+                while True:
+                    block = os.pread(fd, READ_SIZE, offset)
+                    if not block:
+                        break
+                    hasher.update(block)
+                    target.write(block)
+                    offset += len(block)
+            if hasher.hexdigest() == digest:
+                self._install(temp_path, digest)
+                return True
+        except OSError as e:
+            logger.warning(f"Could not ingest a file as blob {digest}: {e}")
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        return False
+
+    def write_chunk(self, digest: str, size: int, offset: int, data: bytes) -> Dict[str, Any]:
+        """Append one chunk of an upload; the blob is verified and stored once size bytes arrived"""
+        if self.has(digest):
+            return {'received': size, 'complete': True}
+        part = os.path.join(self.upload_dir, f'{digest}.part')
+        with self._lock:
+            received = os.path.getsize(part) if os.path.exists(part) else 0
+            if offset != received:
+                raise SyncError(f'expected offset {received}, got {offset}')
+            if received + len(data) > size:
+                raise SyncError('upload is larger than the declared size')
+            with open(part, 'ab') as f:
+                f.write(data)
+            received += len(data)
+            if received < size:
+                return {'received': received, 'complete': False}
+            # Set aside under the lock and hashed outside it, so verifying a large blob holds up no other upload
+            verifying = os.path.join(self.upload_dir, f'{digest}.{uuid.uuid4().hex}.verify')
+            os.replace(part, verifying)
+        try:
+            valid = hash_file(verifying) == digest
+            if valid:
+                self._install(verifying, digest)
+        except OSError:
+            valid = False
+        if not valid:
+            try:
+                os.remove(verifying)
+            except OSError:
+                pass
+            raise SyncError('uploaded content does not match its sha256; upload it again')
+        return {'received': received, 'complete': True}
+
+    def received(self, digest: str) -> int:
+        part = os.path.join(self.upload_dir, f'{digest}.part')
+        return os.path.getsize(part) if os.path.exists(part) else 0
+
+    def collect(self, digests: List[str], keep: Set[str] = frozenset()) -> int:
+        """Remove the given blobs except those in keep; returns bytes freed"""
+        freed = 0
+        for digest in digests:
+            if digest in keep:
+                continue
+            path = self.path(digest)
+            try:
+                size = os.stat(path).st_size
+                os.remove(path)
+                freed += size
+            except OSError:
+                continue
+        return freed
+
+
+class SyncSession:
+    __slots__ = ('id', 'site', 'files', 'missing', 'created')
+
+    def __init__(self, site: str, files: Dict[str, Dict[str, Any]]):
+        self.id = uuid.uuid4().hex
+        self.site = site
+        self.files = files
+        self.missing: Dict[str, int] = {}  # digest -> size, still to be uploaded
+        self.created = time.time()
+
+
+def _open_directory(name: str, dir_fd: int) -> int:
+    return os.open(name, os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW, dir_fd=dir_fd)
+
+
+def _remove_tree(name: str, dir_fd: int):
+    """rmtree relative to a directory fd, never following symlinks"""
+    for _, dirnames, filenames, fd in os.fwalk(name, topdown=False, dir_fd=dir_fd):
+        for filename in filenames:
+            os.unlink(filename, dir_fd=fd)
+        for dirname in dirnames:
+            if stat.S_ISLNK(os.stat(dirname, dir_fd=fd, follow_symlinks=False).st_mode):
+                os.unlink(dirname, dir_fd=fd)
+            else:
+                os.rmdir(dirname, dir_fd=fd)
+    os.rmdir(name, dir_fd=dir_fd)
+
+
+class ContentSync:
+    """Manifest-driven sync of site directories from a BlobStore
+
+    The site directory is bind-mounted into its container, which pins the
+    directory inode: swapping in a new directory with a rename would leave
+    the container serving the old one. Files are therefore switched one by
+    one, each with an atomic os.replace of a copied temp name, so a
+    request never sees a half-written file; during a commit the site can
+    briefly serve a mix of old and new files. The saved state records each
+    file's inode, size and mtime, so a file the container has rewritten
+    since the last sync is copied again.
+
+    The container can write to its site directory, so a commit works on
+    directory file descriptors opened with O_NOFOLLOW and replaces any
+    symlink it meets instead of following it out of the site; files are
+    adopted into the store only through O_NOFOLLOW fds. A blob is kept
+    while any site's state or any open session names it.
+    """
+
+    def __init__(self, store: BlobStore, content_root: str = './web-content', session_ttl: float = 3600.0,
+                 max_files: int = 100000):
+        self.store = store
+        self.content_root = content_root
+        self.session_ttl = session_ttl
+        self.max_files = max_files
+        self.state_dir = os.path.join(store.root, 'sites')
+        os.makedirs(self.state_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, SyncSession] = {}
+        self._site_locks: Dict[str, threading.Lock] = {}
+
+    def site_dir(self, site: str) -> str:
+        return os.path.join(self.content_root, site)
+
+    def _state_path(self, site: str) -> str:
+        return os.path.join(self.state_dir, f'{site}.json')
+
+    def _load_state(self, site: str) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self._state_path(site)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _referenced(self) -> Set[str]:
+        """Digests named by the saved state of any site"""
+        digests = set()
+        for filename in os.listdir(self.state_dir):
+            if filename.endswith('.json'):
+                digests.update(entry['sha256'] for entry in self._load_state(filename[:-5]).values())
+        return digests
+
+    def _save_state(self, site: str, files: Dict[str, Dict[str, Any]]):
+        temp_path = f'{self._state_path(site)}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(files, f)
+        os.replace(temp_path, self._state_path(site))
+
+    def _expire(self):
+        cutoff = time.time() - self.session_ttl
+        for session_id in [sid for sid, s in self._sessions.items() if s.created < cutoff]:
+            del self._sessions[session_id]
+
+    def begin(self, site: str, manifest: Any) -> Dict[str, Any]:
+        """Register a manifest; returns the blobs the client still has to upload"""
+        files = normalize_manifest(manifest, self.max_files)
+        root = self.site_dir(site)
+        # Registered first, so its digests are pinned before they are checked
+        session = SyncSession(site, files)
+        with self._lock:
+            self._expire()
+            self._sessions[session.id] = session
+        missing = session.missing
+        for path, entry in files.items():
+            digest = entry['sha256']
+            if digest in missing or self.store.has(digest):
+                continue
+            # A file deployed before the store existed (or by hand) can be adopted instead of uploaded
+            fd = self._open_site_file(root, path)
+            if fd is not None:
+                try:
+                    info = os.fstat(fd)
+                    if stat.S_ISREG(info.st_mode) and info.st_size == entry['size'] \
+                            and self.store.ingest(fd, digest):
+                        continue
+                finally:
+                    os.close(fd)
+            missing[digest] = entry['size']
+        return {
+            'session_id': session.id,
+            'files': len(files),
+            'missing': [{'sha256': digest, 'size': size, 'received': self.store.received(digest)}
+                        for digest, size in missing.items()],
+            'upload_bytes': sum(missing.values())
+        }
+
+    def session(self, session_id: str) -> Optional[SyncSession]:
+        with self._lock:
+            self._expire()
+            return self._sessions.get(session_id)
+
+    def upload(self, session_id: str, digest: str, offset: int, data: bytes) -> Dict[str, Any]:
+        session = self.session(session_id)
+        if session is None:
+            raise LookupError('Unknown or expired sync session')
+        if digest not in session.missing:
+            if self.store.has(digest):
+                size = next((e['size'] for e in session.files.values() if e['sha256'] == digest), 0)
+                return {'received': size, 'complete': True}
+            raise SyncError('blob is not part of this sync')
+        result = self.store.write_chunk(digest, session.missing[digest], offset, data)
+        if result['complete']:
+            session.missing.pop(digest, None)
+        return result
+
+    def _open_site_file(self, root: str, path: str) -> Optional[int]:
+        """Read-only fd of an existing site file, or None if it or any directory on the way is a symlink"""
+        try:
+            fd = _open_directory(root, None)
+        except OSError:
+            return None
+        try:
+            for part in path.split('/')[:-1]:
+                child = _open_directory(part, fd)
+                os.close(fd)
+                fd = child
+            # O_NONBLOCK: a FIFO planted by the container must not hang the request
+            return os.open(os.path.basename(path), os.O_RDONLY | os.O_NOFOLLOW | os.O_NONBLOCK, dir_fd=fd)
+        except OSError:
+            return None
+        finally:
+            os.close(fd)
+
+    def _open_site_directory(self, root_fd: int, relative_dir: str) -> int:
+        """fd of a directory below the site root, created as needed; symlinks and files in the way are replaced"""
+        fd = os.dup(root_fd)
+        for part in relative_dir.split('/') if relative_dir else []:
+            try:
+                child = _open_directory(part, fd)
+            except FileNotFoundError:
+                os.mkdir(part, dir_fd=fd)
+                child = _open_directory(part, fd)
+            except OSError as e:
+                if e.errno not in (errno.ELOOP, errno.ENOTDIR):
+                    os.close(fd)
+                    raise
+                os.unlink(part, dir_fd=fd)
+                os.mkdir(part, dir_fd=fd)
+                child = _open_directory(part, fd)
+            os.close(fd)
+            fd = child
+        return fd
+
+    def _copy_into_place(self, digest: str, dir_fd: int, name: str) -> os.stat_result:
+        """Copy a blob over a site file through a temp name; returns the stat of the new file"""
+        temp_name = f'.sync-{uuid.uuid4().hex}'
+        source_fd = os.open(self.store.path(digest), os.O_RDONLY)
+        try:
+            target_fd = os.open(temp_name, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW, 0o644, dir_fd=dir_fd)
+            try:
+                clone_file(source_fd, target_fd)
+                info = os.fstat(target_fd)
+            except OSError:
+                os.close(target_fd)
+                os.unlink(temp_name, dir_fd=dir_fd)
+                raise
+            os.close(target_fd)
+        finally:
+            os.close(source_fd)
+        os.replace(temp_name, name, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+        return info
+
+    def commit(self, session_id: str) -> Dict[str, Any]:
+        """Bring the site directory in line with the session's manifest"""
+        session = self.session(session_id)
+        if session is None:
+            raise LookupError('Unknown or expired sync session')
+        absent = [digest for digest in session.missing if not self.store.has(digest)]
+        if absent:
+            raise SyncError(f'{len(absent)} blobs have not been uploaded yet')
+        with self._lock:
+            site_lock = self._site_locks.setdefault(session.site, threading.Lock())
+        started = time.time()
+        with site_lock:
+            # Every blob has to be there before the first file is switched
+            absent = {entry['sha256']: entry['size'] for entry in session.files.values()
+                      if not self.store.has(entry['sha256'])}
+            if absent:
+                session.missing.update(absent)
+                raise SyncError(f'{len(absent)} blobs are no longer stored; upload them again')
+            root = self.site_dir(session.site)
+            os.makedirs(os.path.dirname(os.path.abspath(root)), exist_ok=True)
+            try:
+                os.mkdir(root)
+            except FileExistsError:
+                pass
+            try:
+                root_fd = _open_directory(root, None)
+            except OSError as e:
+                raise SyncError(f'site directory is not a plain directory: {e}')
+            directory, dir_fd = None, None
+            try:
+                previous = self._load_state(session.site)
+                state: Dict[str, Dict[str, Any]] = {}
+                copied = unchanged = 0
+                # Grouped by directory, so each directory is opened once
+                for path in sorted(session.files, key=lambda p: (os.path.dirname(p), p)):
+                    entry = session.files[path]
+                    if os.path.dirname(path) != directory:
+                        if dir_fd is not None:
+                            os.close(dir_fd)
+                            dir_fd = None
+                        directory = os.path.dirname(path)
+                        dir_fd = self._open_site_directory(root_fd, directory)
+                    name = os.path.basename(path)
+                    known = previous.get(path)
+                    try:
+                        current = os.stat(name, dir_fd=dir_fd, follow_symlinks=False)
+                        if known and known['sha256'] == entry['sha256'] and stat.S_ISREG(current.st_mode) \
+                                and (current.st_ino, current.st_mtime_ns, current.st_size) \
+                                == (known.get('ino'), known.get('mtime_ns'), known['size']):
+                            state[path] = known
+                            unchanged += 1
+                            continue
+                        if stat.S_ISDIR(current.st_mode):
+                            _remove_tree(name, dir_fd)
+                    except FileNotFoundError:
+                        pass
+                    info = self._copy_into_place(entry['sha256'], dir_fd, name)
+                    state[path] = dict(entry, ino=info.st_ino, mtime_ns=info.st_mtime_ns)
+                    copied += 1
+                removed = self._remove_extra(root_fd, session.files)
+            finally:
+                if dir_fd is not None:
+                    os.close(dir_fd)
+                os.close(root_fd)
+            self._save_state(session.site, state)
+            with self._lock:
+                self._sessions.pop(session_id, None)
+                self._expire()
+                keep = self._referenced()
+                keep.update(entry['sha256'] for s in self._sessions.values() for entry in s.files.values())
+                # Under the session lock, so a sync starting now sees either the blob or its absence
+                freed = self.store.collect([entry['sha256'] for entry in previous.values()], keep)
+        return {
+            'site': session.site,
+            'files': len(session.files),
+            'updated': copied,
+            'unchanged': unchanged,
+            'removed': removed,
+            'freed_bytes': freed,
+            'duration': round(time.time() - started, 3)
+        }
+
+    def _remove_extra(self, root_fd: int, files: Dict[str, Dict[str, Any]]) -> int:
+        """Delete files, symlinks and then empty directories that the manifest no longer lists"""
+        removed = 0
+        keep_dirs = {os.path.dirname(path) for path in files}
+        for directory in list(keep_dirs):
+            while directory:
+                directory = os.path.dirname(directory)
+                keep_dirs.add(directory)
+        # Bottom-up, so a directory's children are gone before it is checked for emptiness
+        for current, dirnames, filenames, dir_fd in os.fwalk('.', topdown=False, dir_fd=root_fd):
+            relative_dir = os.path.normpath(current)
+            relative_dir = '' if relative_dir == '.' else relative_dir
+            for filename in filenames:
+                if os.path.join(relative_dir, filename) not in files:
+                    os.unlink(filename, dir_fd=dir_fd)
+                    removed += 1
+            for dirname in dirnames:
+                relative = os.path.join(relative_dir, dirname)
+                if stat.S_ISLNK(os.stat(dirname, dir_fd=dir_fd, follow_symlinks=False).st_mode):
+                    os.unlink(dirname, dir_fd=dir_fd)
+                    removed += 1
+                elif relative not in keep_dirs:
+                    try:
+                        os.rmdir(dirname, dir_fd=dir_fd)
+                    except OSError:
+                        pass
+        return removed
+
+    def manifest(self, site: str) -> Dict[str, Dict[str, Any]]:
+        """Manifest of the last sync of a site"""
+        return {path: {'sha256': entry['sha256'], 'size': entry['size']}
+                for path, entry in self._load_state(site).items()}
@@ -0,0 +1,757 @@
+#!/usr/bin/env python3
+"""
+Docker backends for Not a cPanel
+Talks to the Docker daemon either through the docker CLI or directly over the
+Engine API unix socket using persistent keep-alive connections
+"""
+
+import os
+import re
+import json
+import socket
+import logging
+import threading
+import subprocess
+import http.client
+from datetime import datetime, timezone
+from queue import LifoQueue, Empty, Full
+from urllib.parse import urlencode, quote
+from typing import Dict, List, Optional, Any, Callable, Iterator
+
+from stats import parse_cli_stats, parse_engine_stats, parse_size
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET_PATH = '/var/run/docker.sock'
+API_VERSION = 'v1.41'
+
+# "<layer id>: <status>" lines printed by `docker pull`
+PULL_LAYER_LINE = re.compile(r'^([0-9a-f]{12}): (.+)$')
+
+
+class DockerAPIError(ConnectionError):
+    """Non-success HTTP status from the Docker daemon on a streaming endpoint"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class LineStream:
+    """Iterator over output lines that can be closed from another thread"""
+
+    def __init__(self, lines: Iterator[bytes], close: Callable[[], None]):
+        self._lines = lines
+        self._close = close
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if self._closed:
+            raise StopIteration
+        try:
+            line = next(self._lines)
+        except StopIteration:
+            self.close()
+            raise
+        return line.decode('utf-8', errors='replace').rstrip('\r\n')
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._close()
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection that talks to a unix domain socket"""
+
+    def __init__(self, socket_path: str, timeout: float = 30):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+class DockerEngineClient:
+    """Minimal Docker Engine API client with a pool of keep-alive connections"""
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET_PATH, pool_size: int = 8, timeout: float = 30):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._pool: LifoQueue = LifoQueue(maxsize=pool_size)
+
+    def _acquire(self) -> UnixHTTPConnection:
+        try:
+            return self._pool.get_nowait()
+        except Empty:
+            return UnixHTTPConnection(self.socket_path, timeout=self.timeout)
+
+    def _release(self, conn: UnixHTTPConnection):
+        try:
+            self._pool.put_nowait(conn)
+        except Full:
+            conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except Empty:
+                break
+
+    def request(self, method: str, path: str, params: Optional[Dict[str, Any]] = None,
+                body: Optional[Any] = None, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Perform an API request and return {'status', 'data'}; raises OSError if the daemon is unreachable"""
+        url = f'/{API_VERSION}{path}'
+        if params:
+            url += '?' + urlencode(params)
+        headers = {'Host': 'docker'}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+
+        # A pooled connection may have been closed by the daemon since it was
+        # last used, so retry once on a fresh connection before giving up
+        for attempt in range(2):
+            conn = self._acquire()
+            try:
+                conn.timeout = timeout or self.timeout
+                conn.request(method, url, body=payload, headers=headers)
+                response = conn.getresponse()
+                raw = response.read()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError,
+                    http.client.CannotSendRequest, http.client.ResponseNotReady):
+                conn.close()
+                if attempt:
+                    raise
+                continue
+            except http.client.HTTPException as e:
+                conn.close()
+                raise ConnectionError(f'Invalid response from Docker daemon: {e}')
+            except Exception:
+                conn.close()
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            data: Any = None
+            if raw:
+                try:
+                    data = json.loads(raw)
+                except ValueError:
+                    data = raw.decode(errors='replace')
+            return {'status': response.status, 'data': data}
+        raise ConnectionError('Docker daemon closed the connection')
+
+    def open_stream(self, path: str, params: Optional[Dict[str, Any]] = None, method: str = 'GET',
+                    timeout: Optional[float] = None):
+        """Open a dedicated connection to a streaming endpoint and return (connection, response)"""
+        url = f'/{API_VERSION}{path}'
+        if params:
+            url += '?' + urlencode(params)
+        conn = UnixHTTPConnection(self.socket_path, timeout=timeout)
+        try:
+            conn.request(method, url, headers={'Host': 'docker'})
+            response = conn.getresponse()
+        except http.client.HTTPException as e:
+            conn.close()
+            raise ConnectionError(f'Invalid response from Docker daemon: {e}')
+        except Exception:
+            conn.close()
+            raise
+        if response.status != 200:
+            raw = response.read()
+            conn.close()
+            try:
+                message = json.loads(raw).get('message', '')
+            except (ValueError, AttributeError):
+                message = ''
+            raise DockerAPIError(response.status, message or f'HTTP {response.status} for {path}')
+        return conn, response
+
+    def stream(self, path: str, params: Optional[Dict[str, Any]] = None, method: str = 'GET',
+               timeout: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """Open a dedicated connection to a streaming endpoint and iterate its JSON lines"""
+        conn, response = self.open_stream(path, params, method, timeout)
+        return _iter_json_lines(iter(response.readline, b''), conn.close)
+
+    def ping(self) -> bool:
+        try:
+            return self.request('GET', '/_ping', timeout=2)['status'] == 200
+        except OSError:
+            return False
+
+
+class CLIBackend:
+    """Backend that forks the docker CLI for every operation"""
+
+    name = 'cli'
+
+    def __init__(self, run_command: Callable[[List[str]], Dict[str, Any]],
+                 stream_command: Optional[Callable[[List[str]], Any]] = None,
+                 coalesce: Optional[Callable[..., Any]] = None):
+        self.run_command = run_command
+        self.stream_command = stream_command
+        # SingleFlight.do-style callable shared with the caller's run_command,
+        # so identical concurrent listings still fork docker only once
+        self.coalesce = coalesce
+
+    def _json_rows(self, command: List[str]) -> Optional[List[Dict[str, Any]]]:
+        """Rows of a `--format json` listing, or None if the command failed
+
+        With a stream_command each line is decoded as it comes off the pipe,
+        so only the parsed rows are held, never the whole output. Concurrent
+        identical listings share one execution when a coalesce callable is set.
+        """
+        if self.coalesce is None:
+            return self._read_json_rows(command)
+        rows = self.coalesce(('json_rows',) + tuple(command), self._read_json_rows, command)
+        # Each caller gets its own list; the rows themselves are only read
+        return list(rows) if rows is not None else None
+
+    def _read_json_rows(self, command: List[str]) -> Optional[List[Dict[str, Any]]]:
+        stream = None
+        if self.stream_command is None:
+            result = self.run_command(command)
+            if not result['success']:
+                return None
+            lines = result['stdout'].split('\n')
+        else:
+            stream = self.stream_command(command)
+            if stream is None:
+                return None
+            lines = stream
+        rows = []
+        try:
+            for line in lines:
+                if line.strip():
+                    rows.append(json.loads(line))
+        except (OSError, ValueError) as e:
+            # A torn or undecodable line means the listing is incomplete, not shorter
+            if stream is not None:
+                stream.close()
+            logger.error(f"{' '.join(command[:2])} output could not be read: {e}")
+            return None
+        if stream is not None and not stream.success:
+            logger.error(f"{' '.join(command[:2])} failed: {stream.stderr}")
+            return None
+        return rows
+
+    def list_containers(self) -> Optional[List[Dict[str, Any]]]:
+        return self._json_rows(['docker', 'ps', '-a', '--format', 'json'])
+
+    def get_container(self, container_id: str) -> Optional[Dict[str, Any]]:
+        result = self.run_command(['docker', 'inspect', '--type', 'container', container_id])
+        if not result['success']:
+            return None
+        try:
+            items = json.loads(result['stdout'])
+        except json.JSONDecodeError:
+            return None
+        return _inspect_to_cli_row(items[0], cli_format=True) if items else None
+
+    def list_images(self) -> Optional[List[Dict[str, Any]]]:
+        """Local images in the Engine API shape, one entry per image ID"""
+        rows = self._json_rows(['docker', 'images', '--digests', '--no-trunc', '--format', 'json'])
+        if rows is None:
+            return None
+        images: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            image_id = row.get('ID', '')
+            image = images.setdefault(image_id, {
+                'Id': image_id, 'RepoTags': [], 'RepoDigests': [],
+                'Size': int(parse_size(row.get('Size', '0B'))), 'Created': row.get('CreatedAt', '')
+            })
+            repository, tag, digest = row.get('Repository', '<none>'), row.get('Tag', '<none>'), row.get('Digest', '<none>')
+            if repository != '<none>' and tag != '<none>' and f'{repository}:{tag}' not in image['RepoTags']:
+                image['RepoTags'].append(f'{repository}:{tag}')
+            if repository != '<none>' and digest != '<none>' and f'{repository}@{digest}' not in image['RepoDigests']:
+                image['RepoDigests'].append(f'{repository}@{digest}')
+        return list(images.values())
+
+    def get_image(self, reference: str) -> Optional[Dict[str, Any]]:
+        result = self.run_command(['docker', 'image', 'inspect', reference])
+        if not result['success']:
+            return None
+        try:
+            items = json.loads(result['stdout'])
+        except json.JSONDecodeError:
+            return None
+        return items[0] if items else None
+
+    def info(self) -> Optional[Dict[str, Any]]:
+        """Daemon-wide facts (`docker info`): versions, storage driver, counts"""
+        result = self.run_command(['docker', 'info', '--format', 'json'])
+        if not result['success']:
+            return None
+        try:
+            data = json.loads(result['stdout'])
+        except json.JSONDecodeError:
+            return None
+        return data if isinstance(data, dict) else None
+
+    def events(self) -> Iterator[Dict[str, Any]]:
+        # Fixed argument list, nothing user supplied, so it does not need to
+        # go through secure_run_command (which would strip the '=')
+        proc = subprocess.Popen(
+            ['docker', 'events', '--format', 'json', '--filter', 'type=container', '--filter', 'type=image'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            shell=False
+        )
+
+        def close():
+            proc.terminate()
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        return _iter_json_lines(iter(proc.stdout.readline, b''), close)
+
+    def container_stats(self) -> Optional[Dict[str, Dict[str, float]]]:
+        """Resource usage of all running containers in one `docker stats` pass"""
+        rows = self._json_rows(['docker', 'stats', '--no-stream', '--format', 'json'])
+        if rows is None:
+            return None
+        return {row.get('ID', '')[:12]: parse_cli_stats(row) for row in rows}
+
+    def logs(self, container_id: str, follow: bool = False, tail: Optional[int] = None,
+             since: Optional[float] = None, until: Optional[float] = None) -> LineStream:
+        """Container log lines, each prefixed with its RFC3339 timestamp"""
+        cmd = ['docker', 'logs', '--timestamps']
+        if tail is not None:
+            cmd.extend(['--tail', str(tail)])
+        if since is not None:
+            cmd.extend(['--since', f'{since:.9f}'])
+        if until is not None:
+            cmd.extend(['--until', f'{until:.9f}'])
+        if follow:
+            cmd.append('--follow')
+        cmd.append(container_id)
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=False)
+
+        def close():
+            proc.terminate()
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        return LineStream(iter(proc.stdout.readline, b''), close)
+
+    def pull_image(self, image: str, on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                   timeout: float = 1800) -> Dict[str, Any]:
+        proc = subprocess.Popen(
+            ['docker', 'pull', image],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            shell=False
+        )
+        output = []
+        timed_out = threading.Event()
+
+        def kill():
+            timed_out.set()
+            proc.kill()
+        timer = threading.Timer(timeout, kill)
+        timer.start()
+        try:
+            for line in proc.stdout:
+                line = line.rstrip()
+                if not line:
+                    continue
+                output.append(line)
+                if on_progress:
+                    match = PULL_LAYER_LINE.match(line)
+                    on_progress({'id': match.group(1), 'status': match.group(2)} if match else {'status': line})
+            stderr = proc.stderr.read()
+            proc.wait()
+        finally:
+            timer.cancel()
+        if timed_out.is_set():
+            return {'success': False, 'stdout': '\n'.join(output), 'stderr': 'Command timed out', 'returncode': -1}
+        return {'success': proc.returncode == 0, 'stdout': '\n'.join(output), 'stderr': stderr.strip(),
+                'returncode': proc.returncode}
+
+    def start_container(self, container_id: str) -> Dict[str, Any]:
+        return self.run_command(['docker', 'start', container_id])
+
+    def stop_container(self, container_id: str) -> Dict[str, Any]:
+        return self.run_command(['docker', 'stop', container_id])
+
+    def restart_container(self, container_id: str) -> Dict[str, Any]:
+        return self.run_command(['docker', 'restart', container_id])
+
+    def remove_container(self, container_id: str, force: bool = False) -> Dict[str, Any]:
+        cmd = ['docker', 'rm']
+        if force:
+            cmd.append('-f')
+        cmd.append(container_id)
+        return self.run_command(cmd)
+
+
+class EngineAPIBackend:
+    """Backend that talks HTTP to the Docker daemon socket, falling back to the CLI when it is unreachable"""
+
+    name = 'api'
+
+    def __init__(self, client: DockerEngineClient, fallback: Optional[CLIBackend] = None):
+        self.client = client
+        self.fallback = fallback
+        self._fallback_logged = False
+        self._lock = threading.Lock()
+        self._cpu_counters: Dict[str, Dict[str, float]] = {}
+
+    def _unreachable(self, e: Exception, method: str, *args, **kwargs):
+        with self._lock:
+            if not self._fallback_logged:
+                logger.warning(f"Docker socket {self.client.socket_path} unreachable ({e}), falling back to CLI")
+                self._fallback_logged = True
+        if self.fallback:
+            return getattr(self.fallback, method)(*args, **kwargs)
+        if method in ('events', 'logs'):
+            raise e
+        if method in ('list_containers', 'get_container', 'container_stats', 'list_images', 'get_image', 'info'):
+            return None
+        return {'success': False, 'stdout': '', 'stderr': f'Docker socket unreachable: {e}', 'returncode': -1}
+
+    @staticmethod
+    def _result(response: Dict[str, Any], container_id: str) -> Dict[str, Any]:
+        # 304 means the container was already in the requested state, which
+        # the CLI treats as success as well
+        if response['status'] in (200, 201, 204, 304):
+            return {'success': True, 'stdout': container_id, 'stderr': '', 'returncode': 0}
+        data = response['data']
+        message = data.get('message', '') if isinstance(data, dict) else str(data or '')
+        return {'success': False, 'stdout': '', 'stderr': f'Error response from daemon: {message}',
+                'returncode': 1}
+
+    def _post(self, method: str, container_id: str, action: str, **params) -> Dict[str, Any]:
+        try:
+            response = self.client.request('POST', f'/containers/{quote(container_id, safe="")}/{action}',
+                                           params=params or None, timeout=60)
+        except OSError as e:
+            return self._unreachable(e, method, container_id)
+        return self._result(response, container_id)
+
+    def list_containers(self) -> Optional[List[Dict[str, Any]]]:
+        try:
+            response = self.client.request('GET', '/containers/json', params={'all': 1})
+        except OSError as e:
+            return self._unreachable(e, 'list_containers')
+        if response['status'] != 200 or not isinstance(response['data'], list):
+            return None
+        return [_engine_to_cli_row(item) for item in response['data']]
+
+    def get_container(self, container_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            response = self.client.request('GET', f'/containers/{quote(container_id, safe="")}/json')
+        except OSError as e:
+            return self._unreachable(e, 'get_container', container_id)
+        if response['status'] != 200 or not isinstance(response['data'], dict):
+            return None
+        return _inspect_to_cli_row(response['data'])
+
+    def list_images(self) -> Optional[List[Dict[str, Any]]]:
+        try:
+            response = self.client.request('GET', '/images/json', params={'digests': 'true'})
+        except OSError as e:
+            return self._unreachable(e, 'list_images')
+        if response['status'] != 200 or not isinstance(response['data'], list):
+            return None
+        return response['data']
+
+    def get_image(self, reference: str) -> Optional[Dict[str, Any]]:
+        try:
+            response = self.client.request('GET', f'/images/{quote(reference, safe="/:@")}/json')
+        except OSError as e:
+            return self._unreachable(e, 'get_image', reference)
+        if response['status'] != 200 or not isinstance(response['data'], dict):
+            return None
+        return response['data']
+
+    def info(self) -> Optional[Dict[str, Any]]:
+        try:
+            response = self.client.request('GET', '/info')
+        except OSError as e:
+            return self._unreachable(e, 'info')
+        if response['status'] != 200 or not isinstance(response['data'], dict):
+            return None
+        return response['data']
+
+    def events(self) -> Iterator[Dict[str, Any]]:
+        try:
+            return self.client.stream('/events', params={'filters': json.dumps({'type': ['container', 'image']})})
+        except OSError as e:
+            return self._unreachable(e, 'events')
+
+    def container_stats(self) -> Optional[Dict[str, Dict[str, float]]]:
+        """Resource usage of all running containers, one-shot stats over pooled connections"""
+        try:
+            response = self.client.request('GET', '/containers/json')
+        except OSError as e:
+            return self._unreachable(e, 'container_stats')
+        if response['status'] != 200 or not isinstance(response['data'], list):
+            return None
+        samples = {}
+        for item in response['data']:
+            container_id = item.get('Id', '')[:12]
+            try:
+                stats = self.client.request('GET', f'/containers/{container_id}/stats',
+                                            params={'stream': 'false', 'one-shot': 'true'})
+            except OSError as e:
+                return self._unreachable(e, 'container_stats')
+            if stats['status'] == 200 and isinstance(stats['data'], dict):
+                samples[container_id] = parse_engine_stats(stats['data'], self._cpu_counters.get(container_id))
+        self._cpu_counters = samples
+        return samples
+
+    def logs(self, container_id: str, follow: bool = False, tail: Optional[int] = None,
+             since: Optional[float] = None, until: Optional[float] = None) -> LineStream:
+        """Container log lines, each prefixed with its RFC3339 timestamp"""
+        params: Dict[str, Any] = {'stdout': 1, 'stderr': 1, 'timestamps': 1, 'follow': int(follow)}
+        if tail is not None:
+            params['tail'] = tail
+        if since is not None:
+            params['since'] = f'{since:.9f}'
+        if until is not None:
+            params['until'] = f'{until:.9f}'
+        try:
+            conn, response = self.client.open_stream(f'/containers/{quote(container_id, safe="")}/logs', params)
+        except DockerAPIError:
+            raise
+        except OSError as e:
+            return self._unreachable(e, 'logs', container_id, follow=follow, tail=tail, since=since, until=until)
+
+        def close():
+            # shutdown() wakes a reader blocked in recv, close() alone does not
+            if conn.sock:
+                try:
+                    conn.sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            conn.close()
+        return LineStream(_demux_lines(response), close)
+
+    def pull_image(self, image: str, on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                   timeout: float = 1800) -> Dict[str, Any]:
+        name, tag = split_image_reference(image)
+        try:
+            events = self.client.stream('/images/create', params={'fromImage': name, 'tag': tag},
+                                        method='POST', timeout=timeout)
+        except OSError as e:
+            return self._unreachable(e, 'pull_image', image, on_progress=on_progress, timeout=timeout)
+        output = []
+        try:
+            for event in events:
+                if 'error' in event:
+                    return {'success': False, 'stdout': '\n'.join(output),
+                            'stderr': event.get('error', ''), 'returncode': 1}
+                if 'id' in event and event.get('status') not in ('Downloading', 'Extracting'):
+                    output.append(f"{event['id']}: {event.get('status', '')}")
+                elif 'id' not in event:
+                    output.append(event.get('status', ''))
+                if on_progress:
+                    on_progress(event)
+        except OSError as e:
+            return {'success': False, 'stdout': '\n'.join(output), 'stderr': f'Pull interrupted: {e}',
+                    'returncode': -1}
+        return {'success': True, 'stdout': '\n'.join(output), 'stderr': '', 'returncode': 0}
+
+    def start_container(self, container_id: str) -> Dict[str, Any]:
+        return self._post('start_container', container_id, 'start')
+
+    def stop_container(self, container_id: str) -> Dict[str, Any]:
+        return self._post('stop_container', container_id, 'stop')
+
+    def restart_container(self, container_id: str) -> Dict[str, Any]:
+        return self._post('restart_container', container_id, 'restart')
+
+    def remove_container(self, container_id: str, force: bool = False) -> Dict[str, Any]:
+        try:
+            response = self.client.request('DELETE', f'/containers/{quote(container_id, safe="")}',
+                                           params={'force': 1} if force else None, timeout=60)
+        except OSError as e:
+            return self._unreachable(e, 'remove_container', container_id, force=force)
+        return self._result(response, container_id)
+
+
+def _format_ports(ports: List[Dict[str, Any]]) -> str:
+    """Render Engine API port bindings the same way `docker ps` does"""
+    published = set()
+    parts = []
+    for port in sorted(ports, key=lambda p: (p.get('PrivatePort', 0), p.get('IP', ''))):
+        proto = port.get('Type', 'tcp')
+        if 'PublicPort' in port:
+            ip = port.get('IP', '0.0.0.0')
+            key = (port['PublicPort'], port['PrivatePort'], proto)
+            # IPv6 duplicates of an IPv4 binding would confuse _parse_ports
+            if ':' in ip and key in published:
+                continue
+            published.add(key)
+            host = ip if ':' not in ip else f'[{ip}]'
+            parts.append(f"{host}:{port['PublicPort']}->{port['PrivatePort']}/{proto}")
+        else:
+            parts.append(f"{port.get('PrivatePort')}/{proto}")
+    return ', '.join(parts)
+
+
+def _engine_to_cli_row(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a /containers/json entry to the shape of `docker ps --format json`"""
+    created = item.get('Created')
+    created_at = ''
+    if created:
+        created_at = datetime.fromtimestamp(created, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S +0000 UTC')
+    networks = (item.get('NetworkSettings') or {}).get('Networks') or {}
+    mounts = [m.get('Name') or m.get('Source', '') for m in item.get('Mounts') or []]
+    return {
+        'ID': item.get('Id', '')[:12],
+        'Names': ','.join(n.lstrip('/') for n in item.get('Names') or []),
+        'Image': item.get('Image', ''),
+        'State': item.get('State', ''),
+        'Status': item.get('Status', ''),
+        'Ports': _format_ports(item.get('Ports') or []),
+        'CreatedAt': created_at,
+        'Command': item.get('Command', ''),
+        'Size': '',
+        'Networks': ','.join(networks),
+        'Mounts': ','.join(mounts)
+    }
+
+
+def _ellipsis(text: str, width: int) -> str:
+    """Shorten text the way the docker CLI truncates ps columns"""
+    return text if len(text) <= width else text[:width - 1] + '\u2026'
+
+
+def _engine_command(path: str, args: List[str]) -> str:
+    """Join an entrypoint and its arguments the way the daemon fills /containers/json Command"""
+    if not args:
+        return path
+    return path + ' ' + ' '.join(f"'{arg}'" if ' ' in arg else arg for arg in args)
+
+
+def _inspect_to_cli_row(item: Dict[str, Any], cli_format: bool = False) -> Dict[str, Any]:
+    """Convert a `docker inspect` entry to exactly the row its container gets in a listing
+
+    By default the row matches _engine_to_cli_row; with cli_format it
+    matches `docker ps --format json` instead, which shows the creation
+    time in local time and truncates and quotes Command and Mounts.
+    A single container refreshed this way then compares equal to its
+    listed row unless something about it really changed.
+    """
+    settings = item.get('NetworkSettings') or {}
+    ports = []
+    for spec, bindings in (settings.get('Ports') or {}).items():
+        private, _, proto = spec.partition('/')
+        for binding in bindings or [{}]:
+            port = {'PrivatePort': int(private), 'Type': proto or 'tcp'}
+            if binding.get('HostPort'):
+                port['IP'] = binding.get('HostIp') or '0.0.0.0'
+                port['PublicPort'] = int(binding['HostPort'])
+            ports.append(port)
+    state = item.get('State') or {}
+    config = item.get('Config') or {}
+    created_at = ''
+    try:
+        # RFC 3339 with nanoseconds; listings carry whole seconds
+        created = datetime.strptime(item.get('Created', '')[:19], '%Y-%m-%dT%H:%M:%S').replace(tzinfo=timezone.utc)
+    except ValueError:
+        created = None
+    command = _engine_command(item.get('Path', ''), item.get('Args') or [])
+    mounts = [m.get('Name') or m.get('Source', '') for m in item.get('Mounts') or []]
+    if cli_format:
+        if created:
+            created_at = created.astimezone().strftime('%Y-%m-%d %H:%M:%S %z %Z')
+        command = json.dumps(_ellipsis(command, 20), ensure_ascii=False)
+        mounts = [_ellipsis(mount, 15) for mount in mounts]
+    elif created:
+        created_at = created.strftime('%Y-%m-%d %H:%M:%S +0000 UTC')
+    return {
+        'ID': item.get('Id', '')[:12],
+        'Names': item.get('Name', '').lstrip('/'),
+        'Image': config.get('Image', ''),
+        'State': state.get('Status', ''),
+        'Status': '',
+        'Ports': _format_ports(ports),
+        'CreatedAt': created_at,
+        'Command': command,
+        'Size': '',
+        'Networks': ','.join(settings.get('Networks') or {}),
+        'Mounts': ','.join(mounts)
+    }
+
+
+def _demux_lines(response) -> Iterator[bytes]:
+    """Split a log stream into lines, removing the stdout/stderr frame headers of non-TTY containers"""
+    header = response.read(8)
+    if len(header) == 8 and header[0] in (0, 1, 2) and header[1:4] == b'\x00\x00\x00':
+        pending = b''
+        while len(header) == 8:
+            payload = response.read(int.from_bytes(header[4:8], 'big'))
+            pending += payload
+            *lines, pending = pending.split(b'\n')
+            for line in lines:
+                yield line + b'\n'
+            header = response.read(8)
+        if pending:
+            yield pending
+        return
+    # TTY containers send the raw stream
+    first = header + response.readline() if header and not header.endswith(b'\n') else header
+    if first:
+        for line in first.splitlines(keepends=True):
+            yield line
+    for line in iter(response.readline, b''):
+        yield line
+
+
+def _iter_json_lines(lines: Iterator[bytes], close: Callable[[], None]) -> Iterator[Dict[str, Any]]:
+    """Decode a stream of JSON lines, releasing the underlying resource when done"""
+    try:
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+    finally:
+        close()
+
+
+def split_image_reference(image: str):
+    """Split 'repo[:tag]' into repository and tag, defaulting the tag to latest"""
+    name, sep, tag = image.rpartition(':')
+    if not sep or '/' in tag:
+        return image, 'latest'
+    return name, tag
+
+
+def create_backend(preference: str, run_command: Callable[[List[str]], Dict[str, Any]],
+                   socket_path: str = DEFAULT_SOCKET_PATH,
+                   stream_command: Optional[Callable[[List[str]], Any]] = None,
+                   coalesce: Optional[Callable[..., Any]] = None):
+    """Build the configured backend; 'auto' uses the socket when the daemon answers a ping"""
+    cli = CLIBackend(run_command, stream_command, coalesce)
+    preference = (preference or 'auto').lower()
+    if preference == 'cli':
+        return cli
+    if preference not in ('api', 'auto'):
+        logger.warning(f"Unknown docker backend '{preference}', using auto")
+    client = DockerEngineClient(socket_path)
+    if preference == 'api' or (os.path.exists(socket_path) and client.ping()):
+        return EngineAPIBackend(client, fallback=cli)
+    return cli
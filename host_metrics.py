@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Host metrics for Not a cPanel
+Reads memory, load, CPU and uptime straight from /proc and disk usage with
+os.statvfs, returning plain numbers without forking any process; facts that
+rarely change (hostname, kernel, Docker daemon info) are cached
+"""
+
+import os
+import time
+import socket
+import logging
+import threading
+from typing import Dict, List, Optional, Any, Callable
+
+logger = logging.getLogger(__name__)
+
+# /proc/stat cpu line: user nice system idle iowait irq softirq steal guest guest_nice
+CPU_FIELDS = ('user', 'nice', 'system', 'idle', 'iowait', 'irq', 'softirq', 'steal')
+
+
+def _read(path: str) -> str:
+    with open(path) as f:
+        return f.read()
+
+
+def read_meminfo(proc_root: str = '/proc') -> Dict[str, int]:
+    """/proc/meminfo in bytes, keyed by field name"""
+    values = {}
+    for line in _read(os.path.join(proc_root, 'meminfo')).splitlines():
+        key, _, rest = line.partition(':')
+        parts = rest.split()
+        if parts and parts[0].isdigit():
+            values[key] = int(parts[0]) * (1024 if len(parts) > 1 and parts[1] == 'kB' else 1)
+    return values
+
+
+def read_cpu_times(proc_root: str = '/proc') -> Dict[str, int]:
+    """Aggregate CPU time in jiffies from the first line of /proc/stat"""
+    with open(os.path.join(proc_root, 'stat')) as f:
+        fields = f.readline().split()
+    return {name: int(value) for name, value in zip(CPU_FIELDS, fields[1:])}
+
+
+def disk_usage(path: str) -> Dict[str, Any]:
+    stat = os.statvfs(path)
+    total = stat.f_blocks * stat.f_frsize
+    free = stat.f_bfree * stat.f_frsize
+    available = stat.f_bavail * stat.f_frsize
+    used = total - free
+    # Like df: the percentage is of what non-root users can use
+    usable = used + available
+    return {
+        'path': path,
+        'total': total,
+        'used': used,
+        'available': available,
+        'percent': round(used * 100 / usable, 1) if usable else 0.0,
+        'inodes_total': stat.f_files,
+        'inodes_free': stat.f_ffree
+    }
+
+
+class HostMetrics:
+    """Structured host facts for the system info endpoint
+
+    CPU usage is the busy share since the previous reading (or since
+    min_interval ago, whichever is longer), so calling snapshot() often is
+    cheap and does not make the figure jittery. Static facts are refreshed
+    every static_ttl seconds.
+    """
+
+    def __init__(self, disk_paths: List[str] = None, docker_info: Optional[Callable[[], Optional[Dict[str, Any]]]] = None,
+                 proc_root: str = '/proc', min_interval: float = 1.0, static_ttl: float = 300.0):
+        self.disk_paths = []
+        devices = set()
+        for path in disk_paths or ['/']:
+            # Several paths on one filesystem would only repeat the same numbers
+            try:
+                device = os.stat(path).st_dev
+            except OSError:
+                device = path
+            if device not in devices:
+                devices.add(device)
+                self.disk_paths.append(path)
+        self.docker_info = docker_info
+        self.proc_root = proc_root
+        self.min_interval = min_interval
+        self.static_ttl = static_ttl
+        self._lock = threading.Lock()
+        self._cpu_previous: Optional[Dict[str, int]] = None
+        self._cpu_percent: Optional[float] = None
+        self._cpu_read_at = 0.0
+        self._static: Optional[Dict[str, Any]] = None
+        self._static_at = 0.0
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._snapshot_at = 0.0
+        try:
+            self.cpu()  # first reading, so the first snapshot already has a percentage
+        except OSError:
+            pass
+
+    def memory(self) -> Dict[str, Any]:
+        info = read_meminfo(self.proc_root)
+        total = info.get('MemTotal', 0)
+        available = info.get('MemAvailable', info.get('MemFree', 0))
+        swap_total = info.get('SwapTotal', 0)
+        swap_free = info.get('SwapFree', 0)
+        return {
+            'total': total,
+            'available': available,
+            'used': total - available,
+            'percent': round((total - available) * 100 / total, 1) if total else 0.0,
+            'buffers': info.get('Buffers', 0),
+            'cached': info.get('Cached', 0),
+            'swap_total': swap_total,
+            'swap_used': swap_total - swap_free
+        }
+
+    def load(self) -> Dict[str, Any]:
+        fields = _read(os.path.join(self.proc_root, 'loadavg')).split()
+        running, _, total = fields[3].partition('/')
+        return {
+            'load1': float(fields[0]),
+            'load5': float(fields[1]),
+            'load15': float(fields[2]),
+            'running_tasks': int(running),
+            'total_tasks': int(total)
+        }
+
+    def uptime(self) -> float:
+        return float(_read(os.path.join(self.proc_root, 'uptime')).split()[0])
+
+    def cpu(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            if self._cpu_previous is None or now - self._cpu_read_at >= self.min_interval:
+                current = read_cpu_times(self.proc_root)
+                if self._cpu_previous is not None:
+                    busy_fields = [f for f in CPU_FIELDS if f not in ('idle', 'iowait')]
+                    delta_total = sum(current[f] - self._cpu_previous.get(f, 0) for f in current)
+                    delta_busy = sum(current.get(f, 0) - self._cpu_previous.get(f, 0) for f in busy_fields)
+                    if delta_total > 0:
+                        self._cpu_percent = round(delta_busy * 100 / delta_total, 1)
+                self._cpu_previous = current
+                self._cpu_read_at = now
+            return {'count': os.cpu_count(), 'percent': self._cpu_percent}
+
+    def disks(self) -> List[Dict[str, Any]]:
+        disks = []
+        for path in self.disk_paths:
+            try:
+                disks.append(disk_usage(path))
+            except OSError as e:
+                disks.append({'path': path, 'error': str(e)})
+        return disks
+
+    def static(self) -> Dict[str, Any]:
+        """Hostname, kernel and Docker daemon facts, cached for static_ttl"""
+        now = time.monotonic()
+        if self._static is not None and now - self._static_at < self.static_ttl:
+            return self._static
+        uname = os.uname()
+        facts: Dict[str, Any] = {
+            'hostname': socket.gethostname(),
+            'kernel': uname.release,
+            'architecture': uname.machine,
+            'docker': None
+        }
+        info = self.docker_info() if self.docker_info else None
+        if info:
+            facts['docker'] = {
+                'server_version': info.get('ServerVersion'),
+                'storage_driver': info.get('Driver'),
+                'operating_system': info.get('OperatingSystem'),
+                'cgroup_version': info.get('CgroupVersion'),
+                'cpus': info.get('NCPU'),
+                'memory': info.get('MemTotal')
+            }
+        self._static = facts
+        # Retry sooner when the daemon could not be asked
+        self._static_at = now if info or not self.docker_info else now - self.static_ttl + 30
+        return facts
+
+    def snapshot(self, max_age: float = 0.0) -> Dict[str, Any]:
+        """Everything at once; a snapshot younger than max_age seconds is reused"""
+        now = time.monotonic()
+        if self._snapshot is not None and now - self._snapshot_at < max_age:
+            return self._snapshot
+        snapshot = {
+            **self.static(),
+            'uptime': self.uptime(),
+            'load': self.load(),
+            'cpu': self.cpu(),
+            'memory': self.memory(),
+            'disks': self.disks(),
+            'time': time.time()
+        }
+        self._snapshot = snapshot
+        self._snapshot_at = now
+        return snapshot
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Local image index and pull deduplication for Not a cPanel
+Keeps tags, digests, sizes and last use of every local image in memory,
+updated from pulls and daemon image events, and merges concurrent pulls of
+the same reference into one pull whose progress is fanned out to every caller
+"""
+
+import time
+import logging
+import threading
+from typing import Dict, List, Optional, Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_reference(reference: str) -> str:
+    """Canonical short form of an image reference: 'nginx' -> 'nginx:latest'"""
+    reference = reference.strip()
+    for prefix in ('docker.io/', 'index.docker.io/'):
+        if reference.startswith(prefix):
+            reference = reference[len(prefix):]
+    if reference.startswith('library/'):
+        reference = reference[len('library/'):]
+    if '@' in reference:
+        return reference
+    name, sep, tag = reference.rpartition(':')
+    if not sep or '/' in tag:
+        return f'{reference}:latest'
+    return reference
+
+
+class ImageRecord:
+    """One local image as kept in the index"""
+
+    __slots__ = ('id', 'tags', 'digests', 'size', 'created', 'last_used')
+
+    def __init__(self, id: str, tags: List[str], digests: List[str], size: int, created: str,
+                 last_used: Optional[float] = None):
+        self.id = id
+        self.tags = tags
+        self.digests = digests
+        self.size = size
+        self.created = created
+        self.last_used = last_used
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> 'ImageRecord':
+        """Build a record from an Engine API style image (Id, RepoTags, RepoDigests, Size, Created)"""
+        return cls(
+            id=row.get('Id', ''),
+            tags=[normalize_reference(tag) for tag in row.get('RepoTags') or [] if not tag.startswith('<none>')],
+            digests=[digest for digest in row.get('RepoDigests') or [] if not digest.startswith('<none>')],
+            size=int(row.get('Size') or 0),
+            created=str(row.get('Created', ''))
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id.split(':', 1)[-1][:12],
+            'full_id': self.id,
+            'tags': self.tags,
+            'digests': self.digests,
+            'size': self.size,
+            'created': self.created,
+            'last_used': self.last_used
+        }
+
+
+class ImageIndex:
+    """In-memory view of local images, kept current from pulls and image events
+
+    Listings and presence checks are answered from memory. While no event
+    stream keeps the index live, a miss is confirmed with a single inspect
+    and listings resync once they are older than max_staleness.
+    """
+
+    def __init__(self, load_all: Callable[[], Optional[List[Dict[str, Any]]]],
+                 load_one: Callable[[str], Optional[Dict[str, Any]]], max_staleness: float = 300.0):
+        self._load_all = load_all
+        self._load_one = load_one
+        self.max_staleness = max_staleness
+        self._lock = threading.Lock()
+        self._images: Dict[str, ImageRecord] = {}
+        self._refs: Dict[str, str] = {}  # normalized tag or repo@digest -> image id
+        self.live = False  # True while an event stream keeps the index current
+        self.last_sync = 0.0
+        self.resyncs = 0
+
+    def _index(self, record: ImageRecord):
+        for ref in record.tags + record.digests:
+            self._refs[ref] = record.id
+
+    def _unindex(self, record: ImageRecord):
+        for ref in record.tags + record.digests:
+            if self._refs.get(ref) == record.id:
+                del self._refs[ref]
+
+    def resync(self) -> bool:
+        started = time.time()
+        rows = self._load_all()
+        if rows is None:
+            return False
+        with self._lock:
+            images = {}
+            for row in rows:
+                record = ImageRecord.from_row(row)
+                previous = self._images.get(record.id)
+                if previous:
+                    record.last_used = previous.last_used
+                images[record.id] = record
+            self._images = images
+            self._refs = {}
+            for record in images.values():
+                self._index(record)
+            self.last_sync = started
+            self.resyncs += 1
+        return True
+
+    def upsert(self, record: ImageRecord):
+        with self._lock:
+            previous = self._images.get(record.id)
+            if previous:
+                record.last_used = previous.last_used
+                self._unindex(previous)
+            # A tag moves to the new image when it is pulled again
+            for ref in record.tags:
+                owner = self._refs.get(ref)
+                if owner and owner != record.id:
+                    self._images[owner].tags = [tag for tag in self._images[owner].tags if tag != ref]
+            self._images[record.id] = record
+            self._index(record)
+
+    def remove(self, image_id: str):
+        with self._lock:
+            record = self._images.pop(image_id, None)
+            if record:
+                self._unindex(record)
+
+    def refresh_one(self, reference: str) -> Optional[ImageRecord]:
+        """Reload one image from the daemon; drops it if the daemon no longer has it"""
+        row = self._load_one(reference)
+        if row is None:
+            image_id = self._refs.get(normalize_reference(reference), reference)
+            self.remove(image_id)
+            return None
+        record = ImageRecord.from_row(row)
+        self.upsert(record)
+        return record
+
+    def get(self, reference: str) -> Optional[ImageRecord]:
+        image_id = self._refs.get(normalize_reference(reference))
+        if image_id is None and reference.startswith('sha256:'):
+            image_id = reference
+        return self._images.get(image_id) if image_id else None
+
+    def present(self, reference: str) -> bool:
+        if self.get(reference) is not None:
+            return True
+        if self.live:
+            return False
+        return self.refresh_one(reference) is not None
+
+    def mark_used(self, reference: str):
+        record = self.get(reference)
+        if record:
+            record.last_used = time.time()
+
+    def images(self) -> List[ImageRecord]:
+        if not self.live and time.time() - self.last_sync > self.max_staleness:
+            self.resync()
+        with self._lock:
+            return list(self._images.values())
+
+    def apply_event(self, event: Dict[str, Any]) -> bool:
+        """Apply one daemon image event; other event types are ignored"""
+        if event.get('Type') != 'image':
+            return True
+        action = event.get('Action') or event.get('status') or ''
+        reference = (event.get('Actor') or {}).get('ID') or event.get('id') or ''
+        if not reference:
+            return True
+        if action == 'delete':
+            self.remove(reference)
+        elif action in ('pull', 'tag', 'untag', 'import', 'load'):
+            self.refresh_one(reference)
+        return True
+
+
+class _Waiter:
+    __slots__ = ('callback', 'lock')
+
+    def __init__(self, callback: Callable[[Dict[str, Any]], None]):
+        self.callback = callback
+        self.lock = threading.Lock()  # keeps replay and live events to this waiter in order
+
+    def deliver(self, event: Dict[str, Any]):
+        try:
+            self.callback(event)
+        except Exception as e:
+            logger.error(f"Image pull progress callback failed: {e}")
+
+
+class _Pull:
+    """One in-flight pull and everyone waiting on it
+
+    Callbacks (which may write job progress to the database) run outside
+    the pull lock, so a slow waiter never holds up others joining the pull.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waiters: List[_Waiter] = []
+        self.layers: Dict[str, Dict[str, Any]] = {}  # latest event per layer, replayed to late joiners
+        self.done = threading.Event()
+        self.result: Optional[Dict[str, Any]] = None
+
+    def attach(self, on_progress: Optional[Callable[[Dict[str, Any]], None]]):
+        if on_progress is None:
+            return
+        waiter = _Waiter(on_progress)
+        # Held through the replay, so events published meanwhile reach this waiter after it
+        with waiter.lock:
+            with self.lock:
+                replay = list(self.layers.values())
+                self.waiters.append(waiter)
+            for event in replay:
+                waiter.deliver(event)
+
+    def publish(self, event: Dict[str, Any]):
+        with self.lock:
+            if event.get('id'):
+                self.layers[event['id']] = event
+            waiters = list(self.waiters)
+        for waiter in waiters:
+            with waiter.lock:
+                waiter.deliver(event)
+
+
+class PullCoordinator:
+    """Runs at most one pull per image reference; concurrent callers join it"""
+
+    def __init__(self, pull: Callable[..., Dict[str, Any]]):
+        self._pull = pull
+        self._lock = threading.Lock()
+        self._active: Dict[str, _Pull] = {}
+        self.pulls = 0
+        self.merged = 0
+
+    def pull(self, reference: str, on_progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        key = normalize_reference(reference)
+        with self._lock:
+            active = self._active.get(key)
+            leader = active is None
+            if leader:
+                active = self._active[key] = _Pull()
+                self.pulls += 1
+            else:
+                self.merged += 1
+        active.attach(on_progress)
+        if not leader:
+            active.done.wait()
+            return active.result
+        try:
+            result = self._pull(reference, on_progress=active.publish)
+        except Exception as e:
+            logger.error(f"Image pull of {reference} failed: {e}")
+            result = {'success': False, 'stdout': '', 'stderr': str(e), 'returncode': -1}
+        active.result = result
+        with self._lock:
+            del self._active[key]
+        active.done.set()
+        return result
+
+    def active(self) -> List[str]:
+        with self._lock:
+            return list(self._active)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'pulls': self.pulls, 'merged': self.merged, 'active': self.active()}
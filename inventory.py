@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Container inventory for Not a cPanel
+Keeps an in-memory view of all containers that is updated incrementally from
+the Docker events stream instead of re-listing every container per request
+"""
+
+import time
+import logging
+import threading
+from bisect import bisect_left, insort
+from collections import deque
+from typing import Dict, List, Optional, Any, Callable, Iterable, Iterator, Tuple
+
+from coalesce import Debouncer
+from records import ContainerRecord
+
+logger = logging.getLogger(__name__)
+
+# Events that carry no change to the fields we keep
+IGNORED_ACTIONS = {
+    'attach', 'detach', 'commit', 'copy', 'archive-path', 'extract-to-dir', 'export',
+    'exec_create', 'exec_start', 'exec_die', 'exec_detach', 'health_status',
+    'kill', 'oom', 'resize', 'restart', 'stop', 'top', 'mount', 'unmount'
+}
+
+
+# Matches listed when a container ID prefix is ambiguous
+MAX_REPORTED_MATCHES = 10
+
+
+class AmbiguousReference(LookupError):
+    """A container ID prefix that matches more than one container"""
+
+    def __init__(self, reference: str, matches: List[str]):
+        super().__init__(f'Container ID prefix "{reference}" is ambiguous, it matches {", ".join(matches)}')
+        self.reference = reference
+        self.matches = matches
+
+
+class InventorySnapshot:
+    """One published state of the inventory, never modified after publication
+
+    Readers take the current snapshot with a single attribute read and can
+    use it for as long as they like without locking.
+    """
+
+    __slots__ = ('revision', 'containers', 'by_id', 'names', 'ids')
+
+    def __init__(self, revision: int, by_id: Dict[str, ContainerRecord],
+                 names: Dict[str, str], ids: List[str]):
+        self.revision = revision
+        self.containers: Tuple[ContainerRecord, ...] = tuple(by_id.values())
+        self.by_id = by_id
+        # Lookup indexes: name -> id, and all IDs in sorted order so a prefix
+        # is a bisect plus a short scan
+        self.names = names
+        self.ids = ids
+
+
+def _index(names: Dict[str, str], ids: List[str], container: ContainerRecord,
+           previous: Optional[ContainerRecord] = None):
+    if previous is None:
+        insort(ids, container.id)
+    elif previous.name != container.name and names.get(previous.name) == previous.id:
+        del names[previous.name]
+    names[container.name] = container.id
+
+
+def _unindex(names: Dict[str, str], ids: List[str], container: ContainerRecord):
+    position = bisect_left(ids, container.id)
+    if position < len(ids) and ids[position] == container.id:
+        del ids[position]
+    if names.get(container.name) == container.id:
+        del names[container.name]
+
+
+class ContainerInventory:
+    """In-memory container list, fed by full resyncs and incremental events
+
+    Writers serialize on a lock, build the next state from copies and publish
+    it as a new InventorySnapshot in one reference assignment. Readers never
+    take the lock and never see a partially applied change.
+    """
+
+    def __init__(self, load_all: Callable[[], Optional[List[ContainerRecord]]],
+                 load_one: Callable[[str], Optional[ContainerRecord]],
+                 max_staleness: float = 30.0, max_tombstones: int = 10000, resync_debounce: float = 0.05):
+        self._load_all = load_all
+        self._load_one = load_one
+        self.max_staleness = max_staleness
+        # Every full listing goes through one debouncer, so concurrent and
+        # back-to-back resyncs share a single daemon round-trip
+        self._resyncer = Debouncer(self._resync, resync_debounce)
+        self._lock = threading.RLock()
+        self._snapshot = InventorySnapshot(0, {}, {}, [])
+        # Revision bookkeeping for delta responses: the revision each record
+        # was created and last changed at, plus recent removals
+        self._created: Dict[str, int] = {}
+        self._changed: Dict[str, int] = {}
+        self._removed: deque = deque()
+        self._max_tombstones = max_tombstones
+        self._tombstone_floor = 0  # deltas from before this revision may have lost removals
+        self.live = False  # True while an event stream keeps the inventory current
+        self.last_sync = 0.0
+        self.last_event = 0.0
+        self.resyncs = 0
+
+    @property
+    def revision(self) -> int:
+        return self._snapshot.revision
+
+    def resync_stats(self) -> Dict[str, int]:
+        return self._resyncer.stats()
+
+    def _publish(self, by_id: Dict[str, ContainerRecord], names: Dict[str, str], ids: List[str]) -> int:
+        revision = self._snapshot.revision + 1
+        self._snapshot = InventorySnapshot(revision, by_id, names, ids)
+        return revision
+
+    def _tombstone(self, container_id: str, revision: int):
+        self._created.pop(container_id, None)
+        self._changed.pop(container_id, None)
+        self._removed.append((revision, container_id))
+        if len(self._removed) > self._max_tombstones:
+            self._tombstone_floor = self._removed.popleft()[0]
+
+    def resync(self) -> bool:
+        """Replace the whole inventory with a listing started after this call"""
+        return self._resyncer.request()
+
+    def _resync(self) -> bool:
+        started = time.time()
+        containers = self._load_all()
+        if containers is None:
+            # A failed listing says nothing about which containers exist; keep the current snapshot
+            return False
+        with self._lock:
+            current = self._snapshot
+            fresh = {c.id: c for c in containers}
+            changed = [c for cid, c in fresh.items() if current.by_id.get(cid) != c]
+            removed = [cid for cid in current.by_id if cid not in fresh]
+            if changed or removed:
+                names, ids = dict(current.names), list(current.ids)
+                for container in changed:
+                    _index(names, ids, container, current.by_id.get(container.id))
+                for container_id in removed:
+                    _unindex(names, ids, current.by_id[container_id])
+                revision = self._publish(fresh, names, ids)
+                for container in changed:
+                    self._created.setdefault(container.id, revision)
+                    self._changed[container.id] = revision
+                for container_id in removed:
+                    self._tombstone(container_id, revision)
+            self.last_sync = started
+            self.resyncs += 1
+        return True
+
+    def _ensure_fresh(self):
+        if not self.live and time.time() - self.last_sync > self.max_staleness:
+            # Any listing already under way is fresh enough for a reader
+            self._resyncer.request(join_running=True)
+
+    def current(self) -> InventorySnapshot:
+        """The latest published snapshot, resynced first if no event stream has kept it fresh"""
+        self._ensure_fresh()
+        return self._snapshot
+
+    def containers(self) -> Tuple[ContainerRecord, ...]:
+        return self.current().containers
+
+    def snapshot(self) -> Tuple[int, Tuple[ContainerRecord, ...]]:
+        """Current revision and container list, read consistently"""
+        snapshot = self.current()
+        return snapshot.revision, snapshot.containers
+
+    def changes_since(self, since: int) -> Optional[Dict[str, Any]]:
+        """Containers added, changed and removed after revision `since`, or None if that is too old to diff"""
+        with self._lock:
+            snapshot = self._snapshot
+            if since < self._tombstone_floor or since > snapshot.revision:
+                return None
+            added, changed = [], []
+            for container_id, revision in self._changed.items():
+                if revision > since:
+                    container = snapshot.by_id[container_id]
+                    if self._created[container_id] > since:
+                        added.append(container)
+                    else:
+                        changed.append(container)
+            removed = [cid for rev, cid in self._removed
+                       if rev > since and cid not in snapshot.by_id]
+            return {'revision': snapshot.revision, 'added': added, 'changed': changed, 'removed': removed}
+
+    def get(self, container_id: str) -> Optional[ContainerRecord]:
+        return self._snapshot.by_id.get(container_id[:12])
+
+    def get_by_name(self, name: str) -> Optional[ContainerRecord]:
+        snapshot = self.current()
+        container_id = snapshot.names.get(name)
+        return snapshot.by_id.get(container_id) if container_id else None
+
+    def lookup(self, reference: str) -> Optional[ContainerRecord]:
+        """Find a container by exact name or unique ID prefix, like the docker CLI
+
+        Raises AmbiguousReference when the prefix matches several containers.
+        """
+        snapshot = self.current()
+        if reference in snapshot.names:
+            return snapshot.by_id[snapshot.names[reference]]
+        if not reference:
+            return None
+        prefix = reference[:12].lower()
+        ids = snapshot.ids
+        position = bisect_left(ids, prefix)
+        matches = []
+        while position < len(ids) and ids[position].startswith(prefix):
+            matches.append(ids[position])
+            if len(matches) > MAX_REPORTED_MATCHES:
+                break
+            position += 1
+        if len(matches) > 1:
+            raise AmbiguousReference(reference, matches[:MAX_REPORTED_MATCHES])
+        return snapshot.by_id[matches[0]] if matches else None
+
+    def upsert(self, container: ContainerRecord):
+        with self._lock:
+            current = self._snapshot
+            container_id = container.id
+            previous = current.by_id.get(container_id)
+            if previous == container:
+                return
+            by_id = dict(current.by_id)
+            by_id[container_id] = container
+            # The sorted IDs only change for a new container, so share them otherwise
+            names, ids = dict(current.names), current.ids if previous is not None else list(current.ids)
+            _index(names, ids, container, previous)
+            revision = self._publish(by_id, names, ids)
+            self._created.setdefault(container_id, revision)
+            self._changed[container_id] = revision
+
+    def remove(self, container_id: str):
+        with self._lock:
+            current = self._snapshot
+            container_id = container_id[:12]
+            container = current.by_id.get(container_id)
+            if container is not None:
+                by_id = dict(current.by_id)
+                del by_id[container_id]
+                names, ids = dict(current.names), list(current.ids)
+                _unindex(names, ids, container)
+                self._tombstone(container_id, self._publish(by_id, names, ids))
+
+    def refresh_one(self, container_id: str) -> Optional[ContainerRecord]:
+        """Reload a single container from the daemon, dropping it if it no longer exists"""
+        container = self._load_one(container_id)
+        if container is None:
+            self.remove(container_id)
+        else:
+            self.upsert(container)
+        return container
+
+    def _set_status(self, container_id: str, status: str):
+        with self._lock:
+            current = self._snapshot.by_id.get(container_id)
+            if current and current.status != status:
+                self.upsert(current.replace(status=status))
+
+    def apply_event(self, event: Dict[str, Any]) -> bool:
+        """Apply one daemon event; returns False when the event reveals a gap"""
+        if event.get('Type', 'container') != 'container':
+            return True
+        action = (event.get('Action') or event.get('status') or '').split(':')[0]
+        container_id = ((event.get('Actor') or {}).get('ID') or event.get('id') or '')[:12]
+        if not container_id:
+            return True
+        self.last_event = time.time()
+
+        if action == 'destroy':
+            self.remove(container_id)
+            return True
+        if action == 'create':
+            self.refresh_one(container_id)
+            return True
+        if action in IGNORED_ACTIONS:
+            return True
+        if container_id not in self._snapshot.by_id:
+            # An event for a container we never saw being created means we
+            # missed part of the stream
+            return False
+        if action in ('start', 'unpause'):
+            self._set_status(container_id, 'running')
+        elif action in ('die', 'pause'):
+            self._set_status(container_id, 'stopped')
+        else:
+            self.refresh_one(container_id)
+        return True
+
+
+class EventWatcher(threading.Thread):
+    """Background subscriber that keeps a ContainerInventory current from daemon events"""
+
+    def __init__(self, inventory: ContainerInventory, open_stream: Callable[[], Iterator[Dict[str, Any]]],
+                 retry_delay: float = 2.0, max_retry_delay: float = 60.0, followers: Iterable[Any] = ()):
+        super().__init__(name='docker-events', daemon=True)
+        self.inventory = inventory
+        # Other indexes fed from the same stream; like the inventory they
+        # provide resync(), apply_event() and a live flag
+        self.followers = list(followers)
+        self.open_stream = open_stream
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._stopped = threading.Event()
+        self.reconnects = 0
+        self.gaps = 0
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        delay = self.retry_delay
+        while not self._stopped.is_set():
+            try:
+                # Subscribe before listing so nothing that happens during the
+                # resync is lost; events replayed on top are idempotent
+                stream = self.open_stream()
+                self.inventory.live = self.inventory.resync()
+                for follower in self.followers:
+                    follower.live = follower.resync()
+                delay = self.retry_delay
+                logger.info("Docker event stream connected")
+                for event in stream:
+                    if self._stopped.is_set():
+                        break
+                    if not self.inventory.apply_event(event):
+                        self.gaps += 1
+                        logger.warning("Gap in docker event stream, resyncing container inventory")
+                        # Until a resync succeeds, readers fall back to listing on staleness
+                        self.inventory.live = self.inventory.resync()
+                    for follower in self.followers:
+                        follower.apply_event(event)
+                logger.warning("Docker event stream ended")
+            except Exception as e:
+                logger.error(f"Docker event stream error: {e}")
+            self.inventory.live = False
+            for follower in self.followers:
+                follower.live = False
+            if self._stopped.wait(delay):
+                break
+            self.reconnects += 1
+            delay = min(delay * 2, self.max_retry_delay)
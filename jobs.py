@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Background jobs for Not a cPanel
+Long-running operations (image pulls, container creation) run on a worker
+pool and report progress, results and logs that clients poll by job ID
+"""
+
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Callable
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+
+class Job:
+    """A unit of background work and its observable state"""
+
+    def __init__(self, kind: str, params: Dict[str, Any], max_log_lines: int = 1000):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = QUEUED
+        self.progress = 0
+        self.message = 'Queued'
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.logs: List[str] = []
+        self.log_offset = 0  # number of lines dropped from the front of self.logs
+        self.max_log_lines = max_log_lines
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self._lock = threading.Lock()
+        self._on_update: Optional[Callable[['Job', bool], None]] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED)
+
+    def log(self, line: str):
+        with self._lock:
+            self.logs.append(line)
+            if len(self.logs) > self.max_log_lines:
+                del self.logs[0]
+                self.log_offset += 1
+
+    def set_progress(self, progress: int, message: Optional[str] = None):
+        with self._lock:
+            self.progress = max(0, min(100, int(progress)))
+            if message is not None:
+                self.message = message
+        if self._on_update:
+            self._on_update(self, False)
+
+    def logs_since(self, offset: int = 0) -> Dict[str, Any]:
+        """Log lines from absolute line number `offset`, for incremental polling"""
+        with self._lock:
+            start = max(offset - self.log_offset, 0)
+            return {'offset': self.log_offset + start, 'next_offset': self.log_offset + len(self.logs),
+                    'lines': self.logs[start:]}
+
+    def to_dict(self, include_logs: bool = False) -> Dict[str, Any]:
+        with self._lock:
+            data = {
+                'id': self.id,
+                'kind': self.kind,
+                'status': self.status,
+                'progress': self.progress,
+                'message': self.message,
+                'params': self.params,
+                'result': self.result,
+                'error': self.error,
+                'created_at': self.created_at.isoformat(),
+                'started_at': self.started_at.isoformat() if self.started_at else None,
+                'finished_at': self.finished_at.isoformat() if self.finished_at else None
+            }
+            if include_logs:
+                data['logs'] = list(self.logs)
+            return data
+
+
+class JobManager:
+    """Runs jobs on a bounded executor and keeps recent ones in memory"""
+
+    def __init__(self, max_workers: int = 4, history_size: int = 200,
+                 persist: Optional[Callable[[Job], None]] = None,
+                 load: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None,
+                 persist_interval: float = 2.0,
+                 load_recent: Optional[Callable[[int], List[Dict[str, Any]]]] = None):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs: 'OrderedDict[str, Job]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.history_size = history_size
+        self._persist = persist
+        self._load = load
+        self._load_recent = load_recent
+        self.persist_interval = persist_interval
+        self._last_persist: Dict[str, float] = {}
+        self._persist_lock = threading.Lock()  # _last_persist is updated from every worker
+
+    def _save(self, job: Job, force: bool = True):
+        """Persist job state; progress-only updates are throttled"""
+        if not self._persist:
+            return
+        now = time.monotonic()
+        with self._persist_lock:
+            if not force and now - self._last_persist.get(job.id, 0) < self.persist_interval:
+                return
+            self._last_persist[job.id] = now
+        try:
+            self._persist(job)
+        except Exception as e:
+            logger.error(f"Could not persist job {job.id}: {e}")
+
+    def submit(self, kind: str, fn: Callable[[Job], Dict[str, Any]], params: Optional[Dict[str, Any]] = None) -> Job:
+        """Queue fn(job) for execution; its return value becomes the job result"""
+        job = Job(kind, params or {})
+        job._on_update = self._save
+        with self._lock:
+            self._jobs[job.id] = job
+            self._trim()
+        self._save(job)
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job: Job, fn: Callable[[Job], Dict[str, Any]]):
+        job.status = RUNNING
+        job.started_at = datetime.now()
+        job.message = 'Running'
+        self._save(job)
+        try:
+            result = fn(job) or {}
+            job.result = result
+            if result.get('success', True):
+                job.status = SUCCEEDED
+                job.progress = 100
+                job.message = 'Completed'
+            else:
+                job.status = FAILED
+                job.error = result.get('error') or result.get('stderr') or 'Job failed'
+                job.message = 'Failed'
+        except Exception as e:
+            logger.error(f"Job {job.id} ({job.kind}) crashed: {e}")
+            job.status = FAILED
+            job.error = str(e)
+            job.message = 'Failed'
+        job.finished_at = datetime.now()
+        self._save(job)
+        with self._persist_lock:
+            self._last_persist.pop(job.id, None)
+        logger.info(f"Job {job.id} ({job.kind}) {job.status}")
+
+    def _trim(self):
+        # Drop the oldest finished jobs once history is full; they remain in the database
+        excess = len(self._jobs) - self.history_size
+        for job_id in [jid for jid, job in self._jobs.items() if job.finished][:max(excess, 0)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def get_dict(self, job_id: str, include_logs: bool = False) -> Optional[Dict[str, Any]]:
+        """Job state from memory, or from persisted history for older jobs"""
+        job = self.get(job_id)
+        if job:
+            return job.to_dict(include_logs=include_logs)
+        if self._load:
+            try:
+                data = self._load(job_id)
+            except Exception as e:
+                logger.error(f"Could not load job {job_id}: {e}")
+                return None
+            if data and not include_logs:
+                data.pop('logs', None)
+            return data
+        return None
+
+    def list(self, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        """Newest jobs first, from memory and persisted history (which outlives restarts)"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        merged = {job.id: job.to_dict() for job in jobs}
+        if self._load_recent:
+            try:
+                persisted = self._load_recent(offset + limit)
+            except Exception as e:
+                logger.error(f"Could not load job history: {e}")
+                persisted = []
+            for data in persisted:
+                # Jobs still in memory have fresher state than their last persisted row
+                merged.setdefault(data['id'], data)
+        ordered = sorted(merged.values(), key=lambda data: data['created_at'], reverse=True)
+        return ordered[offset:offset + limit]
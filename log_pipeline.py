@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Queued logging for Not a cPanel
+Request threads only put records on a bounded queue and never wait for disk
+or the database; one listener thread writes them to the rotating log file
+and stores them in the system_logs table in multi-row inserts
+"""
+
+import copy
+import time
+import queue
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Callable, Tuple
+
+import psycopg2.extras
+
+logger = logging.getLogger(__name__)
+
+INSERT_SQL = 'INSERT INTO system_logs (level, message, details, created_at) VALUES %s'
+
+_STOP = object()
+
+
+class DroppingQueueHandler(logging.Handler):
+    """Puts records on a bounded queue without ever blocking the caller
+
+    Records that find the queue full are dropped and counted by level.
+    The message is rendered here, while its arguments still hold the values
+    they had when the record was logged, and the exception is turned into
+    text, so the listener never touches objects owned by request threads.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        super().__init__()
+        self.queue: 'queue.Queue[Any]' = queue.Queue(maxsize)
+        self._exception_formatter = logging.Formatter()
+        self.dropped: Dict[str, int] = {}
+
+    def resize(self, maxsize: int):
+        with self.queue.mutex:
+            self.queue.maxsize = maxsize
+            self.queue.not_full.notify_all()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self._exception_formatter.formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except queue.Full:
+            # Unlocked increment: a lost count under a race is cheaper than a lock on every drop
+            self.dropped[record.levelname] = self.dropped.get(record.levelname, 0) + 1
+        except Exception:
+            self.handleError(record)
+
+    def dropped_total(self) -> int:
+        return sum(self.dropped.values())
+
+
+class PostgresLogHandler(logging.Handler):
+    """Stores records in system_logs, batch_size rows per INSERT
+
+    Meant to run on the listener thread only: emit() buffers, flush()
+    writes the buffer with one multi-row INSERT per page. While the
+    database is unreachable, flushes back off exponentially and the oldest
+    buffered rows beyond max_pending are dropped and counted. Records of
+    this module are not stored, so a failing sink cannot feed itself.
+    """
+
+    def __init__(self, connect: Callable[[], Any], level: int = logging.WARNING, batch_size: int = 200,
+                 max_pending: int = 5000, retry_interval: float = 5.0, max_retry_interval: float = 300.0):
+        super().__init__(level)
+        self._connect = connect
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self._connection = None
+        self._pending: List[Tuple[Any, ...]] = []
+        self._backoff = 0.0
+        self._retry_at = 0.0
+        self.inserted = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+
+    @staticmethod
+    def row(record: logging.LogRecord) -> Tuple[Any, ...]:
+        details = {
+            'logger': record.name,
+            'module': record.module,
+            'function': record.funcName,
+            'line': record.lineno,
+            'thread': record.threadName,
+            'process': record.process
+        }
+        if record.exc_text:
+            details['exception'] = record.exc_text
+        if record.stack_info:
+            details['stack'] = record.stack_info
+        return (record.levelname, record.getMessage(), psycopg2.extras.Json(details),
+                datetime.fromtimestamp(record.created))
+
+    def emit(self, record: logging.LogRecord):
+        if record.name == __name__:
+            return
+        self._pending.append(self.row(record))
+        if len(self._pending) > self.max_pending:
+            excess = len(self._pending) - self.max_pending
+            del self._pending[:excess]
+            self.dropped += excess
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self, force: bool = False):
+        with self.lock:
+            if not self._pending or (not force and time.monotonic() < self._retry_at):
+                return
+            rows = self._pending
+            try:
+                if self._connection is None:
+                    self._connection = self._connect()
+                with self._connection.cursor() as cursor:
+                    psycopg2.extras.execute_values(cursor, INSERT_SQL, rows, page_size=self.batch_size)
+                self._connection.commit()
+            except Exception as e:
+                self.failed_flushes += 1
+                self._discard_connection()
+                self._backoff = min(self.max_retry_interval, self._backoff * 2 if self._backoff else self.retry_interval)
+                self._retry_at = time.monotonic() + self._backoff
+                logger.warning(f"Storing {len(rows)} log records in system_logs failed, retrying in {self._backoff:g}s: {e}")
+                return
+            self._pending = []
+            self.inserted += len(rows)
+            if self._backoff:
+                logger.info("Storing log records in system_logs works again")
+                self._backoff = 0.0
+                self._retry_at = 0.0
+
+    def _discard_connection(self):
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def close(self):
+        self.flush(force=True)
+        self.dropped += len(self._pending)
+        self._pending = []
+        self._discard_connection()
+        super().close()
+
+
+class LogListener:
+    """The one thread that hands queued records to the real handlers
+
+    Buffering handlers are flushed at least every flush_interval seconds,
+    whether the queue is idle or busy. Records dropped by the queue handler
+    are reported in the log itself, once per flush_interval at most.
+    """
+
+    def __init__(self, source: DroppingQueueHandler, handlers: List[logging.Handler], flush_interval: float = 2.0):
+        self.source = source
+        self.handlers = handlers
+        self.flush_interval = flush_interval
+        self._thread: Optional[threading.Thread] = None
+        self._reported_drops = 0
+        self.handled = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='log-listener', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Write out everything already queued, then stop the thread and close the handlers"""
+        if self._thread is None:
+            return
+        # The stop marker has to get in even when producers keep the queue full
+        self.source.queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+        for handler in self.handlers:
+            try:
+                handler.close()
+            except Exception:
+                pass
+
+    def _handle(self, record: logging.LogRecord):
+        self.handled += 1
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def _flush(self):
+        dropped = self.source.dropped_total()
+        if dropped != self._reported_drops:
+            record = logger.makeRecord(logger.name, logging.WARNING, __file__, 0,
+                                       f"Log queue full: dropped {dropped - self._reported_drops} records "
+                                       f"({dropped} since start)", None, None)
+            self._reported_drops = dropped
+            self._handle(record)
+        for handler in self.handlers:
+            try:
+                handler.flush()
+            except Exception:
+                pass
+
+    def _run(self):
+        next_flush = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                record = self.source.queue.get(timeout=max(0.0, next_flush - time.monotonic()))
+            except queue.Empty:
+                record = None
+            if record is _STOP:
+                self._flush()
+                return
+            if record is not None:
+                try:
+                    self._handle(record)
+                except Exception:
+                    # Handlers report their own errors; nothing here may end the thread
+                    pass
+            if time.monotonic() >= next_flush:
+                self._flush()
+                next_flush = time.monotonic() + self.flush_interval
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'queued': self.source.queue.qsize(),
+            'queue_size': self.source.queue.maxsize,
+            'handled': self.handled,
+            'dropped': dict(self.source.dropped)
+        }
+        for handler in self.handlers:
+            if isinstance(handler, PostgresLogHandler):
+                stats['database'] = {
+                    'pending': handler.pending(),
+                    'inserted': handler.inserted,
+                    'dropped': handler.dropped,
+                    'failed_flushes': handler.failed_flushes
+                }
+        return stats
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Memory diagnostics for Not a cPanel
+Named tracemalloc snapshots with top allocation diffs by file and line, and
+sizes of the long-lived in-memory structures, so memory growth in a running
+server can be tracked down without restarting it
+"""
+
+import sys
+import time
+import logging
+import threading
+import tracemalloc
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Callable
+
+logger = logging.getLogger(__name__)
+
+# Allocations made by the diagnostics themselves are not interesting
+IGNORED_FILES = (tracemalloc.__file__, '<frozen importlib._bootstrap>', '<frozen importlib._bootstrap_external>', '<unknown>')
+
+
+def deep_size(obj: Any, max_objects: int = 200000) -> Dict[str, int]:
+    """Approximate memory held by obj and everything it references through containers and attributes
+
+    Shared objects are counted once. Stops after max_objects objects, in
+    which case 'truncated' is 1 and the size is a lower bound.
+    """
+    seen = set()
+    stack = [obj]
+    size = 0
+    while stack and len(seen) < max_objects:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, (type, type(sys), type(deep_size))):
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current, 0)
+        # Copy in one C-level step, so request threads changing the structure cannot break the walk
+        if isinstance(current, dict):
+            for key, value in tuple(current.items()):
+                stack.append(key)
+                stack.append(value)
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(tuple(current))
+        else:
+            if hasattr(current, '__dict__'):
+                stack.append(vars(current))
+            for slot in getattr(type(current), '__slots__', ()):
+                if hasattr(current, slot):
+                    stack.append(getattr(current, slot))
+    return {'bytes': size, 'objects': len(seen), 'truncated': int(bool(stack))}
+
+
+def process_rss() -> Optional[int]:
+    """Resident set size of this process in bytes, from /proc/self/status"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class MemoryTracer:
+    """tracemalloc control with a bounded set of named snapshots"""
+
+    def __init__(self, max_snapshots: int = 10):
+        self.max_snapshots = max_snapshots
+        self._lock = threading.Lock()
+        self._snapshots: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._structures: Dict[str, Callable[[], Any]] = {}
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 1):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            logger.info(f"tracemalloc started with {frames} frames per allocation")
+
+    def stop(self):
+        """Stop tracing; snapshots already taken are kept"""
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info("tracemalloc stopped")
+
+    def take(self, name: str) -> Dict[str, Any]:
+        if not tracemalloc.is_tracing():
+            raise RuntimeError('Tracing is not running')
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, filename) for filename in IGNORED_FILES])
+        entry = {'snapshot': snapshot, 'taken_at': time.time(),
+                 'traced_bytes': sum(stat.size for stat in snapshot.statistics('filename'))}
+        with self._lock:
+            self._snapshots.pop(name, None)
+            self._snapshots[name] = entry
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        return {'name': name, 'taken_at': entry['taken_at'], 'traced_bytes': entry['traced_bytes']}
+
+    def snapshots(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{'name': name, 'taken_at': entry['taken_at'], 'traced_bytes': entry['traced_bytes']}
+                    for name, entry in self._snapshots.items()]
+
+    def diff(self, older: str, newer: Optional[str] = None, group: str = 'lineno',
+             limit: int = 25) -> List[Dict[str, Any]]:
+        """Largest allocation changes from snapshot `older` to `newer` (or to now), by file or line"""
+        with self._lock:
+            if older not in self._snapshots or (newer and newer not in self._snapshots):
+                raise KeyError(newer if older in self._snapshots else older)
+            before = self._snapshots[older]['snapshot']
+            after = self._snapshots[newer]['snapshot'] if newer else None
+        if after is None:
+            if not tracemalloc.is_tracing():
+                raise RuntimeError('Tracing is not running; name a second snapshot to compare with')
+            after = tracemalloc.take_snapshot().filter_traces(
+                [tracemalloc.Filter(False, filename) for filename in IGNORED_FILES])
+        stats = after.compare_to(before, 'filename' if group == 'filename' else 'lineno')
+        return [{
+            'location': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}' if group != 'filename'
+                        else stat.traceback[0].filename,
+            'size_diff': stat.size_diff,
+            'count_diff': stat.count_diff,
+            'size': stat.size,
+            'count': stat.count
+        } for stat in stats[:limit]]
+
+    def register(self, name: str, read: Callable[[], Any]):
+        """Report the size of a long-lived structure (read() returns it) in summary()"""
+        self._structures[name] = read
+
+    def summary(self, deep: bool = True) -> Dict[str, Any]:
+        structures = {}
+        for name, read in self._structures.items():
+            try:
+                value = read()
+                entry = {'length': len(value) if hasattr(value, '__len__') else None}
+                if deep:
+                    entry.update(deep_size(value))
+            except Exception as e:
+                entry = {'error': str(e)}
+            structures[name] = entry
+        traced, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (None, None)
+        return {
+            'rss_bytes': process_rss(),
+            'tracing': tracemalloc.is_tracing(),
+            'traced_bytes': traced,
+            'traced_peak_bytes': peak,
+            'tracemalloc_overhead_bytes': tracemalloc.get_tracemalloc_memory() if tracemalloc.is_tracing() else None,
+            'snapshots': self.snapshots(),
+            'structures': structures
+        }
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Prometheus metrics for Not a cPanel
+Counters, gauges and histograms rendered in the Prometheus text exposition
+format; updates go to per-thread cells without taking a lock, and cells are
+only summed when /metrics is scraped
+"""
+
+import math
+import bisect
+import threading
+from typing import Dict, List, Any, Callable, Iterable, Tuple
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; covers fast in-memory routes through slow docker operations
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Cells registered before exited threads are first folded without a scrape
+FOLD_THRESHOLD = 64
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class _Cells:
+    """Per-thread value arrays for one labelled series
+
+    Each thread only ever writes its own array, so updates need no lock
+    under the GIL. Arrays of threads that have exited are folded into a
+    base array at collection time, and also when a new thread registers
+    once the list has doubled since the last fold, so it stays bounded by
+    the live threads even when nothing scrapes and the server starts a
+    thread per request.
+    """
+
+    __slots__ = ('size', '_local', '_lock', '_cells', '_base', '_fold_at')
+
+    def __init__(self, size: int):
+        self.size = size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._cells: List[Tuple[threading.Thread, List[float]]] = []
+        self._base = [0.0] * size
+        self._fold_at = FOLD_THRESHOLD
+
+    def cell(self) -> List[float]:
+        cell = getattr(self._local, 'cell', None)
+        if cell is None:
+            cell = self._local.cell = [0.0] * self.size
+            with self._lock:
+                self._cells.append((threading.current_thread(), cell))
+                if len(self._cells) >= self._fold_at:
+                    self._fold()
+        return cell
+
+    def _fold(self):
+        """Fold the arrays of exited threads into the base array; call with the lock held"""
+        live = []
+        for thread, cell in self._cells:
+            if thread.is_alive():
+                live.append((thread, cell))
+            else:
+                for i, value in enumerate(cell):
+                    self._base[i] += value
+        self._cells = live
+        self._fold_at = max(FOLD_THRESHOLD, 2 * len(live))
+
+    def collect(self) -> List[float]:
+        with self._lock:
+            self._fold()
+            totals = list(self._base)
+            for _, cell in self._cells:
+                for i, value in enumerate(cell):
+                    totals[i] += value
+        return totals
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Tuple[str, ...], _Cells] = {}
+        self._lock = threading.Lock()
+
+    def _cell_size(self) -> int:
+        return 1
+
+    def _cells(self, labels: Tuple[str, ...]) -> _Cells:
+        series = self._series.get(labels)
+        if series is None:
+            if len(labels) != len(self.labelnames):
+                raise ValueError(f'{self.name} expects labels {self.labelnames}')
+            with self._lock:
+                series = self._series.setdefault(labels, _Cells(self._cell_size()))
+        return series
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._cells(labels).cell()[0] += amount
+
+    def _samples(self) -> List[str]:
+        return [f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(series.collect()[0])}'
+                for labels, series in sorted(self._series.items())]
+
+
+class Histogram(_Metric):
+    """Cumulative buckets, _sum and _count per label set"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _cell_size(self) -> int:
+        # one slot per bucket, one for +Inf, one for the sum
+        return len(self.buckets) + 2
+
+    def observe(self, value: float, *labels: str):
+        cell = self._cells(labels).cell()
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for labels, series in sorted(self._series.items()):
+            values = series.collect()
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (math.inf,), values[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {_format_value(cumulative)}')
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_text} {_format_value(values[-1])}')
+            lines.append(f'{self.name}_count{label_text} {_format_value(cumulative)}')
+        return lines
+
+
+class Gauge(_Metric):
+    """A value read from a callback at scrape time
+
+    The callback returns a number, or a {label values tuple: number} dict
+    for a labelled gauge.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], Any], labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.read = read
+
+    def _samples(self) -> List[str]:
+        value = self.read()
+        if value is None:
+            return []
+        if not isinstance(value, dict):
+            value = {(): value}
+        return [f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(float(number))}'
+                for labels, number in sorted(value.items())]
+
+
+class Registry:
+    """The set of metrics exported on /metrics"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> Any:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, read: Callable[[], Any], labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, read, labelnames))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # One failing gauge callback must not take the whole scrape down
+                lines.append(f'# {metric.name} unavailable: {_escape(str(e))}')
+        return '\n'.join(lines) + '\n'
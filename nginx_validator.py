@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Central nginx config validation for Not a cPanel
+Checks candidate site configs with one long-lived validator (a local nginx
+binary or a dedicated sidecar container) instead of exec'ing `nginx -t` in
+the live site containers, and caches each verdict by content hash
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Callable
+
+from coalesce import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Mount point of the shared candidate directory inside the sidecar
+SIDECAR_MOUNT = '/validate'
+
+MIME_TYPES = '/etc/nginx/mime.types'
+
+# nginx -t errors that depend on the site container's network or files
+# (upstream names, includes, certificates), which the validator does not
+# have; such a failure says nothing certain about the config
+ENVIRONMENT_ERRORS = ('host not found', 'No such file or directory', 'Permission denied',
+                      'cannot load certificate')
+
+# Wraps a site config the way the stock nginx image includes conf.d/*.conf
+WRAPPER_TEMPLATE = """pid {root}/nginx.pid;
+error_log stderr;
+events {{}}
+http {{
+{mime_types}    include {root}/default.conf;
+}}
+"""
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+class NginxValidator:
+    """Validates site configs with `nginx -t` against a wrapper nginx.conf
+
+    Candidates are written to <work_dir>/<hash>/ and tested either with the
+    local nginx binary or, in sidecar mode, inside a container that has
+    work_dir mounted at /validate. Verdicts are deterministic for a given
+    content, so passes and syntax failures are cached; concurrent checks of
+    the same content share one `nginx -t` run.
+
+    The validator has neither the site's network nor its files, so a
+    failure that names an unresolvable host or a missing include or
+    certificate is reported as inconclusive and not cached: the caller
+    decides whether to test it inside the site container instead.
+    """
+
+    def __init__(self, run_command: Callable[[List[str]], Dict[str, Any]], mode: str = 'auto',
+                 binary: str = 'nginx', image: str = 'nginx:alpine', sidecar_name: str = 'nacp-nginx-validator',
+                 work_dir: str = './nginx-validate', cache_size: int = 1024):
+        self._run_command = run_command
+        self.binary = binary
+        self.image = image
+        self.sidecar_name = sidecar_name
+        self.work_dir = os.path.abspath(work_dir)
+        self.cache_size = cache_size
+        if mode == 'auto':
+            mode = 'local' if shutil.which(binary) else 'sidecar'
+        if mode not in ('local', 'sidecar'):
+            raise ValueError(f'Unknown nginx validator mode: {mode}')
+        self.mode = mode
+        # The stock image ships mime.types; a local binary may be installed without it
+        self.include_mime_types = mode == 'sidecar' or os.path.exists(MIME_TYPES)
+        self._lock = threading.Lock()
+        self._cache: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._flights = SingleFlight()
+        self._sidecar_ready = False
+        self.hits = 0
+        self.misses = 0
+
+    def _candidate_dir(self, digest: str) -> str:
+        return os.path.join(self.work_dir, digest)
+
+    def _write_candidate(self, digest: str, content: str):
+        path = self._candidate_dir(digest)
+        os.makedirs(path, exist_ok=True)
+        root = f'{SIDECAR_MOUNT}/{digest}' if self.mode == 'sidecar' else path
+        mime_types = f'    include {MIME_TYPES};\n' if self.include_mime_types else ''
+        with open(os.path.join(path, 'default.conf'), 'w') as f:
+            f.write(content)
+        with open(os.path.join(path, 'nginx.conf'), 'w') as f:
+            f.write(WRAPPER_TEMPLATE.format(root=root, mime_types=mime_types))
+
+    def _ensure_sidecar(self) -> Optional[str]:
+        """Start the validator container if it is not running; returns an error or None"""
+        if self._sidecar_ready:
+            return None
+        # Plain inspect output: the command runner strips the '=' of --filter and the braces of -f templates
+        inspected = self._run_command(['docker', 'inspect', '--type', 'container', self.sidecar_name])
+        if inspected['success']:
+            try:
+                running = any(item.get('State', {}).get('Running') for item in json.loads(inspected['stdout']))
+            except (ValueError, AttributeError):
+                running = False
+            if running:
+                self._sidecar_ready = True
+                return None
+        # Clear out a stopped or half-created validator before starting a fresh one
+        self._run_command(['docker', 'rm', '-f', self.sidecar_name])
+        os.makedirs(self.work_dir, exist_ok=True)
+        started = self._run_command([
+            'docker', 'run', '-d', '--name', self.sidecar_name, '--restart', 'unless-stopped',
+            '--network', 'none', '-v', f'{self.work_dir}:{SIDECAR_MOUNT}:ro', self.image
+        ])
+        if not started['success']:
+            return f"Could not start validator container: {started['stderr']}"
+        self._sidecar_ready = True
+        return None
+
+    def _test(self, digest: str) -> Dict[str, Any]:
+        if self.mode == 'sidecar':
+            conf = f'{SIDECAR_MOUNT}/{digest}/nginx.conf'
+            # A second attempt covers a sidecar that was stopped or removed since it was last seen
+            for attempt in range(2):
+                error = self._ensure_sidecar()
+                if error:
+                    return {'valid': False, 'inconclusive': False, 'error': error, 'cacheable': False}
+                result = self._run_command(['docker', 'exec', self.sidecar_name, 'nginx', '-t', '-q', '-c', conf])
+                if result['success'] or 'emerg' in result['stderr']:
+                    break
+                self._sidecar_ready = False
+        else:
+            path = self._candidate_dir(digest)
+            result = self._run_command([self.binary, '-t', '-q', '-p', path, '-c', os.path.join(path, 'nginx.conf')])
+        stderr = result['stderr']
+        inconclusive = not result['success'] and any(error in stderr for error in ENVIRONMENT_ERRORS)
+        # A validator that could not run says nothing about the config itself
+        cacheable = result['success'] or ('emerg' in stderr and not inconclusive)
+        return {'valid': result['success'], 'inconclusive': inconclusive, 'error': stderr.strip(),
+                'cacheable': cacheable}
+
+    def _validate_uncached(self, digest: str, content: str) -> Dict[str, Any]:
+        started = time.time()
+        try:
+            self._write_candidate(digest, content)
+            verdict = self._test(digest)
+        except OSError as e:
+            verdict = {'valid': False, 'inconclusive': False, 'error': str(e), 'cacheable': False}
+        finally:
+            shutil.rmtree(self._candidate_dir(digest), ignore_errors=True)
+        verdict['duration'] = round(time.time() - started, 4)
+        if verdict.pop('cacheable'):
+            with self._lock:
+                self._cache[digest] = verdict
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return verdict
+
+    def validate(self, content: str) -> Dict[str, Any]:
+        """{'valid', 'inconclusive', 'error', 'hash', 'cached', 'duration'} for one site config"""
+        digest = content_hash(content)
+        with self._lock:
+            verdict = self._cache.get(digest)
+            if verdict is not None:
+                self._cache.move_to_end(digest)
+                self.hits += 1
+        if verdict is None:
+            with self._lock:
+                self.misses += 1
+            verdict = self._flights.do(digest, self._validate_uncached, digest, content)
+            return {**verdict, 'hash': digest, 'cached': False}
+        return {**verdict, 'hash': digest, 'cached': True}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'mode': self.mode, 'cached': len(self._cache), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Host port allocator for Not a cPanel
+Tracks used host ports in a bitmap built from container port mappings and
+the host's listening sockets, and hands out ports through short-lived
+reservations so concurrent container creation never picks the same port
+"""
+
+import os
+import heapq
+import time
+import logging
+import threading
+from typing import Callable, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+PORT_COUNT = 65536
+TCP_LISTEN = '0A'
+
+
+def listening_ports(proc_root: str = '/proc') -> Set[int]:
+    """Ports with a listening TCP socket on the host, from /proc/net/tcp and tcp6"""
+    ports = set()
+    for name in ('tcp', 'tcp6'):
+        try:
+            with open(os.path.join(proc_root, 'net', name)) as f:
+                next(f, None)  # header
+                for line in f:
+                    fields = line.split()
+                    if len(fields) > 3 and fields[3] == TCP_LISTEN:
+                        ports.add(int(fields[1].rsplit(':', 1)[1], 16))
+        except OSError:
+            continue
+    return ports
+
+
+class PortAllocator:
+    """Bitmap of used ports plus TTL reservations, allocating next-fit from a cursor"""
+
+    def __init__(self, used_ports: Callable[[], Iterable[int]], revision: Callable[[], int],
+                 start: int = 8001, end: int = 8999, reservation_ttl: float = 120.0,
+                 scan_host: bool = True, host_scan_interval: float = 5.0, proc_root: str = '/proc'):
+        if not 1 <= start <= end < PORT_COUNT:
+            raise ValueError(f'Invalid port range {start}-{end}')
+        self._used_ports = used_ports
+        self._revision = revision
+        self.start = start
+        self.end = end
+        self.reservation_ttl = reservation_ttl
+        self.scan_host = scan_host
+        self.host_scan_interval = host_scan_interval
+        self.proc_root = proc_root
+        self._lock = threading.Lock()
+        self._used = bytearray(PORT_COUNT // 8)
+        self._reserved = bytearray(PORT_COUNT // 8)
+        self._expiry: dict = {}  # port -> expiry time
+        self._expiry_heap: list = []  # (expiry, port), may hold stale entries
+        self._cursor = start
+        self._synced_revision: Optional[int] = None
+        self._host_scanned = 0.0
+
+    @staticmethod
+    def _test(bitmap: bytearray, port: int) -> bool:
+        return bool(bitmap[port >> 3] & (1 << (port & 7)))
+
+    @staticmethod
+    def _set(bitmap: bytearray, port: int):
+        bitmap[port >> 3] |= 1 << (port & 7)
+
+    @staticmethod
+    def _clear(bitmap: bytearray, port: int):
+        bitmap[port >> 3] &= ~(1 << (port & 7)) & 0xFF
+
+    def _sync(self):
+        """Rebuild the used bitmap when the inventory changed or the host scan is stale"""
+        now = time.monotonic()
+        revision = self._revision()
+        host_stale = self.scan_host and now - self._host_scanned > self.host_scan_interval
+        if revision == self._synced_revision and not host_stale:
+            return
+        used = bytearray(PORT_COUNT // 8)
+        ports = set(self._used_ports())
+        if self.scan_host:
+            ports |= listening_ports(self.proc_root)
+            self._host_scanned = now
+        for port in ports:
+            if 0 < port < PORT_COUNT:
+                self._set(used, port)
+        self._used = used
+        self._synced_revision = revision
+
+    def _expire(self):
+        now = time.monotonic()
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            expiry, port = heapq.heappop(self._expiry_heap)
+            if self._expiry.get(port) == expiry:
+                del self._expiry[port]
+                self._clear(self._reserved, port)
+
+    def _is_free(self, port: int) -> bool:
+        return not self._test(self._used, port) and not self._test(self._reserved, port)
+
+    def _reserve(self, port: int, ttl: Optional[float]):
+        expiry = time.monotonic() + (ttl if ttl is not None else self.reservation_ttl)
+        self._set(self._reserved, port)
+        self._expiry[port] = expiry
+        heapq.heappush(self._expiry_heap, (expiry, port))
+
+    def _next_free(self) -> Optional[int]:
+        span = self.end - self.start + 1
+        port = self._cursor
+        for _ in range(span):
+            if port > self.end:
+                port = self.start
+            if self._is_free(port):
+                return port
+            port += 1
+        return None
+
+    def reserve(self, port: Optional[int] = None, ttl: Optional[float] = None) -> Optional[int]:
+        """Reserve a specific port or the next free one in range; None if unavailable"""
+        with self._lock:
+            self._expire()
+            self._sync()
+            if port is not None:
+                if not 0 < port < PORT_COUNT or not self._is_free(port):
+                    return None
+            else:
+                port = self._next_free()
+                if port is None:
+                    return None
+                self._cursor = port + 1
+            self._reserve(port, ttl)
+            return port
+
+    def reserve_many(self, requested: List[Optional[int]], ttl: Optional[float] = None) -> List[Optional[int]]:
+        """Reserve a port for each entry in one pass: the given port, or the next free one for None
+
+        Specific ports are claimed first so automatic picks never take them.
+        Entries that cannot be satisfied come back as None.
+        """
+        with self._lock:
+            self._expire()
+            self._sync()
+            ports: List[Optional[int]] = [None] * len(requested)
+            for i, port in enumerate(requested):
+                if port is not None and 0 < port < PORT_COUNT and self._is_free(port):
+                    self._reserve(port, ttl)
+                    ports[i] = port
+            for i, port in enumerate(requested):
+                if port is None:
+                    free = self._next_free()
+                    if free is None:
+                        break
+                    self._reserve(free, ttl)
+                    self._cursor = free + 1
+                    ports[i] = free
+            return ports
+
+    def release(self, port: int):
+        """Drop a reservation, e.g. after the container using it failed to start"""
+        with self._lock:
+            if self._expiry.pop(port, None) is not None:
+                self._clear(self._reserved, port)
+
+    def peek(self) -> Optional[int]:
+        """Next free port without reserving it"""
+        with self._lock:
+            self._expire()
+            self._sync()
+            return self._next_free()
+
+    def reservations(self) -> dict:
+        with self._lock:
+            self._expire()
+            now = time.monotonic()
+            return {port: round(expiry - now, 1) for port, expiry in self._expiry.items()}
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+On-demand profiling for Not a cPanel
+RequestProfiler runs cProfile on the next N requests or for a time window;
+StackSampler periodically records the stacks of every thread from
+sys._current_frames(). Both cost nothing beyond a flag check while off
+"""
+
+import os
+import sys
+import time
+import pstats
+import cProfile
+import logging
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAX_REQUEST_RECORDS = 1000
+
+# Leaf frames of threads that are only waiting, left out of samples by default
+IDLE_LEAVES = {
+    ('threading.py', 'wait'), ('threading.py', '_wait_for_tstate_lock'), ('selectors.py', 'select'),
+    ('socketserver.py', 'serve_forever'), ('queue.py', 'get'), ('thread.py', '_worker'),
+    ('socket.py', 'readinto'), ('terminal.py', 'read')
+}
+
+
+def _function_label(filename: str, line: int, name: str) -> str:
+    return f'{os.path.basename(filename)}:{line}({name})' if line else name
+
+
+class RequestProfiler:
+    """cProfile for a limited number of requests or a limited time
+
+    begin() returns None without touching a lock while not armed, so the
+    per-request cost of having the profiler installed is one attribute read.
+    Profiles of all profiled requests are merged into one pstats.Stats.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.armed = False
+        self._remaining: Optional[int] = None
+        self._deadline: Optional[float] = None
+        self._route: Optional[str] = None
+        self._stats: Optional[pstats.Stats] = None
+        self.started_at: Optional[float] = None
+        self.requests: List[Dict[str, Any]] = []
+
+    def arm(self, requests: Optional[int] = None, seconds: Optional[float] = None, route: Optional[str] = None):
+        """Profile the next `requests` requests and/or for `seconds`, optionally only one route rule"""
+        with self._lock:
+            self._remaining = requests
+            self._deadline = time.monotonic() + seconds if seconds else None
+            self._route = route
+            self._stats = None
+            self.requests = []
+            self.started_at = time.time()
+            self.armed = True
+
+    def disarm(self):
+        with self._lock:
+            self.armed = False
+
+    def begin(self, route: str) -> Optional[cProfile.Profile]:
+        if not self.armed:
+            return None
+        with self._lock:
+            if self._deadline is not None and time.monotonic() > self._deadline:
+                self.armed = False
+                return None
+            if self._route and route != self._route:
+                return None
+            if self._remaining is not None:
+                if self._remaining <= 0:
+                    self.armed = False
+                    return None
+                self._remaining -= 1
+                if self._remaining == 0:
+                    self.armed = False
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active on this interpreter
+            return None
+        return profile
+
+    def end(self, profile: cProfile.Profile, route: str, duration: float):
+        profile.disable()
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+            if len(self.requests) < MAX_REQUEST_RECORDS:
+                self.requests.append({'route': route, 'duration': round(duration, 6)})
+
+    def top(self, limit: int = 30, sort: str = 'cumulative') -> List[Dict[str, Any]]:
+        """Functions ranked by cumulative or own (tottime) time across all profiled requests"""
+        with self._lock:
+            if self._stats is None:
+                return []
+            entries = list(self._stats.stats.items())
+        key = 3 if sort == 'cumulative' else 2
+        entries.sort(key=lambda item: item[1][key], reverse=True)
+        return [{
+            'function': _function_label(*func),
+            'calls': calls,
+            'primitive_calls': primitive,
+            'own_seconds': round(own, 6),
+            'cumulative_seconds': round(cumulative, 6)
+        } for func, (primitive, calls, own, cumulative, _) in entries[:limit]]
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'armed': self.armed,
+                'remaining': self._remaining,
+                'seconds_left': round(max(0.0, self._deadline - time.monotonic()), 1) if self._deadline else None,
+                'route': self._route,
+                'started_at': self.started_at,
+                'profiled': len(self.requests),
+                'requests': list(self.requests[-50:])
+            }
+
+
+class StackSampler:
+    """Samples the Python stacks of all threads at a fixed interval
+
+    Results are kept as collapsed stacks ("outer;inner;leaf count"), the
+    input format of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._labels: Dict[Any, str] = {}
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.interval = 0.01
+        self.include_idle = False
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float, interval: float = 0.01, include_idle: bool = False):
+        with self._lock:
+            if self.running:
+                raise RuntimeError('The sampler is already running')
+            self.stacks = Counter()
+            self.samples = 0
+            self._labels = {}
+            self.interval = interval
+            self.include_idle = include_idle
+            self.started_at = time.time()
+            self.finished_at = None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(seconds,), name='stack-sampler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f'{os.path.basename(code.co_filename)}:{code.co_name}'
+        return label
+
+    def _run(self, seconds: float):
+        own_id = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            frames = sys._current_frames()
+            sampled: List[Tuple[str, ...]] = []
+            for thread_id, frame in frames.items():
+                if thread_id == own_id:
+                    continue
+                code = frame.f_code
+                if not self.include_idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                stack.reverse()
+                sampled.append(tuple(stack))
+            del frames
+            with self._lock:
+                self.samples += 1
+                self.stacks.update(sampled)
+        self.finished_at = time.time()
+
+    def collapsed(self) -> str:
+        with self._lock:
+            stacks = list(self.stacks.items())
+        return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in sorted(stacks, key=lambda item: -item[1]))
+
+    def top(self, limit: int = 30, sort: str = 'total') -> List[Dict[str, Any]]:
+        """Functions by samples spent in them (own) or with them on the stack (total)"""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        with self._lock:
+            stacks = list(self.stacks.items())
+            samples = self.samples
+        for stack, count in stacks:
+            own[stack[-1]] += count
+            for label in set(stack):
+                total[label] += count
+        return [{
+            'function': label,
+            'own_samples': own[label],
+            'total_samples': total[label],
+            'own_seconds': round(own[label] * self.interval, 3),
+            'total_seconds': round(total[label] * self.interval, 3)
+        } for label, count in (own if sort == 'own' else total).most_common(limit)] if samples else []
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'running': self.running,
+                'samples': self.samples,
+                'interval': self.interval,
+                'stacks': len(self.stacks),
+                'started_at': self.started_at,
+                'finished_at': self.finished_at
+            }
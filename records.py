@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Container records for Not a cPanel
+Compact, immutable container records that parse their port mappings on first
+use and cache their own JSON encoding, so listing thousands of containers is
+mostly a join of bytes that were encoded once per change
+"""
+
+import json
+from typing import Any, Dict, Iterable, List, Optional
+
+# Public fields in API output order; parsed_ports is derived from ports
+FIELDS = ('id', 'name', 'image', 'status', 'ports', 'created', 'command', 'size', 'networks', 'mounts')
+
+
+def parse_ports(ports_str: str) -> List[Dict[str, str]]:
+    """Parse a docker ports column like '0.0.0.0:8001->80/tcp, :::8001->80/tcp'"""
+    if not ports_str:
+        return []
+    ports = []
+    for mapping in ports_str.split(', '):
+        if '->' not in mapping:
+            continue
+        try:
+            external, internal = mapping.split('->')
+            external_parts = external.split(':')
+            if len(external_parts) == 2:
+                host_ip, host_port = external_parts
+            else:
+                host_ip = '0.0.0.0'
+                host_port = external_parts[0]
+            internal_parts = internal.split('/')
+            ports.append({
+                'host_ip': host_ip,
+                'host_port': host_port,
+                'container_port': internal_parts[0],
+                'protocol': internal_parts[1] if len(internal_parts) > 1 else 'tcp'
+            })
+        except ValueError:
+            continue
+    return ports
+
+
+class ContainerRecord:
+    """One container as kept in the inventory
+
+    Records are never mutated once published; use replace() to derive a
+    changed copy. Mapping-style access (record['name'], record.get(...))
+    is kept so callers can treat records like the dicts they replace.
+    """
+
+    __slots__ = FIELDS + ('_parsed_ports', '_json')
+
+    def __init__(self, id: str = '', name: str = '', image: str = '', status: str = 'stopped',
+                 ports: str = '', created: str = '', command: str = '', size: str = '',
+                 networks: str = '', mounts: str = ''):
+        self.id = id
+        self.name = name
+        self.image = image
+        self.status = status
+        self.ports = ports
+        self.created = created
+        self.command = command
+        self.size = size
+        self.networks = networks
+        self.mounts = mounts
+        self._parsed_ports: Optional[List[Dict[str, str]]] = None
+        self._json: Optional[bytes] = None
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> 'ContainerRecord':
+        """Build a record from a `docker ps --format json` style row"""
+        return cls(
+            id=row.get('ID', ''),
+            name=row.get('Names', ''),
+            image=row.get('Image', ''),
+            status='running' if row.get('State', '') == 'running' else 'stopped',
+            ports=row.get('Ports', ''),
+            created=row.get('CreatedAt', ''),
+            command=row.get('Command', ''),
+            size=row.get('Size', ''),
+            networks=row.get('Networks', ''),
+            mounts=row.get('Mounts', '')
+        )
+
+    @property
+    def parsed_ports(self) -> List[Dict[str, str]]:
+        if self._parsed_ports is None:
+            self._parsed_ports = parse_ports(self.ports)
+        return self._parsed_ports
+
+    def replace(self, **changes) -> 'ContainerRecord':
+        values = {name: getattr(self, name) for name in FIELDS}
+        values.update(changes)
+        record = ContainerRecord(**values)
+        if record.ports == self.ports:
+            record._parsed_ports = self._parsed_ports
+        return record
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {name: getattr(self, name) for name in FIELDS}
+        data['parsed_ports'] = self.parsed_ports
+        return data
+
+    def json(self) -> bytes:
+        """Encoded JSON object for this record, computed once"""
+        if self._json is None:
+            data = {name: getattr(self, name) for name in FIELDS}
+            # Parse without keeping the result: once encoded, only callers
+            # that need the ports themselves should pay for holding them
+            data['parsed_ports'] = self._parsed_ports if self._parsed_ports is not None else parse_ports(self.ports)
+            self._json = json.dumps(data).encode()
+        return self._json
+
+    def __getitem__(self, key: str) -> Any:
+        if key == 'parsed_ports' or key in FIELDS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, ContainerRecord):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in FIELDS)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f'ContainerRecord(id={self.id!r}, name={self.name!r}, status={self.status!r})'
+
+
+def encode_records(records: Iterable[ContainerRecord]) -> bytes:
+    """JSON array of records, joined from their cached encodings"""
+    return b'[' + b', '.join(record.json() for record in records) + b']'
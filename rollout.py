@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Staged rollouts for Not a cPanel
+Applies a change to many targets in waves: a canary batch first, then
+parallel waves, stopping and rolling every updated target back as soon as
+more targets fail than the rollout allows
+"""
+
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any, Callable
+
+logger = logging.getLogger(__name__)
+
+# Per-target states in a rollout result
+PENDING = 'pending'
+APPLIED = 'applied'
+FAILED = 'failed'
+ROLLED_BACK = 'rolled_back'
+ROLLBACK_FAILED = 'rollback_failed'
+SKIPPED = 'skipped'
+
+
+def plan_waves(targets: List[str], canary: int, wave_size: int) -> List[List[str]]:
+    """Split targets into a canary wave followed by waves of wave_size"""
+    canary = max(0, min(canary, len(targets)))
+    wave_size = max(1, wave_size)
+    waves = [targets[:canary]] if canary else []
+    rest = targets[canary:]
+    waves.extend(rest[i:i + wave_size] for i in range(0, len(rest), wave_size))
+    return waves
+
+
+class Rollout:
+    """One staged rollout of a change over a list of targets
+
+    apply(target) and rollback(target) return {'success': bool, 'error': str}.
+    A target that fails is rolled back on its own; once more than
+    max_failures targets have failed, the remaining waves are skipped and
+    every target that was already updated is rolled back too.
+    """
+
+    def __init__(self, targets: List[str], apply: Callable[[str], Dict[str, Any]],
+                 rollback: Callable[[str], Dict[str, Any]], canary: int = 1, wave_size: int = 5,
+                 max_failures: int = 0, on_progress: Optional[Callable[[int, int, str], None]] = None):
+        self.targets = list(dict.fromkeys(targets))
+        self.apply = apply
+        self.rollback = rollback
+        self.canary = max(0, min(canary, len(self.targets)))
+        self.waves = plan_waves(self.targets, canary, wave_size)
+        self.max_failures = max_failures
+        self.on_progress = on_progress
+        self.results: Dict[str, Dict[str, Any]] = {target: {'target': target, 'state': PENDING} for target in self.targets}
+
+    def _call(self, fn: Callable[[str], Dict[str, Any]], target: str) -> Dict[str, Any]:
+        try:
+            return fn(target)
+        except Exception as e:
+            logger.error(f"Rollout step failed for {target}: {e}")
+            return {'success': False, 'error': str(e)}
+
+    def _apply_one(self, target: str):
+        started = time.time()
+        result = self._call(self.apply, target)
+        item = self.results[target]
+        item['duration'] = round(time.time() - started, 3)
+        if result['success']:
+            item['state'] = APPLIED
+            return
+        item['state'] = FAILED
+        item['error'] = result.get('error', '')
+        undo = self._call(self.rollback, target)
+        if not undo['success']:
+            item['state'] = ROLLBACK_FAILED
+            item['rollback_error'] = undo.get('error', '')
+
+    def _roll_back(self, targets: List[str], workers: int):
+        def undo(target):
+            result = self._call(self.rollback, target)
+            item = self.results[target]
+            item['state'] = ROLLED_BACK if result['success'] else ROLLBACK_FAILED
+            if not result['success']:
+                item['rollback_error'] = result.get('error', '')
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='rollout') as pool:
+            list(pool.map(undo, targets))
+
+    def run(self) -> Dict[str, Any]:
+        started = time.time()
+        halted_at = None
+        done = 0
+        for number, wave in enumerate(self.waves, 1):
+            with ThreadPoolExecutor(max_workers=len(wave), thread_name_prefix='rollout') as pool:
+                list(pool.map(self._apply_one, wave))
+            done += len(wave)
+            failed = sum(1 for item in self.results.values() if item['state'] in (FAILED, ROLLBACK_FAILED))
+            label = 'canary' if number == 1 and self.canary else f'wave {number}'
+            if self.on_progress:
+                self.on_progress(done, len(self.targets), f'{label}: {failed} failed so far')
+            if failed > self.max_failures:
+                halted_at = number
+                break
+        if halted_at is not None:
+            applied = [target for target, item in self.results.items() if item['state'] == APPLIED]
+            self._roll_back(applied, max(len(wave) for wave in self.waves))
+            for item in self.results.values():
+                if item['state'] == PENDING:
+                    item['state'] = SKIPPED
+        counts: Dict[str, int] = {}
+        for item in self.results.values():
+            counts[item['state']] = counts.get(item['state'], 0) + 1
+        return {
+            'success': halted_at is None and counts.get(APPLIED, 0) == len(self.targets),
+            'halted_at_wave': halted_at,
+            'waves': len(self.waves),
+            'counts': counts,
+            'duration': round(time.time() - started, 3),
+            'results': list(self.results.values())
+        }
@@ -319,6 +319,7 @@ def main():
         
         # Set production mode
         server.app.config['DEBUG'] = False
+        server.start_background_services()
         
         # Start server in background thread
         def run_server():
@@ -1,7 +1,7 @@
 // Global variables
 let containers = [];
 let autoRefreshInterval = null;
-let logFollowInterval = null;
+let logEventSource = null;
 let currentSection = 'dashboard';
 let authToken = null;
 let isAuthenticated = false;
@@ -190,9 +190,9 @@ function logout() {
             clearInterval(autoRefreshInterval);
             autoRefreshInterval = null;
         }
-        if (logFollowInterval) {
-            clearInterval(logFollowInterval);
-            logFollowInterval = null;
+        if (logEventSource) {
+            logEventSource.close();
+            logEventSource = null;
         }
         
         showNotification('Logged out successfully', 'info');
@@ -1132,17 +1132,26 @@ function saveNginxConfig() {
 }
 
 // Monitoring Functions
-function refreshStats() {
+async function refreshStats() {
     console.log('Refreshing monitoring stats...');
     
-    // Update container stats with random values
-    containers.forEach(container => {
-        if (container.status === 'running') {
-            container.cpu = Math.random() * 50;
-            container.memory = Math.random() * 512;
-            container.network = Math.random() * 100;
+    // Values come from the server-side sampler, this never touches the daemon
+    try {
+        const response = await fetch('/api/stats', { credentials: 'same-origin' });
+        const data = await response.json();
+        if (data.success) {
+            containers.forEach(container => {
+                const stats = data.stats[container.id.substring(0, 12)];
+                if (stats) {
+                    container.cpu = stats.cpu_percent;
+                    container.memory = stats.memory_usage / (1024 * 1024);
+                    container.network = (stats.net_rx_rate + stats.net_tx_rate) / (1024 * 1024);
+                }
+            });
         }
-    });
+    } catch (error) {
+        console.error('Failed to load stats:', error);
+    }
     
     loadMonitoringData();
     showNotification('Monitoring stats refreshed', 'info');
@@ -1210,17 +1219,32 @@ function toggleFollowLogs() {
     const checkbox = document.getElementById('followLogs');
     
     if (checkbox.checked) {
-        logFollowInterval = setInterval(() => {
-            const select = document.getElementById('logContainerSelect');
-            if (select.value) {
-                loadContainerLogs();
-            }
-        }, 2000);
-        showNotification('Following logs (2s interval)', 'info');
+        const select = document.getElementById('logContainerSelect');
+        if (!select.value) {
+            checkbox.checked = false;
+            showNotification('Select a container first', 'warning');
+            return;
+        }
+        
+        // Stream only new lines instead of re-downloading the tail every 2 seconds.
+        // The stream starts with the same tail the pane already shows, so start from empty
+        const logContent = document.getElementById('logContent');
+        logContent.textContent = '';
+        logEventSource = new EventSource(`/api/containers/${encodeURIComponent(select.value)}/logs/stream?tail=100`);
+        logEventSource.onmessage = (event) => {
+            logContent.textContent += event.data + '\n';
+            logContent.scrollTop = logContent.scrollHeight;
+        };
+        logEventSource.addEventListener('end', () => {
+            logEventSource.close();
+            logEventSource = null;
+            checkbox.checked = false;
+        });
+        showNotification('Following logs', 'info');
     } else {
-        if (logFollowInterval) {
-            clearInterval(logFollowInterval);
-            logFollowInterval = null;
+        if (logEventSource) {
+            logEventSource.close();
+            logEventSource = null;
         }
         showNotification('Stopped following logs', 'info');
     }
@@ -12,37 +12,90 @@ import threading
 import time
 import hashlib
 import secrets
+import uuid
 import psycopg2
+import psycopg2.extensions
 import re
 import logging
+import logging.handlers
+import atexit
 import shutil
-from datetime import datetime, timedelta
-from flask import Flask, render_template, jsonify, request, send_from_directory, session
+import codecs
+import hmac
+import urllib.request
+import urllib.error
+from datetime import datetime, timedelta, timezone
+from flask import Flask, render_template, jsonify, request, send_from_directory, session, Response, g
 from flask_cors import CORS
 from functools import wraps
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 import configparser
+import fnmatch
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, List, Optional, Any
+from docker_backend import create_backend, DockerAPIError
+from inventory import ContainerInventory, EventWatcher, AmbiguousReference
+from jobs import JobManager
+from streaming import sse_event, pump, CommandStream
+from stats import StatsSampler
+from cgroup_metrics import CgroupCollector
+from port_allocator import PortAllocator
+from records import ContainerRecord, encode_records
+from coalesce import SingleFlight
+from rollout import Rollout
+from nginx_validator import NginxValidator
+from content_sync import BlobStore, ContentSync, SyncError
+from images import ImageIndex, PullCoordinator
+from terminal import TerminalManager, TerminalLimitError
+from host_metrics import HostMetrics
+from metrics import Registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from profiling import RequestProfiler, StackSampler
+from memory_diagnostics import MemoryTracer
+from log_pipeline import DroppingQueueHandler, PostgresLogHandler, LogListener
+
+# WebSocket terminals are optional: without flask-sock the endpoint answers 501
+try:
+    from flask_sock import Sock
+    from simple_websocket import ConnectionClosed
+except ImportError:
+    Sock = None
 
 app = Flask(__name__)
+sock = Sock(app) if Sock else None
 
 # Configure CORS with restrictions
-CORS(app, origins=['http://localhost:5000', 'https://localhost:5000'], 
+CORS_ORIGINS = ['http://localhost:5000', 'https://localhost:5000']
+CORS(app, origins=CORS_ORIGINS, 
      supports_credentials=True, 
      allow_headers=['Content-Type', 'Authorization'])
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('not_a_cpanel.log'),
-        logging.StreamHandler()
-    ]
-)
+# Configure logging: records are queued here and written by the listener started in setup_logging()
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+log_queue_handler = DroppingQueueHandler()
+logging.basicConfig(level=logging.INFO, handlers=[log_queue_handler])
 logger = logging.getLogger(__name__)
+log_listener: Optional[LogListener] = None
+
+# Prometheus metrics, exported on /metrics
+metrics = Registry()
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    'nacp_http_request_duration_seconds', 'Time to build a response, by route and status', ('method', 'route', 'status'))
+COMMAND_SECONDS = metrics.histogram(
+    'nacp_command_duration_seconds', 'Duration of commands run through secure_run_command', ('subcommand',))
+COMMAND_EXITS = metrics.counter(
+    'nacp_command_exits_total', 'Commands run through secure_run_command, by exit code', ('subcommand', 'code'))
+DB_CONNECT_SECONDS = metrics.histogram(
+    'nacp_db_connect_duration_seconds', 'Time to open a PostgreSQL connection', ('outcome',))
+DB_QUERY_SECONDS = metrics.histogram(
+    'nacp_db_query_duration_seconds', 'PostgreSQL statement execution time', ('statement',))
+
+# On-demand profiling, switched on through /api/admin/profile
+request_profiler = RequestProfiler()
+stack_sampler = StackSampler()
+MAX_PROFILED_REQUESTS = 10000
+MAX_PROFILE_SECONDS = 600
 
 # Rate limiting
 limiter = Limiter(
@@ -65,6 +118,85 @@ DB_CONFIG = {
     'port': 5432
 }
 
+# Docker daemon access configuration
+DOCKER_CONFIG = {
+    'backend': 'auto',  # auto, api or cli
+    'socket': '/var/run/docker.sock',
+    'events': True,  # keep the container inventory current from the events stream
+    'max_staleness': 30,  # seconds before a read forces a resync when events are unavailable
+    'bulk_workers': 8,  # concurrent daemon calls for bulk container actions
+    'refresh_debounce': 0.05  # seconds within which container list refreshes are merged
+}
+
+# Host port allocation for new containers
+PORTS_CONFIG = {
+    'range_start': 8001,
+    'range_end': 8999,
+    'reservation_ttl': 120,  # seconds a port stays reserved while its container is created
+    'scan_host': True  # also treat ports with a listening host socket as used
+}
+
+# Background job configuration
+JOBS_CONFIG = {
+    'workers': 4,
+    'pull_timeout': 1800  # seconds
+}
+
+# nginx site config rollouts
+NGINX_CONFIG = {
+    'rollout_canary': 1,  # containers updated first, on their own
+    'rollout_wave_size': 5,  # containers updated in parallel per later wave
+    'rollout_max_failures': 0,  # failures tolerated before the whole rollout is rolled back
+    'validator': 'auto',  # auto, local (nginx binary), sidecar (validator container) or container (nginx -t in each site)
+    'validator_binary': 'nginx',
+    'validator_image': 'nginx:alpine',
+    'validator_dir': './nginx-validate',  # candidate configs, shared with the sidecar
+    'validator_cache': 1024,  # verdicts kept by content hash
+    'validator_fallback': True  # nginx -t in the site container when the validator lacks its network or files
+}
+
+# Container stats sampling configuration
+STATS_CONFIG = {
+    'enabled': True,
+    'source': 'auto',  # auto reads cgroup v2 files and falls back to the daemon, daemon always asks the daemon
+    'interval': 5,  # seconds between sampling passes
+    'history': 720  # samples kept per container
+}
+
+# Interactive container terminals
+TERMINAL_CONFIG = {
+    'max_sessions_per_user': 3,
+    'idle_timeout': 900,  # seconds without input or output before a terminal is closed
+    'shell': '/bin/sh'
+}
+
+# Metrics endpoint configuration
+METRICS_CONFIG = {
+    'enabled': True,
+    'token': ''  # bearer token for /metrics; empty allows scrapes from localhost only
+}
+
+# Web content sync configuration
+CONTENT_CONFIG = {
+    'store_dir': './content-store',  # content-addressed blobs shared by every site
+    'session_ttl': 3600,  # seconds a sync may take between manifest and commit
+    'max_files': 100000,
+    'max_chunk_size': 8 * 1024 * 1024
+}
+
+# Logging configuration
+LOGGING_CONFIG = {
+    'file': 'not_a_cpanel.log',
+    'max_bytes': 10 * 1024 * 1024,  # size at which the log file is rotated
+    'backup_count': 5,  # rotated files kept
+    'queue_size': 10000,  # records waiting for the listener; further records are dropped and counted
+    'flush_interval': 2,  # seconds between flushes of buffered records
+    'database': True,  # also store records in the system_logs table
+    'database_level': 'WARNING',
+    'database_batch_size': 200,  # rows per INSERT
+    'database_max_pending': 5000  # records buffered while the database is unreachable
+}
+
 def load_secure_config():
     """Load configuration from secure INI file"""
     global SERVER_IP, USERNAME, ADMIN_PASSWORD_HASH, ADMIN_USERNAME, DB_CONFIG
@@ -100,6 +232,93 @@ def load_secure_config():
                     'port': config.getint('database', 'port', fallback=DB_CONFIG['port'])
                 })
                 
+            # Docker configuration
+            if 'docker' in config:
+                DOCKER_CONFIG.update({
+                    'backend': config.get('docker', 'backend', fallback=DOCKER_CONFIG['backend']),
+                    'socket': config.get('docker', 'socket', fallback=DOCKER_CONFIG['socket']),
+                    'events': config.getboolean('docker', 'events', fallback=DOCKER_CONFIG['events']),
+                    'max_staleness': config.getint('docker', 'max_staleness', fallback=DOCKER_CONFIG['max_staleness']),
+                    'bulk_workers': config.getint('docker', 'bulk_workers', fallback=DOCKER_CONFIG['bulk_workers']),
+                    'refresh_debounce': config.getfloat('docker', 'refresh_debounce', fallback=DOCKER_CONFIG['refresh_debounce'])
+                })
+                
+            # Port allocation configuration
+            if 'ports' in config:
+                PORTS_CONFIG.update({
+                    'range_start': config.getint('ports', 'range_start', fallback=PORTS_CONFIG['range_start']),
+                    'range_end': config.getint('ports', 'range_end', fallback=PORTS_CONFIG['range_end']),
+                    'reservation_ttl': config.getint('ports', 'reservation_ttl', fallback=PORTS_CONFIG['reservation_ttl']),
+                    'scan_host': config.getboolean('ports', 'scan_host', fallback=PORTS_CONFIG['scan_host'])
+                })
+                
+            # Background job configuration
+            if 'jobs' in config:
+                JOBS_CONFIG.update({
+                    'workers': config.getint('jobs', 'workers', fallback=JOBS_CONFIG['workers']),
+                    'pull_timeout': config.getint('jobs', 'pull_timeout', fallback=JOBS_CONFIG['pull_timeout'])
+                })
+                
+            # nginx rollout configuration
+            if 'nginx' in config:
+                NGINX_CONFIG.update({
+                    'rollout_canary': config.getint('nginx', 'rollout_canary', fallback=NGINX_CONFIG['rollout_canary']),
+                    'rollout_wave_size': config.getint('nginx', 'rollout_wave_size', fallback=NGINX_CONFIG['rollout_wave_size']),
+                    'rollout_max_failures': config.getint('nginx', 'rollout_max_failures', fallback=NGINX_CONFIG['rollout_max_failures']),
+                    'validator': config.get('nginx', 'validator', fallback=NGINX_CONFIG['validator']),
+                    'validator_binary': config.get('nginx', 'validator_binary', fallback=NGINX_CONFIG['validator_binary']),
+                    'validator_image': config.get('nginx', 'validator_image', fallback=NGINX_CONFIG['validator_image']),
+                    'validator_dir': config.get('nginx', 'validator_dir', fallback=NGINX_CONFIG['validator_dir']),
+                    'validator_cache': config.getint('nginx', 'validator_cache', fallback=NGINX_CONFIG['validator_cache']),
+                    'validator_fallback': config.getboolean('nginx', 'validator_fallback', fallback=NGINX_CONFIG['validator_fallback'])
+                })
+                
+            # Stats sampling configuration
+            if 'stats' in config:
+                STATS_CONFIG.update({
+                    'enabled': config.getboolean('stats', 'enabled', fallback=STATS_CONFIG['enabled']),
+                    'source': config.get('stats', 'source', fallback=STATS_CONFIG['source']),
+                    'interval': config.getint('stats', 'interval', fallback=STATS_CONFIG['interval']),
+                    'history': config.getint('stats', 'history', fallback=STATS_CONFIG['history'])
+                })
+                
+            # Terminal configuration
+            if 'terminal' in config:
+                TERMINAL_CONFIG.update({
+                    'max_sessions_per_user': config.getint('terminal', 'max_sessions_per_user', fallback=TERMINAL_CONFIG['max_sessions_per_user']),
+                    'idle_timeout': config.getint('terminal', 'idle_timeout', fallback=TERMINAL_CONFIG['idle_timeout']),
+                    'shell': config.get('terminal', 'shell', fallback=TERMINAL_CONFIG['shell'])
+                })
+                
+            # Metrics configuration
+            if 'metrics' in config:
+                METRICS_CONFIG.update({
+                    'enabled': config.getboolean('metrics', 'enabled', fallback=METRICS_CONFIG['enabled']),
+                    'token': config.get('metrics', 'token', fallback=METRICS_CONFIG['token'])
+                })
+                
+            # Web content sync configuration
+            if 'content' in config:
+                CONTENT_CONFIG.update({
+                    'store_dir': config.get('content', 'store_dir', fallback=CONTENT_CONFIG['store_dir']),
+                    'session_ttl': config.getint('content', 'session_ttl', fallback=CONTENT_CONFIG['session_ttl']),
+                    'max_files': config.getint('content', 'max_files', fallback=CONTENT_CONFIG['max_files']),
+                    'max_chunk_size': config.getint('content', 'max_chunk_size', fallback=CONTENT_CONFIG['max_chunk_size'])
+                })
+                
+            if 'logging' in config:
+                LOGGING_CONFIG.update({
+                    'file': config.get('logging', 'file', fallback=LOGGING_CONFIG['file']),
+                    'max_bytes': config.getint('logging', 'max_bytes', fallback=LOGGING_CONFIG['max_bytes']),
+                    'backup_count': config.getint('logging', 'backup_count', fallback=LOGGING_CONFIG['backup_count']),
+                    'queue_size': config.getint('logging', 'queue_size', fallback=LOGGING_CONFIG['queue_size']),
+                    'flush_interval': config.getfloat('logging', 'flush_interval', fallback=LOGGING_CONFIG['flush_interval']),
+                    'database': config.getboolean('logging', 'database', fallback=LOGGING_CONFIG['database']),
+                    'database_level': config.get('logging', 'database_level', fallback=LOGGING_CONFIG['database_level']).upper(),
+                    'database_batch_size': config.getint('logging', 'database_batch_size', fallback=LOGGING_CONFIG['database_batch_size']),
+                    'database_max_pending': config.getint('logging', 'database_max_pending', fallback=LOGGING_CONFIG['database_max_pending'])
+                })
+                
             logger.info(f"Configuration loaded from {config_file}")
         except Exception as e:
             logger.error(f"Error loading config file: {e}")
@@ -133,6 +352,76 @@ def create_default_config(config_file: str):
         'port': str(DB_CONFIG['port'])
     }
     
+    config['docker'] = {
+        'backend': DOCKER_CONFIG['backend'],
+        'socket': DOCKER_CONFIG['socket'],
+        'events': str(DOCKER_CONFIG['events']),
+        'max_staleness': str(DOCKER_CONFIG['max_staleness']),
+        'bulk_workers': str(DOCKER_CONFIG['bulk_workers']),
+        'refresh_debounce': str(DOCKER_CONFIG['refresh_debounce'])
+    }
+    
+    config['ports'] = {
+        'range_start': str(PORTS_CONFIG['range_start']),
+        'range_end': str(PORTS_CONFIG['range_end']),
+        'reservation_ttl': str(PORTS_CONFIG['reservation_ttl']),
+        'scan_host': str(PORTS_CONFIG['scan_host'])
+    }
+    
+    config['jobs'] = {
+        'workers': str(JOBS_CONFIG['workers']),
+        'pull_timeout': str(JOBS_CONFIG['pull_timeout'])
+    }
+    
+    config['nginx'] = {
+        'rollout_canary': str(NGINX_CONFIG['rollout_canary']),
+        'rollout_wave_size': str(NGINX_CONFIG['rollout_wave_size']),
+        'rollout_max_failures': str(NGINX_CONFIG['rollout_max_failures']),
+        'validator': NGINX_CONFIG['validator'],
+        'validator_binary': NGINX_CONFIG['validator_binary'],
+        'validator_image': NGINX_CONFIG['validator_image'],
+        'validator_dir': NGINX_CONFIG['validator_dir'],
+        'validator_cache': str(NGINX_CONFIG['validator_cache']),
+        'validator_fallback': str(NGINX_CONFIG['validator_fallback'])
+    }
+    
+    config['stats'] = {
+        'enabled': str(STATS_CONFIG['enabled']),
+        'source': STATS_CONFIG['source'],
+        'interval': str(STATS_CONFIG['interval']),
+        'history': str(STATS_CONFIG['history'])
+    }
+    
+    config['terminal'] = {
+        'max_sessions_per_user': str(TERMINAL_CONFIG['max_sessions_per_user']),
+        'idle_timeout': str(TERMINAL_CONFIG['idle_timeout']),
+        'shell': TERMINAL_CONFIG['shell']
+    }
+    
+    config['metrics'] = {
+        'enabled': str(METRICS_CONFIG['enabled']),
+        'token': METRICS_CONFIG['token']
+    }
+    
+    config['content'] = {
+        'store_dir': CONTENT_CONFIG['store_dir'],
+        'session_ttl': str(CONTENT_CONFIG['session_ttl']),
+        'max_files': str(CONTENT_CONFIG['max_files']),
+        'max_chunk_size': str(CONTENT_CONFIG['max_chunk_size'])
+    }
+    
+    config['logging'] = {
+        'file': LOGGING_CONFIG['file'],
+        'max_bytes': str(LOGGING_CONFIG['max_bytes']),
+        'backup_count': str(LOGGING_CONFIG['backup_count']),
+        'queue_size': str(LOGGING_CONFIG['queue_size']),
+        'flush_interval': str(LOGGING_CONFIG['flush_interval']),
+        'database': str(LOGGING_CONFIG['database']),
+        'database_level': LOGGING_CONFIG['database_level'],
+        'database_batch_size': str(LOGGING_CONFIG['database_batch_size']),
+        'database_max_pending': str(LOGGING_CONFIG['database_max_pending'])
+    }
+    
     with open(config_file, 'w') as f:
         config.write(f)
     
@@ -161,9 +450,37 @@ VALID_CONTAINER_NAME = re.compile(r'^[a-zA-Z0-9][a-zA-Z0-9_.-]*$')
 VALID_IMAGE_NAME = re.compile(r'^[a-z0-9]+([._-][a-z0-9]+)*(/[a-z0-9]+([._-][a-z0-9]+)*)*(:[\w.-]+)?$')
 VALID_PORT = re.compile(r'^[1-9][0-9]{0,4}$')
 VALID_DATABASE_NAME = re.compile(r'^[a-zA-Z][a-zA-Z0-9_]*$')
+RELATIVE_TIME = re.compile(r'^(\d+)([smhd])$')
+
+def connect_log_database():
+    """Connection for the system_logs sink; failures are reported by the sink, not logged here"""
+    return psycopg2.connect(**DB_CONFIG, connect_timeout=5)
+
+def setup_logging():
+    """Start the listener that writes queued records to the rotating log file, stderr and system_logs"""
+    global log_listener
+    formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = logging.handlers.RotatingFileHandler(
+        LOGGING_CONFIG['file'], maxBytes=LOGGING_CONFIG['max_bytes'], backupCount=LOGGING_CONFIG['backup_count'])
+    stream_handler = logging.StreamHandler()
+    handlers: List[logging.Handler] = [file_handler, stream_handler]
+    if LOGGING_CONFIG['database']:
+        database_level = logging.getLevelName(LOGGING_CONFIG['database_level'])
+        handlers.append(PostgresLogHandler(
+            connect_log_database,
+            level=database_level if isinstance(database_level, int) else logging.WARNING,
+            batch_size=LOGGING_CONFIG['database_batch_size'],
+            max_pending=LOGGING_CONFIG['database_max_pending']))
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+    log_queue_handler.resize(LOGGING_CONFIG['queue_size'])
+    log_listener = LogListener(log_queue_handler, handlers, flush_interval=LOGGING_CONFIG['flush_interval'])
+    log_listener.start()
+    atexit.register(log_listener.stop)
 
 # Load configuration
 load_secure_config()
+setup_logging()
 
 def validate_input(value: str, pattern: re.Pattern, max_length: int = 100) -> bool:
     """Validate input against regex pattern and length"""
@@ -177,6 +494,29 @@ def sanitize_for_shell(value: str) -> str:
     # This is more permissive but still safe when not using shell=True
     return re.sub(r'[^a-zA-Z0-9._\-:/]', '', value)
 
+def log_timestamp_key(timestamp: str) -> str:
+    """Normalize a docker RFC3339Nano timestamp so that string order is time order"""
+    base, _, fraction = timestamp.rstrip('Z').partition('.')
+    return f"{base}.{fraction.ljust(9, '0')[:9]}"
+
+def parse_log_time(value: str) -> float:
+    """Parse a unix timestamp, relative duration (30s, 10m, 2h, 1d) or UTC ISO 8601 time to unix seconds"""
+    value = value.strip()
+    match = RELATIVE_TIME.match(value)
+    if match:
+        seconds = int(match.group(1)) * {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[match.group(2)]
+        return time.time() - seconds
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        base, fraction = log_timestamp_key(value).split('.')
+        parsed = datetime.strptime(base, '%Y-%m-%dT%H:%M:%S')
+    except ValueError:
+        raise ValueError(f'Invalid time: {value[:40]}')
+    return parsed.replace(tzinfo=timezone.utc).timestamp() + int(fraction) / 1e9
+
 def check_account_lockout(ip_address: str) -> bool:
     """Check if IP is locked out due to failed login attempts"""
     if ip_address in failed_login_attempts:
@@ -199,6 +539,13 @@ def record_failed_login(ip_address: str):
     
     logger.warning(f"Failed login attempt from {ip_address}. Count: {failed_login_attempts[ip_address]['count']}")
 
+def command_label(command_list: List[str]) -> str:
+    """Metrics label for a command: the docker subcommand, or the program name"""
+    program = os.path.basename(command_list[0])
+    if program == 'docker' and len(command_list) > 1:
+        return command_list[1]
+    return program
+
 def secure_run_command(command_list: List[str], timeout: int = 30) -> Dict[str, Any]:
     """Execute command with enhanced security - no shell=True"""
     try:
@@ -209,13 +556,19 @@ def secure_run_command(command_list: List[str], timeout: int = 30) -> Dict[str,
         # Sanitize command parts
         sanitized_command = [sanitize_for_shell(part) for part in command_list]
         
-        result = subprocess.run(
-            sanitized_command,
-            shell=False,  # Never use shell=True
-            capture_output=True,
-            text=True,
-            timeout=timeout
-        )
+        subcommand = command_label(sanitized_command)
+        started = time.perf_counter()
+        try:
+            result = subprocess.run(
+                sanitized_command,
+                shell=False,  # Never use shell=True
+                capture_output=True,
+                text=True,
+                timeout=timeout
+            )
+        finally:
+            COMMAND_SECONDS.observe(time.perf_counter() - started, subcommand)
+        COMMAND_EXITS.inc(subcommand, str(result.returncode))
         
         return {
             'success': result.returncode == 0,
@@ -224,6 +577,7 @@ def secure_run_command(command_list: List[str], timeout: int = 30) -> Dict[str,
             'returncode': result.returncode
         }
     except subprocess.TimeoutExpired:
+        COMMAND_EXITS.inc(command_label(command_list), 'timeout')
         logger.error(f"Command timeout: {command_list}")
         return {
             'success': False,
@@ -240,17 +594,54 @@ def secure_run_command(command_list: List[str], timeout: int = 30) -> Dict[str,
             'returncode': -1
         }
 
+def secure_stream_command(command_list: List[str], timeout: int = 30) -> Optional[CommandStream]:
+    """Start a command like secure_run_command, but hand back its stdout line by line
+
+    Returns None when the command cannot be started. Check the stream's
+    success, stderr and returncode after iterating it.
+    """
+    try:
+        if not command_list or not isinstance(command_list, list):
+            raise ValueError("Invalid command format")
+        return CommandStream([sanitize_for_shell(part) for part in command_list], timeout=timeout)
+    except Exception as e:
+        logger.error(f"Command execution error: {e}")
+        return None
+
+class TimedCursor(psycopg2.extensions.cursor):
+    """Cursor that records statement execution time by statement kind"""
+    @staticmethod
+    def _kind(query) -> str:
+        words = query.split(None, 1) if isinstance(query, str) else None
+        return words[0].upper() if words else 'OTHER'
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - started, self._kind(query))
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - started, self._kind(query))
+
 # Database connection and initialization
 def get_db_connection():
     """Get PostgreSQL database connection"""
+    started = time.perf_counter()
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
+        conn = psycopg2.connect(**DB_CONFIG, cursor_factory=TimedCursor)
         conn.autocommit = False  # Ensure transactions are explicit
+        DB_CONNECT_SECONDS.observe(time.perf_counter() - started, 'success')
         return conn
     except psycopg2.OperationalError as e:
+        DB_CONNECT_SECONDS.observe(time.perf_counter() - started, 'error')
         logger.error(f"Database connection error: {e}")
         return None
     except Exception as e:
+        DB_CONNECT_SECONDS.observe(time.perf_counter() - started, 'error')
         logger.error(f"Unexpected database error: {e}")
         return None
 
@@ -297,6 +688,23 @@ def init_database():
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
+        # Create jobs table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id VARCHAR(32) PRIMARY KEY,
+                kind VARCHAR(50) NOT NULL,
+                status VARCHAR(20) NOT NULL,
+                progress INTEGER DEFAULT 0,
+                message TEXT,
+                params JSONB,
+                result JSONB,
+                error TEXT,
+                logs TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP
+            )
+        """)
         conn.commit()
         cursor.close()
         conn.close()
@@ -312,6 +720,113 @@ def init_database():
                 pass
         return False
 
+def persist_job(job):
+    """Insert or update a job row in the jobs table"""
+    conn = get_db_connection()
+    if not conn:
+        return
+    try:
+        data = job.to_dict(include_logs=True)
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO jobs (id, kind, status, progress, message, params, result, error, logs,
+                              created_at, started_at, finished_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (id) DO UPDATE SET
+                status = EXCLUDED.status, progress = EXCLUDED.progress, message = EXCLUDED.message,
+                result = EXCLUDED.result, error = EXCLUDED.error, logs = EXCLUDED.logs,
+                started_at = EXCLUDED.started_at, finished_at = EXCLUDED.finished_at
+        """, (
+            data['id'], data['kind'], data['status'], data['progress'], data['message'],
+            json.dumps(data['params']), json.dumps(data['result']), data['error'], '\n'.join(data['logs']),
+            job.created_at, job.started_at, job.finished_at
+        ))
+        conn.commit()
+        cursor.close()
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error saving job {job.id}: {e}")
+    finally:
+        conn.close()
+
+def load_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Load a job from the jobs table"""
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id, kind, status, progress, message, params, result, error, logs,
+                   created_at, started_at, finished_at
+            FROM jobs WHERE id = %s
+        """, (job_id,))
+        row = cursor.fetchone()
+        cursor.close()
+    finally:
+        conn.close()
+    if not row:
+        return None
+    columns = ['id', 'kind', 'status', 'progress', 'message', 'params', 'result', 'error', 'logs',
+               'created_at', 'started_at', 'finished_at']
+    data = dict(zip(columns, row))
+    data['logs'] = data['logs'].split('\n') if data['logs'] else []
+    for key in ('created_at', 'started_at', 'finished_at'):
+        data[key] = data[key].isoformat() if data[key] else None
+    return data
+
+def load_recent_jobs(limit: int) -> List[Dict[str, Any]]:
+    """The newest `limit` jobs from the jobs table, without their logs"""
+    conn = get_db_connection()
+    if not conn:
+        return []
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id, kind, status, progress, message, params, result, error,
+                   created_at, started_at, finished_at
+            FROM jobs ORDER BY created_at DESC LIMIT %s
+        """, (limit,))
+        rows = cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
+    columns = ['id', 'kind', 'status', 'progress', 'message', 'params', 'result', 'error',
+               'created_at', 'started_at', 'finished_at']
+    jobs = []
+    for row in rows:
+        data = dict(zip(columns, row))
+        for key in ('created_at', 'started_at', 'finished_at'):
+            data[key] = data[key].isoformat() if data[key] else None
+        jobs.append(data)
+    return jobs
+
+def store_site_configs(configs: Dict[str, str]) -> bool:
+    """Record the nginx site config now active in each container, replacing the one recorded before"""
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        cursor = conn.cursor()
+        # One row per container: serialized, so concurrent writers cannot both insert after deleting
+        cursor.execute("LOCK TABLE container_configs IN SHARE ROW EXCLUSIVE MODE")
+        cursor.executemany("""
+            DELETE FROM container_configs WHERE container_id = %s AND config_type = %s
+        """, [(container_id, SITE_CONFIG_TYPE) for container_id in configs])
+        cursor.executemany("""
+            INSERT INTO container_configs (container_id, config_type, config_content)
+            VALUES (%s, %s, %s)
+        """, [(container_id, SITE_CONFIG_TYPE, content) for container_id, content in configs.items()])
+        conn.commit()
+        cursor.close()
+        return True
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error storing site configs: {e}")
+        return False
+    finally:
+        conn.close()
+
 def require_auth(f):
     """Decorator to require authentication for API endpoints"""
     @wraps(f)
@@ -336,88 +851,212 @@ def generate_session_token():
     """Generate a secure session token"""
     return secrets.token_urlsafe(32)
 
+# default.conf written for every new nginx site; it does not depend on the site
+DEFAULT_NGINX_CONFIG = """server {
+    listen 80;
+    server_name localhost;
+    location / {
+        root /usr/share/nginx/html;
+        index index.html index.htm;
+    }
+    location /health {
+        access_log off;
+        return 200 \"healthy\\n\";
+        add_header Content-Type text/plain;
+    }
+    error_page 500 502 503 504 /50x.html;
+    location = /50x.html {
+        root /usr/share/nginx/html;
+    }
+}"""
+
+# container_configs.config_type of the default.conf mounted into each nginx site
+SITE_CONFIG_TYPE = 'nginx_site'
+MAX_SITE_CONFIG_SIZE = 65536
+
+# Read-only docker subcommands whose concurrent identical calls are coalesced, in
+# run_command and in the CLI backend's streamed json listings (ps, images, stats).
+# inspect is left out: it follows mutations and must not reuse an older call
+COALESCED_DOCKER_COMMANDS = {'ps', 'images', 'stats', 'version', 'info'}
+
 class DockerManager:
-    def __init__(self):
-        self.containers = []
+    def __init__(self, backend=None):
+        self.flights = SingleFlight()
+        self.backend = backend or create_backend(DOCKER_CONFIG['backend'], self.run_command, DOCKER_CONFIG['socket'],
+                                                 stream_command=self.stream_command, coalesce=self.flights.do)
+        logger.info(f"Using docker {self.backend.name} backend")
+        self.inventory = ContainerInventory(self._load_containers, self._load_container,
+                                            max_staleness=DOCKER_CONFIG['max_staleness'],
+                                            resync_debounce=DOCKER_CONFIG['refresh_debounce'])
+        self.images = ImageIndex(self.backend.list_images, self.backend.get_image)
+        self.image_pulls = PullCoordinator(self._pull_and_index)
+        self.event_watcher = None
+        self.port_allocator = PortAllocator(
+            self._used_host_ports, lambda: self.inventory.revision,
+            start=PORTS_CONFIG['range_start'], end=PORTS_CONFIG['range_end'],
+            reservation_ttl=PORTS_CONFIG['reservation_ttl'], scan_host=PORTS_CONFIG['scan_host']
+        )
+        self._bulk_executor = ThreadPoolExecutor(max_workers=DOCKER_CONFIG['bulk_workers'], thread_name_prefix='docker-bulk')
+        self.nginx_validator = None
+        if NGINX_CONFIG['validator'] != 'container':
+            self.nginx_validator = NginxValidator(
+                self.run_command, mode=NGINX_CONFIG['validator'], binary=NGINX_CONFIG['validator_binary'],
+                image=NGINX_CONFIG['validator_image'], work_dir=NGINX_CONFIG['validator_dir'],
+                cache_size=NGINX_CONFIG['validator_cache']
+            )
         self.refresh_containers()
+        self.images.resync()
+    @property
+    def containers(self):
+        return self.inventory.containers()
     def run_command(self, command_list):
         if isinstance(command_list, str):
             command_list = command_list.split()
+        if len(command_list) > 1 and command_list[1] in COALESCED_DOCKER_COMMANDS:
+            # Identical concurrent reads share one docker process
+            return self.flights.do(tuple(command_list), secure_run_command, command_list)
         return secure_run_command(command_list)
+    def stream_command(self, command_list):
+        return secure_stream_command(command_list)
+    def start_event_watcher(self):
+        if self.event_watcher is None and DOCKER_CONFIG['events']:
+            self.event_watcher = EventWatcher(self.inventory, self.backend.events, followers=[self.images])
+            self.event_watcher.start()
     def refresh_containers(self):
-        self.containers = []
-        result = self.run_command(["docker", "ps", "-a", "--format", "json"])
-        if result['success'] and result['stdout']:
-            for line in result['stdout'].split('\n'):
-                if line.strip():
-                    try:
-                        container_data = json.loads(line)
-                        ports_raw = container_data.get('Ports', '')
-                        ports = self._parse_ports(ports_raw)
-                        self.containers.append({
-                            'id': container_data.get('ID', ''),
-                            'name': container_data.get('Names', ''),
-                            'image': container_data.get('Image', ''),
-                            'status': 'running' if container_data.get('State', '') == 'running' else 'stopped',
-                            'ports': ports_raw,
-                            'parsed_ports': ports,
-                            'created': container_data.get('CreatedAt', ''),
-                            'command': container_data.get('Command', ''),
-                            'size': container_data.get('Size', ''),
-                            'networks': container_data.get('Networks', ''),
-                            'mounts': container_data.get('Mounts', '')
-                        })
-                    except json.JSONDecodeError:
-                        continue
+        self.inventory.resync()
         return self.containers
-    def _parse_ports(self, ports_str):
-        if not ports_str:
-            return []
-        ports = []
-        port_mappings = ports_str.split(', ')
-        for mapping in port_mappings:
-            if '->' in mapping:
-                try:
-                    external, internal = mapping.split('->')
-                    external_parts = external.split(':')
-                    if len(external_parts) == 2:
-                        host_ip = external_parts[0]
-                        host_port = external_parts[1]
-                    else:
-                        host_ip = '0.0.0.0'
-                        host_port = external_parts[0]
-                    internal_parts = internal.split('/')
-                    container_port = internal_parts[0]
-                    protocol = internal_parts[1] if len(internal_parts) > 1 else 'tcp'
-                    ports.append({
-                        'host_ip': host_ip,
-                        'host_port': host_port,
-                        'container_port': container_port,
-                        'protocol': protocol
-                    })
-                except:
-                    continue
-        return ports
-    def get_available_port(self, start_port=8001):
-        used_ports = set()
+    def _load_containers(self):
+        rows = self.backend.list_containers()
+        if rows is None:
+            return None
+        return [self._row_to_container(row) for row in rows]
+    def _load_container(self, container_id):
+        row = self.backend.get_container(container_id)
+        return self._row_to_container(row) if row else None
+    def _row_to_container(self, container_data):
+        return ContainerRecord.from_row(container_data)
+    def _used_host_ports(self):
         for container in self.containers:
-            for port in container.get('parsed_ports', []):
+            for port in container.parsed_ports:
                 try:
-                    used_ports.add(int(port['host_port']))
-                except:
+                    yield int(port['host_port'])
+                except (KeyError, ValueError):
                     continue
-        port = start_port
-        while port in used_ports:
-            port += 1
-        return port
-    def create_container(self, name, image="nginx:alpine", port=None, volumes=None, environment=None):
+    def get_available_port(self):
+        return self.port_allocator.peek()
+    def create_container(self, name, image="nginx:alpine", port=None, volumes=None, environment=None, pull=True):
         if not name:
             return {'success': False, 'error': 'Container name is required'}
-        existing_names = [c['name'] for c in self.containers]
-        if name in existing_names:
+        if self.inventory.get_by_name(name) is not None:
             return {'success': False, 'error': f'Container with name "{name}" already exists'}
+        # Reserve the port so a concurrent create cannot pick it before this
+        # container shows up in the inventory
         if port is None:
-            port = self.get_available_port()
+            port = self.port_allocator.reserve()
+            if port is None:
+                return {'success': False, 'error': f'No free ports in range {PORTS_CONFIG["range_start"]}-{PORTS_CONFIG["range_end"]}'}
+        elif self.port_allocator.reserve(port) is None:
+            return {'success': False, 'error': f'Port {port} is already in use'}
+        error = self.ensure_image(image, pull=pull)
+        if error:
+            self.port_allocator.release(port)
+            return error
+        cmd_parts = self._docker_run_command(name, image, port, volumes, environment)
+        result = self.run_command(cmd_parts)
+        if result['success']:
+            if 'nginx' in image.lower():
+                self._create_default_nginx_config(name, port)
+            self.inventory.refresh_one(result['stdout'][:12] or name)
+        else:
+            self.port_allocator.release(port)
+        return result
+    def provision_sites(self, sites, on_progress=None, pull=True):
+        """Create many sites at once: ports reserved in one pass, site files
+        written up front, containers started on the bulk pool, one refresh at the end"""
+        started = time.time()
+        results = [{'name': site['name'], 'success': False} for site in sites]
+        names = set()
+        accepted = []
+        for site, item in zip(sites, results):
+            name = site['name']
+            if not validate_input(name, VALID_CONTAINER_NAME, 64):
+                item['error'] = 'Invalid container name'
+            elif name in names or self.inventory.get_by_name(name) is not None:
+                item['error'] = f'Container with name "{name}" already exists'
+            else:
+                names.add(name)
+                accepted.append((site, item))
+        ports = self.port_allocator.reserve_many([site.get('port') for site, _ in accepted])
+        # Each distinct image is checked, and pulled if missing, once for the whole batch
+        image_errors = {image: self.ensure_image(image, pull=pull) for image in {site['image'] for site, _ in accepted}}
+        runnable = []
+        created_dirs = {}
+        for (site, item), port in zip(accepted, ports):
+            if port is not None and image_errors[site['image']]:
+                self.port_allocator.release(port)
+                item['error'] = image_errors[site['image']]['error']
+                continue
+            if port is None:
+                item['error'] = (f'Port {site["port"]} is already in use' if site.get('port') is not None
+                                 else f'No free ports in range {PORTS_CONFIG["range_start"]}-{PORTS_CONFIG["range_end"]}')
+                continue
+            item['port'] = port
+            # Site files go in before the container starts, so nginx comes up with its config
+            if 'nginx' in site['image'].lower():
+                try:
+                    created_dirs[site['name']] = self._create_default_nginx_config(site['name'], port)
+                except OSError as e:
+                    self.port_allocator.release(port)
+                    item['error'] = f'Failed to write site files: {e}'
+                    continue
+            runnable.append((site, item))
+
+        def run(site, item):
+            site_started = time.time()
+            if not site.get('volumes'):
+                # Made here rather than by _docker_run_command, so they are known and removed if the run fails
+                try:
+                    created_dirs.setdefault(site['name'], []).extend(self._create_site_dirs(site['name']))
+                except OSError as e:
+                    self.port_allocator.release(item['port'])
+                    self._remove_site_dirs(created_dirs.get(site['name'], []))
+                    item['error'] = f'Failed to create site directories: {e}'
+                    return
+            result = self.run_command(self._docker_run_command(
+                site['name'], site['image'], item['port'], site.get('volumes'), site.get('environment')))
+            item['duration'] = round(time.time() - site_started, 3)
+            if result['success']:
+                item['success'] = True
+                item['container_id'] = result['stdout'][:12]
+            else:
+                self.port_allocator.release(item['port'])
+                # Do not leave site files behind for a container that does not exist
+                self._remove_site_dirs(created_dirs.get(site['name'], []))
+                item['error'] = result.get('error') or result.get('stderr', '')
+
+        futures = [self._bulk_executor.submit(run, site, item) for site, item in runnable]
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Provisioning a site failed: {e}")
+            if on_progress:
+                on_progress(done, len(futures))
+        for item in results:
+            if not item['success'] and 'error' not in item:
+                item['error'] = 'Provisioning failed'
+        if futures:
+            self.refresh_containers()
+        succeeded = sum(1 for item in results if item['success'])
+        return {
+            'success': succeeded == len(results),
+            'total': len(results),
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded,
+            'duration': round(time.time() - started, 3),
+            'results': results
+        }
+    def _docker_run_command(self, name, image, port, volumes=None, environment=None):
         cmd_parts = ['docker', 'run', '-d', '--name', name]
         cmd_parts.extend(['-p', f'{port}:80'])
         if volumes:
@@ -435,37 +1074,39 @@ class DockerManager:
                 cmd_parts.extend(['-e', env_var])
         cmd_parts.extend(['--restart', 'unless-stopped'])
         cmd_parts.append(image)
-        result = self.run_command(cmd_parts)
-        if result['success']:
-            if 'nginx' in image.lower():
-                self._create_default_nginx_config(name, port)
-            self.refresh_containers()
-        return result
+        return cmd_parts
     def _create_default_nginx_config(self, container_name, port):
+        """Write a site's default config and index page; returns the directories it had to create"""
         config_dir = f'./nginx-configs/{container_name}'
         content_dir = f'./web-content/{container_name}'
-        os.makedirs(config_dir, exist_ok=True)
-        os.makedirs(content_dir, exist_ok=True)
-        config_content = f"""server {{
-    listen 80;
-    server_name localhost;
-    location / {{
-        root /usr/share/nginx/html;
-        index index.html index.htm;
-    }}
-    location /health {{
-        access_log off;
-        return 200 \"healthy\\n\";
-        add_header Content-Type text/plain;
-    }}
-    error_page 500 502 503 504 /50x.html;
-    location = /50x.html {{
-        root /usr/share/nginx/html;
-    }}
-}}"""
-        with open(f'{config_dir}/default.conf', 'w') as f:
-            f.write(config_content)
-        html_content = f"""<!DOCTYPE html>
+        created = self._create_site_dirs(container_name)
+        try:
+            with open(f'{config_dir}/default.conf', 'w') as f:
+                f.write(DEFAULT_NGINX_CONFIG)
+            with open(f'{content_dir}/index.html', 'w') as f:
+                f.write(self._default_index_html(container_name, port))
+        except OSError:
+            self._remove_site_dirs(created)
+            raise
+        return created
+    def _create_site_dirs(self, container_name):
+        """Make a site's config and content directories; returns the ones that did not exist yet"""
+        created = []
+        try:
+            for directory in (f'./nginx-configs/{container_name}', f'./web-content/{container_name}'):
+                if not os.path.isdir(directory):
+                    os.makedirs(directory)
+                    created.append(directory)
+        except OSError:
+            self._remove_site_dirs(created)
+            raise
+        return created
+    def _remove_site_dirs(self, directories):
+        """Undo _create_site_dirs and _create_default_nginx_config for a site whose container was never started"""
+        for directory in directories:
+            shutil.rmtree(directory, ignore_errors=True)
+    def _default_index_html(self, container_name, port):
+        return f"""<!DOCTYPE html>
 <html>
 <head>
     <title>{container_name} - Not a cPanel</title>
@@ -496,42 +1137,72 @@ class DockerManager:
     </div>
 </body>
 </html>"""
-        with open(f'{content_dir}/index.html', 'w') as f:
-            f.write(html_content)
-    def start_container(self, container_id):
+    def site_config_path(self, container_name):
+        return f'./nginx-configs/{container_name}/default.conf'
+    def read_site_config(self, container_name):
+        try:
+            with open(self.site_config_path(container_name)) as f:
+                return f.read()
+        except OSError:
+            return None
+    def write_site_config(self, container_name, content):
+        """Replace a site's default.conf atomically; None removes it"""
+        path = self.site_config_path(container_name)
+        if content is None:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.{secrets.token_hex(4)}.tmp'
+        with open(temp_path, 'w') as f:
+            f.write(content)
+        os.replace(temp_path, path)
+    def test_nginx_config(self, container_name):
+        return self.run_command(['docker', 'exec', container_name, 'nginx', '-t'])
+    def validate_site_config(self, content):
+        """Check a candidate site config with the central validator, without touching any site"""
+        if self.nginx_validator is None:
+            return None
+        return self.nginx_validator.validate(content)
+    def needs_container_test(self, verdict):
+        """Whether a config must still be checked with nginx -t inside each site container"""
+        return verdict is None or (verdict['inconclusive'] and NGINX_CONFIG['validator_fallback'])
+    def reload_nginx(self, container_name):
+        return self.run_command(['docker', 'exec', container_name, 'nginx', '-s', 'reload'])
+    def start_container(self, container_id, refresh=True):
         if not validate_input(container_id, VALID_CONTAINER_NAME, 64):
             return {'success': False, 'error': 'Invalid container ID'}
-        result = self.run_command(["docker", "start", container_id])
-        if result['success']:
-            self.refresh_containers()
+        result = self.backend.start_container(container_id)
+        if result['success'] and refresh:
+            self.inventory.refresh_one(container_id)
         return result
-    def stop_container(self, container_id):
+    def stop_container(self, container_id, refresh=True):
         if not validate_input(container_id, VALID_CONTAINER_NAME, 64):
             return {'success': False, 'error': 'Invalid container ID'}
-        result = self.run_command(["docker", "stop", container_id])
-        if result['success']:
-            self.refresh_containers()
+        result = self.backend.stop_container(container_id)
+        if result['success'] and refresh:
+            self.inventory.refresh_one(container_id)
         return result
-    def restart_container(self, container_id):
+    def restart_container(self, container_id, refresh=True):
         if not validate_input(container_id, VALID_CONTAINER_NAME, 64):
             return {'success': False, 'error': 'Invalid container ID'}
-        result = self.run_command(["docker", "restart", container_id])
-        if result['success']:
-            self.refresh_containers()
+        result = self.backend.restart_container(container_id)
+        if result['success'] and refresh:
+            self.inventory.refresh_one(container_id)
         return result
-    def remove_container(self, container_id, force=False, remove_volumes=False):
-        container = self.get_container_by_id(container_id)
+    def remove_container(self, container_id, force=False, remove_volumes=False, refresh=True):
+        try:
+            container = self.get_container_by_id(container_id)
+        except AmbiguousReference as e:
+            return {'success': False, 'error': str(e)}
         if not container:
             return {'success': False, 'error': 'Container not found'}
+        container_id = container['id']
         if container['status'] == 'running':
-            stop_result = self.stop_container(container_id)
+            stop_result = self.stop_container(container_id, refresh=False)
             if not stop_result['success'] and not force:
                 return {'success': False, 'error': f'Failed to stop container: {stop_result["stderr"]}'}
-        cmd = ["docker", "rm"]
-        if force:
-            cmd.append("-f")
-        cmd.append(container_id)
-        result = self.run_command(cmd)
+        result = self.backend.remove_container(container_id, force=force)
         if result['success'] and remove_volumes:
             container_name = container['name']
             config_dir = f'./nginx-configs/{container_name}'
@@ -544,16 +1215,266 @@ class DockerManager:
             except Exception as e:
                 result['warning'] = f'Container removed but failed to clean up directories: {str(e)}'
         
+        if result['success'] and refresh:
+            self.inventory.remove(container['id'])
+        return result
+    def bulk_action(self, action, container_ids, force=False, remove_volumes=False):
+        handlers = {
+            'start': self.start_container,
+            'stop': self.stop_container,
+            'restart': self.restart_container,
+            'remove': lambda cid, refresh: self.remove_container(cid, force=force, remove_volumes=remove_volumes, refresh=refresh)
+        }
+        handler = handlers[action]
+        started = time.time()
+        # The shared executor caps concurrent daemon calls across all bulk requests
+        futures = [(cid, self._bulk_executor.submit(handler, cid, refresh=False)) for cid in container_ids]
+        results = []
+        for container_id, future in futures:
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"Bulk {action} failed for {container_id}: {e}")
+                result = {'success': False, 'error': str(e)}
+            item = {'id': container_id, 'success': result['success']}
+            if not result['success']:
+                item['error'] = result.get('error') or result.get('stderr', '')
+            results.append(item)
+        self.refresh_containers()
+        succeeded = sum(1 for item in results if item['success'])
+        return {
+            'success': succeeded == len(results),
+            'action': action,
+            'total': len(results),
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded,
+            'duration': round(time.time() - started, 3),
+            'results': results
+        }
+    def get_container_logs(self, container_id, lines=100, follow=False, since=None, until=None):
+        if not validate_input(container_id, VALID_CONTAINER_NAME, 64):
+            raise ValueError('Invalid container ID')
+        return self.backend.logs(container_id, follow=follow, tail=lines, since=since, until=until)
+    def pull_image(self, image_name, on_progress=None):
+        if not validate_input(image_name, VALID_IMAGE_NAME, 200):
+            return {'success': False, 'error': 'Invalid image name'}
+        # Concurrent pulls of the same reference share one pull and its progress
+        return self.image_pulls.pull(image_name, on_progress)
+    def _pull_and_index(self, image_name, on_progress=None):
+        result = self.backend.pull_image(image_name, on_progress=on_progress, timeout=JOBS_CONFIG['pull_timeout'])
         if result['success']:
-            self.refresh_containers()
+            self.images.refresh_one(image_name)
         return result
-    def get_container_by_id(self, container_id):
-        for container in self.containers:
-            if container['id'].startswith(container_id) or container['name'] == container_id:
-                return container
+    def ensure_image(self, image_name, pull=True):
+        """Make sure an image is present locally, pulling it if needed; returns an error result or None
+
+        With pull=False a missing image is an error instead, for callers on
+        a request thread that must not wait out a pull.
+        """
+        if not self.images.present(image_name):
+            if not pull:
+                return {'success': False, 'error': f'Image {image_name} is not present locally', 'image_missing': True}
+            result = self.pull_image(image_name)
+            if not result['success']:
+                return {'success': False, 'error': f'Failed to pull image {image_name}: {result.get("error") or result.get("stderr", "")}'}
+        self.images.mark_used(image_name)
         return None
+    def get_container_by_id(self, container_id):
+        return self.inventory.lookup(container_id)
 
 docker_manager = DockerManager()
+job_manager = JobManager(max_workers=JOBS_CONFIG['workers'], persist=persist_job, load=load_job,
+                         load_recent=load_recent_jobs)
+if STATS_CONFIG['source'] == 'daemon':
+    collect_stats = docker_manager.backend.container_stats
+else:
+    collect_stats = CgroupCollector(
+        fallback=docker_manager.backend.container_stats,
+        running_ids=lambda: {c['id'] for c in docker_manager.containers if c['status'] == 'running'}
+    ).collect
+stats_sampler = StatsSampler(collect_stats, interval=STATS_CONFIG['interval'], capacity=STATS_CONFIG['history'])
+host_metrics = HostMetrics(disk_paths=['/', os.getcwd()], docker_info=docker_manager.backend.info)
+terminal_manager = TerminalManager(
+    lambda container: ['docker', 'exec', '-it', sanitize_for_shell(container), sanitize_for_shell(TERMINAL_CONFIG['shell'])],
+    max_per_user=TERMINAL_CONFIG['max_sessions_per_user'], idle_timeout=TERMINAL_CONFIG['idle_timeout']
+)
+content_sync = ContentSync(BlobStore(CONTENT_CONFIG['store_dir']), content_root='./web-content',
+                           session_ttl=CONTENT_CONFIG['session_ttl'], max_files=CONTENT_CONFIG['max_files'])
+
+def containers_by_status():
+    counts = {}
+    for container in docker_manager.inventory.current().containers:
+        counts[(container.status,)] = counts.get((container.status,), 0) + 1
+    return counts
+
+memory_tracer = MemoryTracer()
+memory_tracer.register('active_sessions', lambda: active_sessions)
+memory_tracer.register('failed_login_attempts', lambda: failed_login_attempts)
+memory_tracer.register('container_inventory', lambda: docker_manager.inventory.current())
+memory_tracer.register('image_index', lambda: docker_manager.images.images())
+memory_tracer.register('terminals', lambda: terminal_manager.sessions())
+
+metrics.gauge('nacp_containers', 'Containers in the inventory, by status', containers_by_status, ('status',))
+metrics.gauge('nacp_inventory_revision', 'Revision of the published container inventory', lambda: docker_manager.inventory.revision)
+metrics.gauge('nacp_inventory_live', '1 while the events stream keeps the inventory current', lambda: int(docker_manager.inventory.live))
+metrics.gauge('nacp_images', 'Images in the local image index', lambda: len(docker_manager.images.images()))
+metrics.gauge('nacp_port_reservations', 'Host ports reserved for containers being created',
+              lambda: len(docker_manager.port_allocator.reservations()))
+metrics.gauge('nacp_active_sessions', 'Logged-in sessions', lambda: len(active_sessions))
+metrics.gauge('nacp_terminals', 'Open container terminals', lambda: len(terminal_manager.sessions()))
+metrics.gauge('nacp_log_queue_depth', 'Log records waiting for the log listener', lambda: log_queue_handler.queue.qsize())
+metrics.gauge('nacp_log_records_dropped', 'Log records dropped because the log queue was full, by level',
+              lambda: {(level,): count for level, count in log_queue_handler.dropped.items()}, ('level',))
+def log_database_records():
+    database = log_listener.stats().get('database') if log_listener else None
+    return {('stored',): database['inserted'], ('dropped',): database['dropped']} if database else None
+
+metrics.gauge('nacp_log_database_records', 'Log records stored in system_logs or given up on, by outcome',
+              log_database_records, ('outcome',))
+metrics.gauge('nacp_coalesced_docker_commands', 'Docker reads answered by an identical in-flight command',
+              lambda: docker_manager.flights.stats()['saved'])
+
+def pull_image_job(job):
+    """Job body for an image pull, deriving progress from per-layer status"""
+    layers = {}
+    def on_progress(event):
+        layer = event.get('id')
+        status = event.get('status', '')
+        if not layer or status.startswith('Pulling from'):
+            job.log(status)
+            return
+        if layers.get(layer) != status:
+            layers[layer] = status
+            job.log(f'{layer}: {status}')
+            done = sum(1 for s in layers.values() if s in ('Pull complete', 'Already exists'))
+            job.set_progress(min(99, done * 100 // len(layers)), f'{done}/{len(layers)} layers')
+    return docker_manager.pull_image(job.params['image'], on_progress=on_progress)
+
+def create_container_job(job):
+    """Job body for creating a container"""
+    job.set_progress(10, f"Creating container {job.params['name']}")
+    result = docker_manager.create_container(**job.params)
+    if result.get('stdout'):
+        job.log(result['stdout'])
+    if result.get('stderr'):
+        job.log(result['stderr'])
+    return result
+
+def provision_sites_job(job):
+    """Job body for batch site provisioning"""
+    sites = job.params['sites']
+    job.set_progress(5, f"Provisioning {len(sites)} sites")
+    def on_progress(done, total):
+        job.set_progress(5 + done * 90 // total, f'{done}/{total} containers started')
+    result = docker_manager.provision_sites(sites, on_progress=on_progress)
+    for item in result['results']:
+        job.log(f"{item['name']}: {'created on port ' + str(item['port']) if item['success'] else item['error']}")
+    return result
+
+def check_site_responds(port, timeout=3):
+    """True when something answers HTTP on the site's host port with a non-5xx status"""
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=timeout) as response:
+            return response.status < 500
+    except urllib.error.HTTPError as e:
+        return e.code < 500
+    except (OSError, ValueError):
+        return False
+
+def rollout_nginx_config_job(job):
+    """Job body for a staged nginx site config rollout"""
+    params = job.params
+    content = params['config']
+    containers = {c['name']: c for c in docker_manager.containers if c['name'] in params['targets']}
+    # What each site was running right before it was written, for rollback; None means it had no default.conf.
+    # Taken from disk, not container_configs, which misses edits made outside the panel
+    previous = {}
+
+    def apply(name):
+        if name not in containers:
+            return {'success': False, 'error': 'Container no longer exists'}
+        current = docker_manager.read_site_config(name)
+        if current is None and os.path.exists(docker_manager.site_config_path(name)):
+            return {'success': False, 'error': 'Current config could not be read, so it could not be rolled back'}
+        previous[name] = current
+        docker_manager.write_site_config(name, content)
+        if params['container_test']:
+            test = docker_manager.test_nginx_config(name)
+            if not test['success']:
+                return {'success': False, 'error': f"nginx -t failed: {test['stderr']}"}
+        reload_result = docker_manager.reload_nginx(name)
+        if not reload_result['success']:
+            return {'success': False, 'error': f"reload failed: {reload_result['stderr']}"}
+        ports = containers[name].parsed_ports
+        if params['health_check'] and ports and not check_site_responds(ports[0]['host_port']):
+            return {'success': False, 'error': 'Site did not respond after reload'}
+        job.log(f'{name}: applied')
+        return {'success': True}
+
+    def rollback(name):
+        if name not in previous:
+            # Nothing was written to this site, so there is nothing to restore
+            return {'success': True}
+        # Restores the snapshot exactly: a site that had no default.conf gets it removed again
+        docker_manager.write_site_config(name, previous[name])
+        reload_result = docker_manager.reload_nginx(name)
+        job.log(f"{name}: rolled back{'' if reload_result['success'] else ', reload failed'}")
+        return {'success': reload_result['success'], 'error': reload_result['stderr']}
+
+    def on_progress(done, total, message):
+        job.set_progress(5 + done * 90 // total, message)
+
+    job.set_progress(5, f"Rolling out to {len(params['targets'])} containers")
+    result = Rollout(params['targets'], apply, rollback, canary=params['canary'], wave_size=params['wave_size'],
+                     max_failures=params['max_failures'], on_progress=on_progress).run()
+    applied = {containers[item['target']]['id']: content for item in result['results'] if item['state'] == 'applied'}
+    if applied and not store_site_configs(applied):
+        job.log('Could not record the new config in container_configs')
+    return result
+
+def start_background_services():
+    """Start the background workers that keep server state current"""
+    docker_manager.start_event_watcher()
+    if STATS_CONFIG['enabled'] and not stats_sampler.is_alive():
+        stats_sampler.start()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get('request_started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, request.method, route, str(response.status_code))
+    return response
+
+@app.before_request
+def start_request_profile():
+    if request_profiler.armed:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        g.profile = request_profiler.begin(route)
+
+@app.teardown_request
+def finish_request_profile(exc=None):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        request_profiler.end(profile, route, time.perf_counter() - g.get('request_started', time.perf_counter()))
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus text exposition of request, command, database and inventory metrics"""
+    if not METRICS_CONFIG['enabled']:
+        return jsonify({'success': False, 'error': 'Metrics are disabled'}), 404
+    token = METRICS_CONFIG['token']
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return jsonify({'success': False, 'error': 'Authentication required'}), 401
+    elif request.remote_addr not in ('127.0.0.1', '::1'):
+        return jsonify({'success': False, 'error': 'Metrics are only served to localhost without a token'}), 403
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
 
 @app.route('/')
 def index():
@@ -621,11 +1542,80 @@ def logout():
         session.clear()
     return jsonify({'success': True, 'message': 'Logged out successfully'})
 
+# Inventory revisions restart at 0 with the process. Clients get them tagged
+# with this boot epoch, so an ETag or since= from before a restart never
+# matches the unrelated state that reuses its number.
+INVENTORY_EPOCH = uuid.uuid4().hex[:12]
+
+def revision_token(revision: int) -> str:
+    return f'{INVENTORY_EPOCH}.{revision}'
+
+def parse_revision_token(value: str) -> Optional[int]:
+    """Revision number of a token from this process, or None for another epoch or garbage"""
+    epoch, _, number = value.partition('.')
+    return int(number) if epoch == INVENTORY_EPOCH and number.isdigit() else None
+
+# Serialized container list, reused until the inventory revision changes
+_containers_body_cache = {'revision': -1, 'body': b''}
+_containers_body_lock = threading.Lock()
+
+def containers_body(revision: int, containers: List[ContainerRecord]) -> bytes:
+    """Return the JSON body for a full container listing at the given revision"""
+    with _containers_body_lock:
+        if _containers_body_cache['revision'] != revision:
+            # Each record keeps its own encoding, so only changed containers
+            # are serialized again
+            _containers_body_cache['body'] = (
+                b'{"success": true, "full": true, "revision": "%s", "containers": ' % revision_token(revision).encode()
+                + encode_records(containers) + b'}'
+            )
+            _containers_body_cache['revision'] = revision
+        return _containers_body_cache['body']
+
+def container_changes_body(changes: Dict[str, Any]) -> bytes:
+    """Return the JSON body for a delta listing from changes_since()"""
+    return (
+        b'{"success": true, "full": false, "revision": "%s", "added": ' % revision_token(changes['revision']).encode()
+        + encode_records(changes['added']) + b', "changed": ' + encode_records(changes['changed'])
+        + b', "removed": ' + json.dumps(changes['removed']).encode() + b'}'
+    )
+
 @app.route('/api/containers')
 @require_auth
 def get_containers():
-    docker_manager.refresh_containers()
-    return jsonify({'success': True, 'containers': docker_manager.containers})
+    revision, containers = docker_manager.inventory.snapshot()
+    etag = f'containers-{revision_token(revision)}'
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    # A since from another epoch (before a restart) gets the full list
+    since = parse_revision_token(request.args.get('since', ''))
+    if since is not None:
+        changes = docker_manager.inventory.changes_since(since)
+        if changes is not None:
+            response = Response(container_changes_body(changes), mimetype='application/json')
+            response.set_etag(etag)
+            return response
+    # No since, or too old to diff: send the full list
+    response = Response(containers_body(revision, containers), mimetype='application/json')
+    response.set_etag(etag)
+    return response
+
+def missing_image_response(images):
+    """409 for a synchronous create whose images are not local yet
+
+    Pulls can take up to pull_timeout, far longer than a request should
+    wait, so they are started as jobs and the client retries once they are
+    done (or sends the request with "async": true).
+    """
+    jobs = [job_manager.submit('pull_image', pull_image_job, {'image': image}) for image in images]
+    return jsonify({
+        'success': False,
+        'error': f"Image not present locally, pulling: {', '.join(images)}; retry when the pull finishes",
+        'pulls': [{'image': image, 'job_id': job.id, 'status_url': f'/api/jobs/{job.id}'}
+                  for image, job in zip(images, jobs)]
+    }), 409
 
 @app.route('/api/containers', methods=['POST'])
 @require_auth
@@ -645,12 +1635,127 @@ def create_container():
                 return jsonify({'success': False, 'error': 'Port must be between 1 and 65535'}), 400
         except ValueError:
             return jsonify({'success': False, 'error': 'Port must be a valid number'}), 400
-    result = docker_manager.create_container(name=name, image=image, port=port, volumes=volumes, environment=environment)
+    if data.get('async'):
+        job = job_manager.submit('create_container', create_container_job, {
+            'name': name, 'image': image, 'port': port, 'volumes': volumes, 'environment': environment
+        })
+        return jsonify({'success': True, 'job_id': job.id, 'status_url': f'/api/jobs/{job.id}'}), 202
+    if validate_input(image, VALID_IMAGE_NAME, 200) and not docker_manager.images.present(image):
+        return missing_image_response([image])
+    result = docker_manager.create_container(name=name, image=image, port=port, volumes=volumes, environment=environment,
+                                             pull=False)
+    if result.get('image_missing'):
+        return missing_image_response([image])
     if result['success']:
         return jsonify({'success': True, 'message': f'Container "{name}" created successfully', 'container_id': result['stdout'][:12] if result['stdout'] else None})
     else:
         return jsonify(result), 400
 
+MAX_BATCH_SITES = 500
+
+def parse_site_specs(data):
+    """Expand a batch provisioning request into site specs; returns (sites, error)"""
+    image = data.get('image') or 'nginx:alpine'
+    if not isinstance(image, str):
+        return None, 'image must be a string'
+    image = image.strip()
+    if 'sites' in data:
+        raw_sites = data['sites']
+        if not isinstance(raw_sites, list) or not all(isinstance(site, dict) for site in raw_sites):
+            return None, 'sites must be a list of objects'
+    else:
+        template = data.get('template', '')
+        count = data.get('count')
+        first = data.get('start', 1)
+        if not isinstance(template, str) or '{n}' not in template:
+            return None, 'template must contain {n}, e.g. "site-{n}"'
+        if not isinstance(count, int) or not isinstance(first, int) or count < 1:
+            return None, 'count must be a positive integer'
+        # Plain substitution: str.format on user input would allow {n.__class__...} traversal
+        raw_sites = [{'name': template.replace('{n}', str(n))}
+                     for n in range(first, first + min(count, MAX_BATCH_SITES + 1))]
+    if not raw_sites:
+        return None, 'No sites given'
+    if len(raw_sites) > MAX_BATCH_SITES:
+        return None, f'At most {MAX_BATCH_SITES} sites per batch'
+    sites = []
+    for raw in raw_sites:
+        name = str(raw.get('name', '')).strip()
+        site_image = raw.get('image') or image
+        port = raw.get('port')
+        if not isinstance(site_image, str):
+            return None, f'image for {name} must be a string'
+        site_image = site_image.strip()
+        if not validate_input(site_image, VALID_IMAGE_NAME, 200):
+            return None, f'Invalid image name for {name}'
+        if port is not None and (not isinstance(port, int) or not 1 <= port <= 65535):
+            return None, f'Port for {name} must be between 1 and 65535'
+        volumes = raw.get('volumes') or []
+        environment = raw.get('environment') or data.get('environment') or []
+        if not all(isinstance(v, str) for v in volumes) or not all(isinstance(e, str) for e in environment):
+            return None, f'volumes and environment for {name} must be lists of strings'
+        sites.append({'name': name, 'image': site_image, 'port': port, 'volumes': volumes, 'environment': environment})
+    return sites, None
+
+@app.route('/api/containers/batch', methods=['POST'])
+@require_auth
+def provision_sites():
+    """Create many nginx sites in one operation, from a name template or a list of specs"""
+    data = request.get_json() or {}
+    sites, error = parse_site_specs(data)
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    if data.get('async'):
+        job = job_manager.submit('provision_sites', provision_sites_job, {'sites': sites})
+        return jsonify({'success': True, 'job_id': job.id, 'status_url': f'/api/jobs/{job.id}'}), 202
+    missing = sorted({site['image'] for site in sites if not docker_manager.images.present(site['image'])})
+    if missing:
+        return missing_image_response(missing)
+    result = docker_manager.provision_sites(sites, pull=False)
+    logger.info(f"Provisioned {result['succeeded']}/{result['total']} sites in {result['duration']}s")
+    return jsonify(result)
+
+@app.route('/api/containers/bulk', methods=['POST'])
+@require_auth
+def bulk_container_action():
+    data = request.get_json() or {}
+    action = data.get('action', '')
+    ids = data.get('ids') or []
+    pattern = data.get('pattern') or ''
+    if action not in ('start', 'stop', 'restart', 'remove'):
+        return jsonify({'success': False, 'error': 'Action must be one of start, stop, restart, remove'}), 400
+    if not isinstance(ids, list) or not all(isinstance(cid, str) for cid in ids):
+        return jsonify({'success': False, 'error': 'ids must be a list of container IDs or names'}), 400
+    if not isinstance(pattern, str):
+        return jsonify({'success': False, 'error': 'pattern must be a string'}), 400
+    pattern = pattern.strip()
+    if not ids and not pattern:
+        return jsonify({'success': False, 'error': 'Either ids or pattern is required'}), 400
+    # Keyed by container ID, so a container named in ids and matched by the pattern is acted on once
+    targets = {}
+    for reference in (cid.strip() for cid in ids):
+        if not reference:
+            continue
+        try:
+            container = docker_manager.get_container_by_id(reference)
+        except AmbiguousReference as e:
+            return jsonify({'success': False, 'error': str(e), 'matches': e.matches}), 409
+        # Unknown references are passed on, so the result reports them as failed
+        targets.setdefault(container['id'] if container else reference, None)
+    if pattern:
+        for container in docker_manager.containers:
+            if fnmatch.fnmatchcase(container['name'], pattern):
+                targets.setdefault(container['id'], None)
+    if not targets:
+        return jsonify({'success': False, 'error': 'No containers matched'}), 404
+    result = docker_manager.bulk_action(
+        action, list(targets),
+        force=bool(data.get('force', False)),
+        remove_volumes=bool(data.get('remove_volumes', False))
+    )
+    logger.info(f"Bulk {action} on {result['total']} containers: {result['succeeded']} succeeded in {result['duration']}s")
+    return jsonify(result)
+
 @app.route('/api/containers/<container_id>/start', methods=['POST'])
 @require_auth
 def start_container(container_id):
@@ -692,6 +1797,629 @@ def remove_container(container_id):
     else:
         return jsonify(result), 400
 
+MAX_LOG_LINES = 10000
+
+def log_request_args():
+    """Parse the tail/since/until query arguments shared by the log endpoints"""
+    lines = request.args.get('lines', type=int)
+    if lines is None:
+        lines = request.args.get('tail', 100, type=int)
+    since = request.args.get('since')
+    until = request.args.get('until')
+    return (
+        max(0, min(lines, MAX_LOG_LINES)),
+        parse_log_time(since) if since else None,
+        parse_log_time(until) if until else None
+    )
+
+@app.route('/api/containers/<container_id>/logs')
+@require_auth
+def get_container_logs(container_id):
+    timestamps = request.args.get('timestamps', 'false').lower() == 'true'
+    try:
+        lines, since, until = log_request_args()
+        stream = docker_manager.get_container_logs(container_id, lines=lines, since=since, until=until)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except DockerAPIError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status
+
+    def generate():
+        # Written out as the lines arrive so a large tail is never held in
+        # memory; the shape matches the jsonify response this used to be
+        yield '{"success": true, "stdout": "'
+        try:
+            first = True
+            for line in stream:
+                text = json.dumps(line if timestamps else line.partition(' ')[2])[1:-1]
+                yield text if first else '\\n' + text
+                first = False
+        finally:
+            stream.close()
+        yield '", "stderr": "", "returncode": 0}'
+    return Response(generate(), mimetype='application/json')
+
+@app.route('/api/containers/<container_id>/logs/stream')
+@require_auth
+def stream_container_logs(container_id):
+    """Stream container logs as Server-Sent Events, following new lines by default"""
+    follow = request.args.get('follow', 'true').lower() == 'true'
+    timestamps = request.args.get('timestamps', 'false').lower() == 'true'
+    grep = request.args.get('grep', '')
+    # EventSource reconnects send the id of the last line received, resume right after it
+    last_event_id = request.headers.get('Last-Event-ID', '').strip()
+    try:
+        lines, since, until = log_request_args()
+        if last_event_id:
+            since = parse_log_time(last_event_id)
+            lines = None
+        stream = docker_manager.get_container_logs(container_id, lines=lines, follow=follow,
+                                                   since=since, until=until)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except DockerAPIError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status
+    resume_after = log_timestamp_key(last_event_id) if last_event_id else None
+
+    def generate():
+        yield 'retry: 3000\n\n'
+        for line in pump(stream, keepalive=15):
+            if line is None:
+                yield ': keepalive\n\n'
+                continue
+            stamp, _, message = line.partition(' ')
+            if resume_after and log_timestamp_key(stamp) <= resume_after:
+                continue
+            if grep and grep not in message:
+                continue
+            yield sse_event(line if timestamps else message, event_id=stamp)
+        yield sse_event('', event='end')
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/stats')
+@require_auth
+def get_stats():
+    """Latest sampled resource usage for every running container"""
+    return jsonify({
+        'success': True,
+        'stats': stats_sampler.current(),
+        'sampler': {
+            'enabled': STATS_CONFIG['enabled'],
+            'interval': stats_sampler.interval,
+            'last_run': stats_sampler.last_run,
+            'last_duration': round(stats_sampler.last_duration, 3)
+        }
+    })
+
+def websocket_origin_allowed() -> bool:
+    """Whether a WebSocket handshake comes from the panel itself or a configured CORS origin
+
+    CORS does not cover WebSockets and the session cookie rides along with
+    any cross-site handshake, so without this any page a logged-in admin
+    visits could open a shell. Browsers always send Origin on handshakes.
+    """
+    origin = request.headers.get('Origin')
+    if not origin:
+        return False
+    return origin in CORS_ORIGINS or origin in (f'http://{request.host}', f'https://{request.host}')
+
+def websocket_user():
+    """Username of the logged-in user of a WebSocket handshake, with the same checks as require_auth"""
+    if not websocket_origin_allowed():
+        logger.warning(f"Rejected WebSocket handshake from origin {request.headers.get('Origin')!r}")
+        return None
+    user_id = session.get('user_id')
+    user = active_sessions.get(user_id)
+    if not user or datetime.now() - user['last_activity'] > SESSION_TIMEOUT:
+        return None
+    user['last_activity'] = datetime.now()
+    return user['username']
+
+def run_terminal(ws, container_id):
+    """Bridge a WebSocket and a container terminal until either side closes
+
+    Binary frames are typed input; text frames are JSON control messages:
+    {"type": "input", "data": "..."} or {"type": "resize", "cols": 120, "rows": 40}.
+    Output is sent as text frames.
+    """
+    username = websocket_user()
+    if not username:
+        ws.close(reason=1008, message='Authentication required')
+        return
+    try:
+        container = docker_manager.get_container_by_id(container_id)
+    except AmbiguousReference as e:
+        ws.close(reason=1008, message=str(e)[:120])
+        return
+    if not container or container['status'] != 'running':
+        ws.close(reason=1008, message='Container not found or not running')
+        return
+    try:
+        terminal = terminal_manager.open(username, container['name'], cols=request.args.get('cols', 80, type=int),
+                                         rows=request.args.get('rows', 24, type=int))
+    except TerminalLimitError as e:
+        ws.close(reason=1008, message=str(e))
+        return
+
+    def send_output():
+        decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        try:
+            while True:
+                data = terminal.read()
+                if data is None:
+                    break
+                if data:
+                    ws.send(decoder.decode(data))
+        except ConnectionClosed:
+            pass
+        finally:
+            # The exec ended or the terminal was closed for being idle
+            ws.close(message='Terminal closed')
+
+    output = threading.Thread(target=send_output, name=f'terminal-{terminal.id[:8]}', daemon=True)
+    output.start()
+    try:
+        while output.is_alive():
+            message = ws.receive(timeout=1)
+            if message is None:
+                continue
+            if isinstance(message, bytes):
+                terminal.write(message)
+                continue
+            try:
+                control = json.loads(message)
+                if control.get('type') == 'input':
+                    terminal.write(str(control.get('data', '')).encode())
+                elif control.get('type') == 'resize':
+                    terminal.resize(control.get('cols', 80), control.get('rows', 24))
+            except (ValueError, TypeError, AttributeError):
+                continue
+    except ConnectionClosed:
+        pass
+    finally:
+        terminal_manager.close(terminal)
+        output.join(timeout=2)
+        logger.info(f"Terminal {terminal.id} on {terminal.container} closed")
+
+if sock:
+    @sock.route('/api/containers/<container_id>/terminal')
+    def container_terminal(ws, container_id):
+        run_terminal(ws, container_id)
+else:
+    @app.route('/api/containers/<container_id>/terminal')
+    @require_auth
+    def container_terminal(container_id):
+        return jsonify({'success': False, 'error': 'Terminals need the flask-sock package'}), 501
+
+@app.route('/api/terminals')
+@require_auth
+def list_terminals():
+    """Open terminals of the current user"""
+    terminals = terminal_manager.sessions(active_sessions[session['user_id']]['username'])
+    return jsonify({
+        'success': True,
+        'available': sock is not None,
+        'limit': terminal_manager.max_per_user,
+        'terminals': [t.to_dict() for t in terminals]
+    })
+
+@app.route('/api/system/info')
+@require_auth
+def get_system_info():
+    """Host memory, load, CPU, uptime and disk usage read from /proc and statvfs"""
+    snapshot = host_metrics.snapshot(max_age=1.0)
+    containers = docker_manager.containers
+    return jsonify({
+        'success': True,
+        'system_info': snapshot,
+        'containers': {
+            'total': len(containers),
+            'running': sum(1 for c in containers if c['status'] == 'running')
+        }
+    })
+
+@app.route('/api/admin/profile', methods=['POST'])
+@require_auth
+def start_profiling():
+    """Profile the next N requests with cProfile, or sample every thread's stack for a while"""
+    data = request.get_json() or {}
+    mode = data.get('mode', 'cprofile')
+    seconds = data.get('seconds')
+    if seconds is not None and (not isinstance(seconds, (int, float)) or not 0 < seconds <= MAX_PROFILE_SECONDS):
+        return jsonify({'success': False, 'error': f'seconds must be between 0 and {MAX_PROFILE_SECONDS}'}), 400
+    if mode == 'cprofile':
+        requests_to_profile = data.get('requests')
+        if requests_to_profile is None and seconds is None:
+            requests_to_profile = 10
+        if requests_to_profile is not None and (not isinstance(requests_to_profile, int)
+                                                or not 0 < requests_to_profile <= MAX_PROFILED_REQUESTS):
+            return jsonify({'success': False, 'error': f'requests must be between 1 and {MAX_PROFILED_REQUESTS}'}), 400
+        request_profiler.arm(requests=requests_to_profile, seconds=seconds, route=data.get('route') or None)
+        logger.info(f"Request profiling armed: {requests_to_profile} requests, {seconds} seconds")
+        return jsonify({'success': True, 'mode': mode, 'status': request_profiler.status()})
+    if mode == 'sampler':
+        interval_ms = data.get('interval_ms', 10)
+        if not isinstance(interval_ms, (int, float)) or not 1 <= interval_ms <= 1000:
+            return jsonify({'success': False, 'error': 'interval_ms must be between 1 and 1000'}), 400
+        try:
+            stack_sampler.start(seconds or 30, interval=interval_ms / 1000, include_idle=bool(data.get('include_idle')))
+        except RuntimeError as e:
+            return jsonify({'success': False, 'error': str(e)}), 409
+        logger.info(f"Stack sampler started for {seconds or 30} seconds")
+        return jsonify({'success': True, 'mode': mode, 'status': stack_sampler.status()})
+    return jsonify({'success': False, 'error': 'mode must be cprofile or sampler'}), 400
+
+@app.route('/api/admin/profile')
+@require_auth
+def get_profile():
+    """Profiling results: top functions, or collapsed stacks for flamegraphs with ?format=collapsed"""
+    limit = max(1, min(request.args.get('limit', 30, type=int), 500))
+    if request.args.get('format') == 'collapsed':
+        return Response(stack_sampler.collapsed(), mimetype='text/plain')
+    return jsonify({
+        'success': True,
+        'cprofile': {
+            **request_profiler.status(),
+            'top': request_profiler.top(limit, sort=request.args.get('sort', 'cumulative'))
+        },
+        'sampler': {
+            **stack_sampler.status(),
+            'top': stack_sampler.top(limit, sort=request.args.get('sort', 'total'))
+        }
+    })
+
+@app.route('/api/admin/profile', methods=['DELETE'])
+@require_auth
+def stop_profiling():
+    """Stop request profiling and the stack sampler; results stay available"""
+    request_profiler.disarm()
+    stack_sampler.stop()
+    return jsonify({'success': True})
+
+@app.route('/api/admin/logging')
+@require_auth
+def get_logging_status():
+    """Log queue depth, records dropped by level and system_logs sink counters"""
+    if not log_listener:
+        return jsonify({'success': False, 'error': 'Logging pipeline not started'}), 503
+    return jsonify({'success': True, **log_listener.stats()})
+
+@app.route('/api/admin/memory')
+@require_auth
+def get_memory_summary():
+    """RSS, tracemalloc totals, snapshots and sizes of the long-lived in-memory structures"""
+    return jsonify({'success': True, **memory_tracer.summary(deep=request.args.get('deep', 'true') != 'false')})
+
+@app.route('/api/admin/memory/tracing', methods=['POST'])
+@require_auth
+def start_memory_tracing():
+    """Start tracemalloc, keeping `frames` frames of traceback per allocation"""
+    data = request.get_json(silent=True) or {}
+    frames = data.get('frames', 1)
+    if not isinstance(frames, int) or not 1 <= frames <= 50:
+        return jsonify({'success': False, 'error': 'frames must be between 1 and 50'}), 400
+    memory_tracer.start(frames)
+    return jsonify({'success': True, 'tracing': memory_tracer.tracing})
+
+@app.route('/api/admin/memory/tracing', methods=['DELETE'])
+@require_auth
+def stop_memory_tracing():
+    memory_tracer.stop()
+    return jsonify({'success': True, 'tracing': memory_tracer.tracing})
+
+@app.route('/api/admin/memory/snapshots', methods=['POST'])
+@require_auth
+def take_memory_snapshot():
+    """Take a named tracemalloc snapshot (the oldest is dropped beyond ten)"""
+    data = request.get_json(silent=True) or {}
+    name = str(data.get('name') or datetime.now().strftime('%Y%m%d-%H%M%S'))[:64]
+    try:
+        snapshot = memory_tracer.take(name)
+    except RuntimeError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    return jsonify({'success': True, 'snapshot': snapshot})
+
+@app.route('/api/admin/memory/diff')
+@require_auth
+def diff_memory_snapshots():
+    """Top allocation changes between two snapshots (?from=a&to=b), or from one snapshot to now"""
+    older = request.args.get('from', '')
+    group = request.args.get('group', 'lineno')
+    if group not in ('lineno', 'filename'):
+        return jsonify({'success': False, 'error': 'group must be lineno or filename'}), 400
+    limit = max(1, min(request.args.get('limit', 25, type=int), 500))
+    try:
+        diff = memory_tracer.diff(older, request.args.get('to') or None, group=group, limit=limit)
+    except KeyError as e:
+        return jsonify({'success': False, 'error': f'Unknown snapshot: {e.args[0]}'}), 404
+    except RuntimeError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    return jsonify({'success': True, 'from': older, 'to': request.args.get('to') or 'now', 'group': group, 'diff': diff})
+
+@app.route('/api/docker/status')
+@require_auth
+def get_docker_status():
+    """Backend, inventory freshness and how many daemon calls coalescing saved"""
+    inventory = docker_manager.inventory
+    watcher = docker_manager.event_watcher
+    return jsonify({
+        'success': True,
+        'backend': docker_manager.backend.name,
+        'inventory': {
+            'revision': inventory.revision,
+            'containers': len(inventory.containers()),
+            'live': inventory.live,
+            'last_sync': inventory.last_sync,
+            'resyncs': inventory.resyncs
+        },
+        'events': {
+            'reconnects': watcher.reconnects,
+            'gaps': watcher.gaps
+        } if watcher else None,
+        'coalescing': {
+            'refreshes': inventory.resync_stats(),
+            'commands': docker_manager.flights.stats()
+        }
+    })
+
+@app.route('/api/containers/<container_id>/stats')
+@require_auth
+def get_container_stats(container_id):
+    """Sampled resource usage history for one container"""
+    window = request.args.get('window', type=float)
+    try:
+        container = docker_manager.get_container_by_id(container_id)
+    except AmbiguousReference as e:
+        return jsonify({'success': False, 'error': str(e), 'matches': e.matches}), 409
+    history = stats_sampler.history(container['id'] if container else container_id, window)
+    if history is None:
+        return jsonify({'success': False, 'error': 'No stats for this container'}), 404
+    return jsonify({'success': True, 'interval': stats_sampler.interval, 'history': history})
+
+@app.route('/api/containers/<container_id>/nginx/config')
+@require_auth
+def get_nginx_config(container_id):
+    """Site config of one container, read from its mounted config directory"""
+    try:
+        container = docker_manager.get_container_by_id(container_id)
+    except AmbiguousReference as e:
+        return jsonify({'success': False, 'error': str(e), 'matches': e.matches}), 409
+    if not container:
+        return jsonify({'success': False, 'error': 'Container not found'}), 404
+    content = docker_manager.read_site_config(container['name'])
+    if content is None:
+        return jsonify({'success': False, 'error': 'No site config for this container'}), 404
+    return jsonify({'success': True, 'container': container['name'], 'config': content})
+
+@app.route('/api/containers/<container_id>/nginx/config', methods=['POST'])
+@require_auth
+def set_nginx_config(container_id):
+    """Validate, save and reload one container's site config, restoring the old one if the reload fails"""
+    data = request.get_json() or {}
+    content = data.get('config', '')
+    if not isinstance(content, str) or not content.strip():
+        return jsonify({'success': False, 'error': 'No configuration content provided'}), 400
+    if len(content) > MAX_SITE_CONFIG_SIZE:
+        return jsonify({'success': False, 'error': f'Configuration larger than {MAX_SITE_CONFIG_SIZE} bytes'}), 400
+    try:
+        container = docker_manager.get_container_by_id(container_id)
+    except AmbiguousReference as e:
+        return jsonify({'success': False, 'error': str(e), 'matches': e.matches}), 409
+    if not container:
+        return jsonify({'success': False, 'error': 'Container not found'}), 404
+    verdict = docker_manager.validate_site_config(content)
+    container_test = docker_manager.needs_container_test(verdict)
+    if verdict and not verdict['valid'] and not container_test:
+        return jsonify({'success': False, 'error': 'Configuration test failed', 'validation': verdict}), 422
+    name = container['name']
+    previous = docker_manager.read_site_config(name)
+    docker_manager.write_site_config(name, content)
+    if container_test:
+        test = docker_manager.test_nginx_config(name)
+        if not test['success']:
+            docker_manager.write_site_config(name, previous)
+            return jsonify({'success': False, 'error': f"nginx -t failed: {test['stderr']}"}), 422
+    reloaded = True
+    if container['status'] == 'running':
+        reload_result = docker_manager.reload_nginx(name)
+        if not reload_result['success']:
+            docker_manager.write_site_config(name, previous)
+            docker_manager.reload_nginx(name)
+            return jsonify({'success': False, 'error': f"Reload failed: {reload_result['stderr']}"}), 500
+    else:
+        reloaded = False
+    store_site_configs({container['id']: content})
+    logger.info(f"Site config of {name} updated by {active_sessions.get(session.get('user_id'), {}).get('username')}")
+    return jsonify({'success': True, 'container': name, 'reloaded': reloaded, 'validation': verdict})
+
+@app.route('/api/containers/<container_id>/content/sync', methods=['POST'])
+@require_auth
+def begin_content_sync(container_id):
+    """Start a content sync from a manifest; answers with the blobs that still need uploading"""
+    data = request.get_json() or {}
+    try:
+        container = docker_manager.get_container_by_id(container_id)
+    except AmbiguousReference as e:
+        return jsonify({'success': False, 'error': str(e), 'matches': e.matches}), 409
+    if not container:
+        return jsonify({'success': False, 'error': 'Container not found'}), 404
+    if not os.path.isdir(content_sync.site_dir(container['name'])):
+        return jsonify({'success': False, 'error': 'Container has no managed web content directory'}), 400
+    try:
+        result = content_sync.begin(container['name'], data.get('manifest'))
+    except SyncError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({'success': True, **result,
+                    'upload_url': f"/api/content/sync/{result['session_id']}/blobs/{{sha256}}",
+                    'commit_url': f"/api/content/sync/{result['session_id']}/commit"})
+
+@app.route('/api/containers/<container_id>/content/manifest')
+@require_auth
+def get_content_manifest(container_id):
+    """Manifest of the last content sync of a container"""
+    try:
+        container = docker_manager.get_container_by_id(container_id)
+    except AmbiguousReference as e:
+        return jsonify({'success': False, 'error': str(e), 'matches': e.matches}), 409
+    if not container:
+        return jsonify({'success': False, 'error': 'Container not found'}), 404
+    return jsonify({'success': True, 'container': container['name'], 'manifest': content_sync.manifest(container['name'])})
+
+@app.route('/api/content/sync/<session_id>/blobs/<digest>', methods=['PUT'])
+@require_auth
+def upload_content_blob(session_id, digest):
+    """Append one chunk (raw request body) of a blob at ?offset=N"""
+    if (request.content_length or 0) > CONTENT_CONFIG['max_chunk_size']:
+        return jsonify({'success': False, 'error': f"Chunks are limited to {CONTENT_CONFIG['max_chunk_size']} bytes"}), 413
+    try:
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'offset must be an integer'}), 400
+    try:
+        result = content_sync.upload(session_id, digest.lower(), offset, request.get_data(cache=False))
+    except SyncError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    except LookupError as e:
+        return jsonify({'success': False, 'error': str(e)}), 404
+    return jsonify({'success': True, **result})
+
+@app.route('/api/content/sync/<session_id>/commit', methods=['POST'])
+@require_auth
+def commit_content_sync(session_id):
+    """Switch the site's files to the synced manifest"""
+    try:
+        result = content_sync.commit(session_id)
+    except SyncError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    except LookupError as e:
+        return jsonify({'success': False, 'error': str(e)}), 404
+    except OSError as e:
+        logger.error(f"Content sync commit failed: {e}")
+        return jsonify({'success': False, 'error': 'Could not update the site files'}), 500
+    logger.info(f"Synced web content of {result['site']}: {result['updated']} updated, {result['removed']} removed")
+    return jsonify({'success': True, **result})
+
+@app.route('/api/nginx/validate', methods=['POST'])
+@require_auth
+def validate_nginx_config():
+    """Check a site config with the central validator; identical configs are answered from cache"""
+    data = request.get_json() or {}
+    content = data.get('config', '')
+    if not isinstance(content, str) or not content.strip():
+        return jsonify({'success': False, 'error': 'No configuration content provided'}), 400
+    if len(content) > MAX_SITE_CONFIG_SIZE:
+        return jsonify({'success': False, 'error': f'Configuration larger than {MAX_SITE_CONFIG_SIZE} bytes'}), 400
+    verdict = docker_manager.validate_site_config(content)
+    if verdict is None:
+        return jsonify({'success': False, 'error': 'Central validation is disabled (validator = container)'}), 501
+    return jsonify({'success': True, 'validation': verdict, 'validator': docker_manager.nginx_validator.stats()})
+
+@app.route('/api/nginx/rollout', methods=['POST'])
+@require_auth
+def rollout_nginx_config():
+    """Push a site config to many containers in waves, canary first, with automatic rollback"""
+    data = request.get_json() or {}
+    content = data.get('config', '')
+    ids = data.get('ids') or []
+    pattern = data.get('pattern', '')
+    if not isinstance(content, str) or not content.strip():
+        return jsonify({'success': False, 'error': 'No configuration content provided'}), 400
+    if not isinstance(pattern, str):
+        return jsonify({'success': False, 'error': 'pattern must be a string'}), 400
+    pattern = pattern.strip()
+    if len(content) > MAX_SITE_CONFIG_SIZE:
+        return jsonify({'success': False, 'error': f'Configuration larger than {MAX_SITE_CONFIG_SIZE} bytes'}), 400
+    if not isinstance(ids, list) or not all(isinstance(cid, str) for cid in ids):
+        return jsonify({'success': False, 'error': 'ids must be a list of container IDs or names'}), 400
+    targets = []
+    try:
+        for cid in ids:
+            container = docker_manager.get_container_by_id(cid.strip())
+            if not container:
+                return jsonify({'success': False, 'error': f'Container not found: {cid}'}), 404
+            targets.append(container)
+    except AmbiguousReference as e:
+        return jsonify({'success': False, 'error': str(e), 'matches': e.matches}), 409
+    if pattern:
+        targets.extend(c for c in docker_manager.containers if fnmatch.fnmatchcase(c['name'], pattern))
+    names = list(dict.fromkeys(c['name'] for c in targets if c['status'] == 'running'))
+    if not names:
+        return jsonify({'success': False, 'error': 'No running containers matched'}), 404
+    options = {}
+    for key, config_key in (('canary', 'rollout_canary'), ('wave_size', 'rollout_wave_size'), ('max_failures', 'rollout_max_failures')):
+        value = data.get(key, NGINX_CONFIG[config_key])
+        if not isinstance(value, int) or value < 0:
+            return jsonify({'success': False, 'error': f'{key} must be a non-negative integer'}), 400
+        options[key] = value
+    # One central check up front instead of nginx -t in every target
+    verdict = docker_manager.validate_site_config(content)
+    container_test = docker_manager.needs_container_test(verdict)
+    if verdict and not verdict['valid'] and not container_test:
+        return jsonify({'success': False, 'error': 'Configuration test failed', 'validation': verdict}), 422
+    job = job_manager.submit('nginx_rollout', rollout_nginx_config_job, {
+        'config': content, 'targets': names, 'health_check': bool(data.get('health_check', True)),
+        'container_test': container_test, **options
+    })
+    return jsonify({'success': True, 'job_id': job.id, 'status_url': f'/api/jobs/{job.id}', 'targets': names}), 202
+
+@app.route('/api/images')
+@require_auth
+def get_images():
+    """Local images from the in-memory image index"""
+    index = docker_manager.images
+    images = sorted((record.to_dict() for record in index.images()), key=lambda image: image['tags'] or [image['full_id']])
+    return jsonify({
+        'success': True,
+        'images': images,
+        'live': index.live,
+        'last_sync': index.last_sync,
+        'pulls': docker_manager.image_pulls.stats()
+    })
+
+@app.route('/api/images/pull', methods=['POST'])
+@require_auth
+def pull_image():
+    data = request.get_json() or {}
+    image_name = data.get('image', '').strip()
+    if not image_name:
+        return jsonify({'success': False, 'error': 'Image name is required'}), 400
+    if not validate_input(image_name, VALID_IMAGE_NAME, 200):
+        return jsonify({'success': False, 'error': 'Invalid image name'}), 400
+    job = job_manager.submit('pull_image', pull_image_job, {'image': image_name})
+    return jsonify({'success': True, 'job_id': job.id, 'status_url': f'/api/jobs/{job.id}'}), 202
+
+@app.route('/api/jobs')
+@require_auth
+def list_jobs():
+    limit = max(1, min(request.args.get('limit', 50, type=int), 200))
+    offset = max(0, request.args.get('offset', 0, type=int))
+    return jsonify({'success': True, 'jobs': job_manager.list(limit=limit, offset=offset), 'limit': limit, 'offset': offset})
+
+@app.route('/api/jobs/<job_id>')
+@require_auth
+def get_job(job_id):
+    include_logs = request.args.get('logs', 'false').lower() == 'true'
+    job = job_manager.get_dict(job_id, include_logs=include_logs)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': job})
+
+@app.route('/api/jobs/<job_id>/logs')
+@require_auth
+def get_job_logs(job_id):
+    offset = request.args.get('offset', 0, type=int)
+    job = job_manager.get(job_id)
+    if job:
+        return jsonify({'success': True, 'status': job.status, **job.logs_since(offset)})
+    data = job_manager.get_dict(job_id, include_logs=True)
+    if not data:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    lines = data['logs'][offset:]
+    return jsonify({'success': True, 'status': data['status'], 'offset': offset,
+                    'next_offset': offset + len(lines), 'lines': lines})
+
 @app.route('/api/postgresql/execute', methods=['POST'])
 @require_auth
 def execute_postgresql():
@@ -755,4 +2483,5 @@ if __name__ == '__main__':
         logger.warning("Database initialization failed, some features may not work")
     logger.info("Initializing Docker manager...")
     logger.info(f"Found {len(docker_manager.containers)} existing containers")
+    start_background_services()
     app.run(host='0.0.0.0', port=5000, debug=False)
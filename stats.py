@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Container resource statistics for Not a cPanel
+A single background sampler collects CPU, memory, network and block I/O for
+all containers per pass and keeps a fixed-size history per container
+"""
+
+import re
+import time
+import logging
+import threading
+from array import array
+from typing import Dict, List, Optional, Any, Callable
+
+logger = logging.getLogger(__name__)
+
+# Values kept in each container's history, in storage order
+METRICS = (
+    'cpu_percent', 'memory_usage', 'memory_limit',
+    'net_rx_rate', 'net_tx_rate', 'block_read_rate', 'block_write_rate'
+)
+
+# Cumulative counters reported by collectors, turned into the *_rate metrics
+COUNTERS = ('net_rx', 'net_tx', 'block_read', 'block_write')
+
+SIZE_PATTERN = re.compile(r'^([\d.]+)\s*([a-zA-Z]*)$')
+SIZE_UNITS = {
+    '': 1, 'b': 1,
+    'kb': 1000, 'mb': 1000 ** 2, 'gb': 1000 ** 3, 'tb': 1000 ** 4,
+    'kib': 1024, 'mib': 1024 ** 2, 'gib': 1024 ** 3, 'tib': 1024 ** 4
+}
+
+
+def parse_size(value: str) -> float:
+    """Parse a docker human readable size like '3.5MiB' or '1.2kB' into bytes"""
+    match = SIZE_PATTERN.match(value.strip())
+    if not match:
+        return 0.0
+    return float(match.group(1)) * SIZE_UNITS.get(match.group(2).lower(), 1)
+
+
+def parse_cli_stats(row: Dict[str, Any]) -> Dict[str, float]:
+    """Convert one `docker stats --format json` row into collector values"""
+    def pair(key):
+        left, _, right = row.get(key, '0B / 0B').partition('/')
+        return parse_size(left), parse_size(right or '0B')
+    memory_usage, memory_limit = pair('MemUsage')
+    net_rx, net_tx = pair('NetIO')
+    block_read, block_write = pair('BlockIO')
+    try:
+        cpu = float(row.get('CPUPerc', '0%').rstrip('%') or 0)
+    except ValueError:
+        cpu = 0.0
+    return {
+        'cpu_percent': cpu,
+        'memory_usage': memory_usage,
+        'memory_limit': memory_limit,
+        'net_rx': net_rx,
+        'net_tx': net_tx,
+        'block_read': block_read,
+        'block_write': block_write
+    }
+
+
+def parse_engine_stats(data: Dict[str, Any], previous: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """Convert a one-shot Engine API stats document into collector values
+
+    One-shot stats carry no previous CPU reading, so CPU usage is computed
+    against the raw counters of the previous pass, returned under '_cpu_*'.
+    """
+    cpu_stats = data.get('cpu_stats') or {}
+    cpu_total = float((cpu_stats.get('cpu_usage') or {}).get('total_usage', 0))
+    system_total = float(cpu_stats.get('system_cpu_usage', 0))
+    online_cpus = cpu_stats.get('online_cpus') or len((cpu_stats.get('cpu_usage') or {}).get('percpu_usage') or []) or 1
+    cpu = 0.0
+    if previous:
+        cpu_delta = cpu_total - previous.get('_cpu_total', 0.0)
+        system_delta = system_total - previous.get('_cpu_system', 0.0)
+        if cpu_delta > 0 and system_delta > 0:
+            cpu = cpu_delta / system_delta * online_cpus * 100.0
+
+    memory = data.get('memory_stats') or {}
+    memory_detail = memory.get('stats') or {}
+    # Match `docker stats`: page cache is not counted as usage
+    memory_usage = float(memory.get('usage', 0)) - float(memory_detail.get('inactive_file', memory_detail.get('cache', 0)))
+
+    net_rx = net_tx = 0.0
+    for interface in (data.get('networks') or {}).values():
+        net_rx += interface.get('rx_bytes', 0)
+        net_tx += interface.get('tx_bytes', 0)
+
+    block_read = block_write = 0.0
+    for entry in (data.get('blkio_stats') or {}).get('io_service_bytes_recursive') or []:
+        op = entry.get('op', '').lower()
+        if op == 'read':
+            block_read += entry.get('value', 0)
+        elif op == 'write':
+            block_write += entry.get('value', 0)
+
+    return {
+        'cpu_percent': round(cpu, 2),
+        'memory_usage': max(memory_usage, 0.0),
+        'memory_limit': float(memory.get('limit', 0)),
+        'net_rx': net_rx,
+        'net_tx': net_tx,
+        'block_read': block_read,
+        'block_write': block_write,
+        '_cpu_total': cpu_total,
+        '_cpu_system': system_total
+    }
+
+
+class RingBuffer:
+    """Fixed-size time series backed by one flat array per metric"""
+
+    __slots__ = ('capacity', 'timestamps', 'values', 'head', 'count')
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.timestamps = array('d', bytes(8 * capacity))
+        self.values = {name: array('f', bytes(4 * capacity)) for name in METRICS}
+        self.head = 0  # next slot to write
+        self.count = 0
+
+    def append(self, timestamp: float, sample: Dict[str, float]):
+        slot = self.head
+        self.timestamps[slot] = timestamp
+        for name in METRICS:
+            self.values[name][slot] = sample.get(name, 0.0)
+        self.head = (slot + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def latest(self) -> Optional[Dict[str, float]]:
+        if not self.count:
+            return None
+        slot = (self.head - 1) % self.capacity
+        sample = {name: self.values[name][slot] for name in METRICS}
+        sample['timestamp'] = self.timestamps[slot]
+        return sample
+
+    def window(self, seconds: Optional[float] = None) -> Dict[str, List[float]]:
+        """Samples from the last `seconds` (or all), oldest first, as parallel lists"""
+        start = (self.head - self.count) % self.capacity
+        slots = [(start + i) % self.capacity for i in range(self.count)]
+        if seconds is not None and slots:
+            cutoff = self.timestamps[slots[-1]] - seconds
+            slots = [slot for slot in slots if self.timestamps[slot] >= cutoff]
+        history = {'timestamps': [self.timestamps[slot] for slot in slots]}
+        for name in METRICS:
+            column = self.values[name]
+            history[name] = [round(column[slot], 2) for slot in slots]
+        return history
+
+
+class StatsSampler(threading.Thread):
+    """Background thread that samples every container once per interval"""
+
+    def __init__(self, collect: Callable[[], Optional[Dict[str, Dict[str, float]]]],
+                 interval: float = 5.0, capacity: int = 720):
+        super().__init__(name='stats-sampler', daemon=True)
+        self.collect = collect
+        self.interval = interval
+        self.capacity = capacity
+        self._buffers: Dict[str, RingBuffer] = {}
+        self._counters: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self.last_run = 0.0
+        self.last_duration = 0.0
+        self.passes = 0
+        self.errors = 0
+
+    def stop(self):
+        self._stopped.set()
+
+    def sample_once(self):
+        started = time.time()
+        samples = self.collect()
+        if samples is None:
+            self.errors += 1
+            return
+        with self._lock:
+            for container_id, values in samples.items():
+                previous = self._counters.get(container_id)
+                sample = dict(values)
+                for name in COUNTERS:
+                    rate = 0.0
+                    if previous and name in values:
+                        elapsed = started - previous['timestamp']
+                        delta = values[name] - previous.get(name, 0.0)
+                        # A counter going backwards means the container restarted
+                        if elapsed > 0 and delta >= 0:
+                            rate = delta / elapsed
+                    sample.setdefault(f'{name}_rate', rate)
+                self._counters[container_id] = {name: values.get(name, 0.0) for name in COUNTERS}
+                self._counters[container_id]['timestamp'] = started
+                buffer = self._buffers.get(container_id)
+                if buffer is None:
+                    buffer = self._buffers[container_id] = RingBuffer(self.capacity)
+                buffer.append(started, sample)
+            # Forget containers that are gone
+            for container_id in [cid for cid in self._buffers if cid not in samples]:
+                del self._buffers[container_id]
+                self._counters.pop(container_id, None)
+        self.last_run = started
+        self.last_duration = time.time() - started
+        self.passes += 1
+
+    def run(self):
+        while not self._stopped.is_set():
+            started = time.monotonic()
+            try:
+                self.sample_once()
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Stats sampling failed: {e}")
+            self._stopped.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def current(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {cid: buffer.latest() for cid, buffer in self._buffers.items() if buffer.count}
+
+    def history(self, container_id: str, seconds: Optional[float] = None) -> Optional[Dict[str, List[float]]]:
+        with self._lock:
+            buffer = self._buffers.get(container_id)
+            return buffer.window(seconds) if buffer else None
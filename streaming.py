@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Streaming helpers for Not a cPanel
+Server-Sent Events formatting, a bounded pump that lets a slow client push
+back on the producer while still sending keepalives on quiet streams, and
+line-by-line reading of child process output
+"""
+
+import queue
+import threading
+import subprocess
+from typing import Iterator, Iterable, List, Optional, Any
+
+_END = object()
+
+
+def sse_event(data: str, event_id: Optional[str] = None, event: Optional[str] = None) -> str:
+    """Format one Server-Sent Event; multi-line data is split over data: fields"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if event is not None:
+        lines.append(f'event: {event}')
+    for line in data.split('\n'):
+        lines.append(f'data: {line}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def pump(source: Iterable[Any], keepalive: float = 15.0, maxsize: int = 256,
+         keepalive_item: Any = None) -> Iterator[Any]:
+    """Iterate `source` on a reader thread through a bounded queue
+
+    When the consumer stops pulling, the queue fills and the reader blocks, so
+    the producer (a pipe or socket) is throttled rather than buffered in
+    memory. `keepalive_item` is yielded whenever nothing arrives for
+    `keepalive` seconds. Closing the returned generator closes `source`.
+    """
+    items: queue.Queue = queue.Queue(maxsize=maxsize)
+    stopped = threading.Event()
+    iterator = iter(source)
+
+    def put(item) -> bool:
+        # Never block for good: once the consumer has gone, nobody will drain the queue
+        while not stopped.is_set():
+            try:
+                items.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def reader():
+        try:
+            for item in iterator:
+                if not put(item):
+                    break
+        except Exception as e:
+            put(e)
+        finally:
+            put(_END)
+
+    thread = threading.Thread(target=reader, name='stream-pump', daemon=True)
+    thread.start()
+    try:
+        while True:
+            try:
+                item = items.get(timeout=keepalive)
+            except queue.Empty:
+                yield keepalive_item
+                continue
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stopped.set()
+        close = getattr(iterator, 'close', None)
+        if close:
+            try:
+                close()
+            except Exception:
+                pass
+
+
+class CommandStream:
+    """Decoded stdout lines of a child process, yielded as they arrive
+
+    Only the current line is held in memory, so callers can parse large
+    outputs incrementally and use the first results before the process
+    exits. stderr is drained on a helper thread, keeping its last
+    `stderr_limit` bytes, so the child never blocks on a full pipe.
+    returncode, stderr and timed_out are set once the stream is exhausted
+    or closed; stopping early terminates the process.
+    """
+
+    def __init__(self, command: List[str], timeout: Optional[float] = None, stderr_limit: int = 65536):
+        self.command = command
+        self.returncode: Optional[int] = None
+        self.stderr = ''
+        self.timed_out = False
+        self._stderr_limit = stderr_limit
+        self._stderr_tail = bytearray()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._eof = False
+        self._proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=False)
+        self._stderr_thread = threading.Thread(target=self._drain_stderr, name='command-stderr', daemon=True)
+        self._stderr_thread.start()
+        self._timer = threading.Timer(timeout, self._kill) if timeout else None
+        if self._timer:
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _drain_stderr(self):
+        for chunk in iter(lambda: self._proc.stderr.read(4096), b''):
+            self._stderr_tail += chunk
+            if len(self._stderr_tail) > self._stderr_limit:
+                del self._stderr_tail[:-self._stderr_limit]
+
+    def _kill(self):
+        self.timed_out = True
+        self._proc.kill()
+
+    @property
+    def success(self) -> bool:
+        return self.returncode == 0 and not self.timed_out
+
+    def __iter__(self) -> Iterator[str]:
+        try:
+            for line in self._proc.stdout:
+                yield line.decode('utf-8', errors='replace').rstrip('\r\n')
+            self._eof = True
+        finally:
+            self.close()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if not self._eof and self._proc.poll() is None:
+            # The reader stopped early, nothing else the process prints will be used
+            self._proc.terminate()
+        self._proc.stdout.close()
+        try:
+            self._proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self._proc.kill()
+            self._proc.wait()
+        if self._timer:
+            self._timer.cancel()
+        self._stderr_thread.join(timeout=5)
+        self.returncode = self._proc.returncode
+        self.stderr = 'Command timed out' if self.timed_out else self._stderr_tail.decode('utf-8', errors='replace').strip()
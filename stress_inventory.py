@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Stress test for the container inventory of Not a cPanel
+Runs parallel readers against a writer that keeps resyncing between two
+generations of the same containers (all running, then all stopped) while
+another writer adds and removes a container through events. Every read
+checks that it sees a complete, internally consistent snapshot.
+
+Usage: python stress_inventory.py [seconds] [readers] [containers]
+"""
+
+import sys
+import time
+import random
+import threading
+
+from inventory import ContainerInventory, AmbiguousReference
+from records import ContainerRecord
+
+
+def make_generation(count, status):
+    return [ContainerRecord(id=f'{i:012x}', name=f'site{i}', image='nginx:alpine', status=status,
+                            ports=f'0.0.0.0:{8001 + i}->80/tcp') for i in range(count)]
+
+
+EXTRA = ContainerRecord(id='f' * 12, name='extra', image='nginx:alpine', status='running')
+
+
+def check(snapshot, count):
+    """Return a description of what is wrong with a snapshot, or None"""
+    containers = [c for c in snapshot.containers if c.id != EXTRA.id]
+    if len(containers) != count:
+        return f'revision {snapshot.revision}: {len(containers)} containers instead of {count}'
+    if len({c.status for c in containers}) != 1:
+        return f'revision {snapshot.revision}: mixes containers from two resyncs'
+    if len(snapshot.by_id) != len(snapshot.containers) or len(snapshot.ids) != len(snapshot.containers):
+        return f'revision {snapshot.revision}: indexes out of step with the container list'
+    for container in random.sample(snapshot.containers, min(20, len(snapshot.containers))):
+        if snapshot.by_id.get(container.id) is not container or snapshot.names.get(container.name) != container.id:
+            return f'revision {snapshot.revision}: {container.name} missing from the indexes'
+    return None
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    reader_count = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    count = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
+
+    generations = [make_generation(count, 'running'), make_generation(count, 'stopped')]
+    turn = {'n': 0}
+
+    def load_all():
+        turn['n'] += 1
+        return generations[turn['n'] % 2]
+
+    def load_one(container_id):
+        return EXTRA if container_id == EXTRA.id else None
+
+    inventory = ContainerInventory(load_all, load_one, max_staleness=3600)
+    inventory.resync()
+
+    stopped = threading.Event()
+    failures = []
+    reads = [0] * reader_count
+    writes = {'resyncs': 0, 'events': 0}
+
+    def reader(slot):
+        last_revision = 0
+        while not stopped.is_set():
+            snapshot = inventory.current()
+            if snapshot.revision < last_revision:
+                failures.append(f'revision went back from {last_revision} to {snapshot.revision}')
+            last_revision = snapshot.revision
+            problem = check(snapshot, count)
+            if problem:
+                failures.append(problem)
+            name = f'site{random.randrange(count)}'
+            try:
+                if inventory.lookup(name) is None:
+                    failures.append(f'lookup({name}) found nothing')
+            except AmbiguousReference as e:
+                failures.append(str(e))
+            reads[slot] += 1
+            if len(failures) > 100:
+                stopped.set()
+
+    def resyncer():
+        while not stopped.is_set():
+            inventory.resync()
+            writes['resyncs'] += 1
+
+    def eventer():
+        while not stopped.is_set():
+            inventory.apply_event({'Type': 'container', 'Action': 'create', 'Actor': {'ID': EXTRA.id}})
+            inventory.apply_event({'Type': 'container', 'Action': 'destroy', 'Actor': {'ID': EXTRA.id}})
+            writes['events'] += 2
+
+    threads = [threading.Thread(target=reader, args=(i,), daemon=True) for i in range(reader_count)]
+    threads += [threading.Thread(target=resyncer, daemon=True), threading.Thread(target=eventer, daemon=True)]
+    print(f"🔨 {reader_count} readers, 1 resync writer, 1 event writer, {count} containers, {seconds:g}s")
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stopped.set()
+    for thread in threads:
+        thread.join()
+
+    total = sum(reads)
+    print(f"   reads {total} ({total / seconds:,.0f}/s)   resyncs {writes['resyncs']}   "
+          f"events {writes['events']}   final revision {inventory.revision}")
+    if failures:
+        print(f"❌ {len(failures)} inconsistent reads, first: {failures[0]}")
+        sys.exit(1)
+    print("✅ Every read saw a complete, consistent snapshot")
+
+
+if __name__ == '__main__':
+    main()
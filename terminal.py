@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Interactive container terminals for Not a cPanel
+Keeps one `docker exec -it` process per browser terminal attached to a pty,
+so a terminal session costs one process for its whole lifetime instead of
+one per command, with idle timeouts and a per-user cap on open sessions
+"""
+
+import os
+import pty
+import time
+import uuid
+import fcntl
+import struct
+import signal
+import select
+import logging
+import termios
+import threading
+import subprocess
+from typing import Dict, List, Optional, Any, Callable
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 65536
+
+
+class TerminalLimitError(RuntimeError):
+    """The user already has the maximum number of open terminals"""
+
+
+class TerminalSession:
+    """One exec process attached to a pty"""
+
+    def __init__(self, user: str, container: str, command: List[str], cols: int = 80, rows: int = 24):
+        self.id = uuid.uuid4().hex
+        self.user = user
+        self.container = container
+        self.created = time.time()
+        self.last_activity = time.monotonic()
+        self.closed = False
+        # Keeps a write from reaching the master fd (or a reused fd number) after close()
+        self._lock = threading.Lock()
+        self._master, slave = pty.openpty()
+        self.resize(cols, rows)
+        try:
+            # New session with the pty as its controlling terminal, so ^C and job control work
+            self.process = subprocess.Popen(command, stdin=slave, stdout=slave, stderr=slave,
+                                            start_new_session=True, close_fds=True,
+                                            preexec_fn=lambda: fcntl.ioctl(0, termios.TIOCSCTTY, 0))
+        finally:
+            os.close(slave)
+
+    def touch(self):
+        self.last_activity = time.monotonic()
+
+    def idle_for(self) -> float:
+        return time.monotonic() - self.last_activity
+
+    def resize(self, cols: int, rows: int):
+        cols = max(1, min(int(cols), 1000))
+        rows = max(1, min(int(rows), 1000))
+        fcntl.ioctl(self._master, termios.TIOCSWINSZ, struct.pack('HHHH', rows, cols, 0, 0))
+
+    def write(self, data: bytes):
+        """Send input to the process; dropped once the terminal is closed or its process is gone"""
+        self.touch()
+        view = memoryview(data)
+        with self._lock:
+            if self.closed:
+                return
+            try:
+                while view:
+                    written = os.write(self._master, view)
+                    view = view[written:]
+            except OSError:
+                # EIO once the exec process has exited; read() reports the end
+                pass
+
+    def read(self, timeout: float = 1.0) -> Optional[bytes]:
+        """Next chunk of output; b'' when nothing arrived within timeout, None once the process exited"""
+        if self.closed:
+            return None
+        try:
+            ready, _, _ = select.select([self._master], [], [], timeout)
+            if not ready:
+                return b''
+            data = os.read(self._master, READ_SIZE)
+        except (OSError, ValueError):
+            # EIO on the master means the exec process and its pty are gone
+            return None
+        if not data:
+            return None
+        self.touch()
+        return data
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.process.poll() is None:
+            try:
+                os.killpg(self.process.pid, signal.SIGHUP)
+                self.process.wait(timeout=2)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+        with self._lock:
+            try:
+                os.close(self._master)
+            except OSError:
+                pass
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'user': self.user,
+            'container': self.container,
+            'created': self.created,
+            'idle': round(self.idle_for(), 1),
+            'running': not self.closed and self.process.poll() is None
+        }
+
+
+class TerminalManager:
+    """Opens terminals within a per-user cap and closes the ones left idle"""
+
+    def __init__(self, build_command: Callable[[str], List[str]], max_per_user: int = 3,
+                 idle_timeout: float = 900.0, reap_interval: float = 15.0):
+        self._build_command = build_command
+        self.max_per_user = max_per_user
+        self.idle_timeout = idle_timeout
+        self.reap_interval = reap_interval
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, TerminalSession] = {}
+        self._reaper: Optional[threading.Thread] = None
+
+    def open(self, user: str, container: str, cols: int = 80, rows: int = 24) -> TerminalSession:
+        with self._lock:
+            owned = sum(1 for s in self._sessions.values() if s.user == user)
+            if owned >= self.max_per_user:
+                raise TerminalLimitError(f'At most {self.max_per_user} terminals may be open per user')
+            terminal = TerminalSession(user, container, self._build_command(container), cols, rows)
+            self._sessions[terminal.id] = terminal
+            self._start_reaper()
+        logger.info(f"Terminal {terminal.id} opened on {container} for {user}")
+        return terminal
+
+    def close(self, terminal: TerminalSession):
+        with self._lock:
+            self._sessions.pop(terminal.id, None)
+        terminal.close()
+
+    def sessions(self, user: Optional[str] = None) -> List[TerminalSession]:
+        with self._lock:
+            return [s for s in self._sessions.values() if user is None or s.user == user]
+
+    def _start_reaper(self):
+        if self._reaper is None or not self._reaper.is_alive():
+            self._reaper = threading.Thread(target=self._reap_loop, name='terminal-reaper', daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(self.reap_interval)
+            with self._lock:
+                idle = [s for s in self._sessions.values() if s.idle_for() > self.idle_timeout]
+                if not self._sessions:
+                    self._reaper = None
+                    return
+            for terminal in idle:
+                logger.info(f"Closing terminal {terminal.id} on {terminal.container} after {self.idle_timeout:g}s idle")
+                self.close(terminal)